@@ -7,27 +7,31 @@ In this script, i demonstrate my understanding of prompt chaining when building
 where each LLM call processes the output of the previous one."
 source: (https://www.anthropic.com/engineering/building-effective-agents)
 """
-import configparser
-from datetime import datetime
-from openai import OpenAI
-import os
+import asyncio
+from llm_client import get_async_client, get_client
+from llm_metrics import stage
+from tracing import configure_tracing, traced
+from prompt_compiler import DATE_CONTEXT, compile_prompt, today
+from structured_output import StructuredOutputError, load_json
 import logging
 import json
 
-config = configparser.ConfigParser()
-config.read("config.ini")
-deep_seek_api_key = config.get("API_KEYS", "openai_key")
-
-# Set up logging configuration
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
 logger = logging.getLogger(__name__)
 
-client = OpenAI(api_key=deep_seek_api_key, base_url="https://api.deepseek.com")
-model = "deepseek-chat"  
+model = "deepseek-chat"
+
+
+def __getattr__(name):
+    # `client` and `async_client` are the shared clients, created on first use
+    # (see llm_client.get_client), so importing this module makes no client
+    if name == "client":
+        return get_client()
+    if name == "async_client":
+        return get_async_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Upper bound on requests that process_many keeps in flight at once
+DEFAULT_MAX_CONCURRENCY = 50
 
 # --------------------------------------------------------------
 # Step 1: Define the data models for each stage
@@ -80,28 +84,16 @@ ConfirmationMessageModel = [{
     "required": True
 }]
 
-data_model_descriptions = """
-Always return a JSON object using the following format:
-Below is the schema describing the fields.
-
-Schema:
-{schema_here}
+# Data Model for the fused mode: all three stages answered in one response.
+# The details and the confirmation message only make sense for calendar events.
+FusedCalendarRequestModel = EventExtractionModel + [
+    {**field,
+     "description": f"{field['description']}. Null if the text is not a calendar event"}
+    for field in EventDetailsModel + ConfirmationMessageModel
+]
 
-### INSTRUCTIONS
-- Use the `name` field as the key in the JSON output.  
-- Generate a value according to its `description` and `data_type`.  
-- Only include the keys (do not include `description`, `data_type`, or `required` in the output).  
-- If `required` is false, return a null value for that key.  
-- Your entire response must be a single valid JSON object, with no additional text, explanation, or Markdown formatting.  
-
-### OUTPUT FORMAT (example)
-{{
-  "field1": <value>,
-  "field2": <value>,
-  ...
-}}
-
-"""
+# Execution modes of process_calendar_request
+EXECUTION_MODES = ("staged", "fused")
 
 #function to print output from model
 log_json = lambda data: logger.info(json.dumps(data, indent=2))
@@ -110,6 +102,111 @@ log_json = lambda data: logger.info(json.dumps(data, indent=2))
 # Step 2: Define the functions
 # --------------------------------------------------------------
 
+# The system prompts are compiled once at import: the static instructions and
+# schema come first and the date comes last, so repeated requests share a
+# cacheable prefix. The blocking and the asyncio versions of each stage use
+# the same message builders, so both send exactly the same request.
+
+EVENT_EXTRACTION_PROMPT = compile_prompt(
+    "confirmation.event_extraction",
+    "Analyze if the text describes a calendar event.",
+    data_structure=EventExtractionModel,
+    volatile=DATE_CONTEXT)
+
+EVENT_DETAILS_PROMPT = compile_prompt(
+    "confirmation.event_details",
+    """
+    Extract the calendar event details from the text.
+    If need be, use the current date as a reference.
+    """,
+    data_structure=EventDetailsModel,
+    volatile=DATE_CONTEXT)
+
+CONFIRMATION_MESSAGE_PROMPT = compile_prompt(
+    "confirmation.confirmation_message",
+    """
+    Generate a natural language confirmation message for the calendar event.
+    Sign of with your name; Bob
+    """,
+    data_structure=ConfirmationMessageModel)
+
+FUSED_REQUEST_PROMPT = compile_prompt(
+    "confirmation.fused_request",
+    """
+    Analyze if the text describes a calendar event.
+    If it does, extract the calendar event details from the text, using the current
+    date as a reference, and write a natural language confirmation message for the
+    event. Sign of the confirmation message with your name; Bob
+    """,
+    data_structure=FusedCalendarRequestModel,
+    volatile=DATE_CONTEXT)
+
+def _event_extraction_messages(user_input: str, data_structure) -> list:
+    return [
+        {"role": "system", "content": EVENT_EXTRACTION_PROMPT.render(data_structure, today=today())},
+        {"role": "user", "content": user_input}
+    ]
+
+def _event_details_messages(description: str, data_structure) -> list:
+    return [
+        {"role": "system", "content": EVENT_DETAILS_PROMPT.render(data_structure, today=today())},
+        {"role": "user", "content": description}
+    ]
+
+def _confirmation_message_messages(event_details: json, data_structure) -> list:
+    return [
+        {"role": "system", "content": CONFIRMATION_MESSAGE_PROMPT.render(data_structure)},
+        {"role": "user", "content": str(json.dumps(event_details, indent=2))}
+    ]
+
+def _fused_request_messages(user_input: str, data_structure) -> list:
+    return [
+        {"role": "system", "content": FUSED_REQUEST_PROMPT.render(data_structure, today=today())},
+        {"role": "user", "content": user_input}
+    ]
+
+# Python types accepted for each `data_type` used in the data models
+_data_type_checks = {
+    "string": lambda value: isinstance(value, str),
+    "boolean": lambda value: isinstance(value, bool),
+    "float": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "int": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "list[str]": lambda value: isinstance(value, list) and all(isinstance(item, str) for item in value),
+}
+
+def validate_result(result: json, data_structure) -> list:
+    """
+    Check a parsed model response against one of the data models.
+    Returns a list of problems; an empty list means the result is valid.
+    """
+    if not isinstance(result, dict):
+        return ["response is not a JSON object"]
+
+    errors = []
+    for field in data_structure:
+        name = field["name"]
+        if result.get(name) is None:
+            if field["required"]:
+                errors.append(f"missing field '{name}'")
+            continue
+        check = _data_type_checks.get(field["data_type"])
+        if check and not check(result[name]):
+            errors.append(f"field '{name}' is not of type {field['data_type']}")
+    return errors
+
+def _is_confirmed_event(event_extraction: json) -> bool:
+    """
+    Gate between step 1 and step 2 of the chain.
+    """
+    if (not event_extraction.get("is_calendar_event", False)
+        or event_extraction.get("confidence_score", 0) < 0.7):
+        logger.warning("The input does not describe a calendar event.")
+        return False
+
+    logger.info("Input is confirmed as a calendar event.")
+    return True
+
+@stage("confirmation.event_extraction")
 def determine_event_extraction(user_input: str,data_structure = EventExtractionModel) -> json:
     """
     Step 1: Determine if the description is a calendar event.
@@ -117,31 +214,21 @@ def determine_event_extraction(user_input: str,data_structure = EventExtractionM
     logger.info("Starting event extraction analysis.")
     logger.debug(f"User input: {user_input}")
 
-    today = datetime.now()
-    date_context = f"Today's date is {today.strftime('%Y-%m-%d')}."
-
-    response = client.chat.completions.create(
+    response = get_client().chat.completions.create(
         model=model,
-        messages=[
-            {
-                "role": "system",
-                "content": f"""{date_context}. Analyze if the text describes a calendar event.
-                {data_model_descriptions.format(schema_here=json.dumps(data_structure, indent=2))}  
-                """
-            },
-            {"role": "user", "content": user_input}
-        ],
+        messages=_event_extraction_messages(user_input, data_structure),
         response_format={"type": "json_object"},
         temperature=0.5
     )
     result = response.choices[0].message.content
     logger.info("Event extraction analysis completed.")
-    result = json.loads(result)
+    result = load_json(result, data_structure, "confirmation.event_extraction")
     log_json(result)
                 
     
     return result
 
+@stage("confirmation.event_details")
 def extract_event_details(description: str, data_structure=EventDetailsModel) -> json:
     """
     Step 2: Extract details of the calendar event.
@@ -149,33 +236,21 @@ def extract_event_details(description: str, data_structure=EventDetailsModel) ->
     logger.info("Starting event details extraction.")
     logger.debug(f"Description: {description}")
 
-    today = datetime.now()
-    date_context = f"Today's date is {today.strftime('%Y-%m-%d')}."
-
-    response = client.chat.completions.create(
+    response = get_client().chat.completions.create(
         model=model,
-        messages=[
-            {
-                "role": "system",
-                "content": f"""
-                {date_context}.Extract the calendar event details from the text.
-                If need be, use the current date as a reference.
-                {data_model_descriptions.format(schema_here=json.dumps(data_structure, indent=2))}
-                """
-            },
-            {"role": "user", "content": description}
-        ],
+        messages=_event_details_messages(description, data_structure),
         response_format={"type": "json_object"},
         temperature=0.5
     )
     
     result = response.choices[0].message.content
     logger.info("Event details extraction completed.")
-    result = json.loads(result)
+    result = load_json(result, data_structure, "confirmation.event_details")
     log_json(result)
     
     return result
 
+@stage("confirmation.confirmation_message")
 def generate_confirmation_message(event_details: json, data_structure=ConfirmationMessageModel) -> json:
     """
     Step 3: Generate a confirmation message for the calendar event.
@@ -183,51 +258,182 @@ def generate_confirmation_message(event_details: json, data_structure=Confirmati
     logger.info("Starting confirmation message generation.")
     logger.debug(f"Event details: {json.dumps(event_details, indent=2)}")
 
-    response = client.chat.completions.create(
+    response = get_client().chat.completions.create(
         model=model,
-        messages=[
-            {
-                "role": "system",
-                "content": f"""Generate a natural language confirmation message for the calendar event.
-                Sign of with your name; Bob
-                {data_model_descriptions.format(schema_here=json.dumps(data_structure, indent=2))}
-                """
-            },
-            {"role": "user", "content": str(json.dumps(event_details, indent=2))}
-        ],
+        messages=_confirmation_message_messages(event_details, data_structure),
         response_format={"type": "json_object"},
         temperature=0.5
     )
     
     result = response.choices[0].message.content
     logger.info("Confirmation message generation completed.")
-    result = json.loads(result)
+    result = load_json(result, data_structure, "confirmation.confirmation_message")
     log_json(result)
     
     return result
 
+@stage("confirmation.fused_request")
+def fused_calendar_request(user_input: str, data_structure=FusedCalendarRequestModel) -> json:
+    """
+    Fused mode: answer all three steps in a single model call.
+    Returns None if the model did not return valid JSON.
+    """
+    logger.info("Starting fused calendar request.")
+    logger.debug(f"User input: {user_input}")
+
+    response = get_client().chat.completions.create(
+        model=model,
+        messages=_fused_request_messages(user_input, data_structure),
+        response_format={"type": "json_object"},
+        temperature=0.5
+    )
+
+    logger.info("Fused calendar request completed.")
+    try:
+        result = load_json(response.choices[0].message.content, data_structure, "confirmation.fused_request")
+    except StructuredOutputError as e:
+        logger.warning(f"Failed to parse fused response: {e}")
+        return None
+    log_json(result)
+
+    return result
+
+# --------------------------------------------------------------
+# Step 2b: asyncio versions of the functions
+# --------------------------------------------------------------
+
+@stage("confirmation.event_extraction")
+async def determine_event_extraction_async(user_input: str, data_structure=EventExtractionModel) -> json:
+    """
+    Step 1 (asyncio): Determine if the description is a calendar event.
+    """
+    logger.debug(f"User input: {user_input}")
+
+    response = await get_async_client().chat.completions.create(
+        model=model,
+        messages=_event_extraction_messages(user_input, data_structure),
+        response_format={"type": "json_object"},
+        temperature=0.5
+    )
+    result = load_json(response.choices[0].message.content, data_structure, "confirmation.event_extraction")
+    logger.debug(json.dumps(result, indent=2))
+
+    return result
+
+@stage("confirmation.event_details")
+async def extract_event_details_async(description: str, data_structure=EventDetailsModel) -> json:
+    """
+    Step 2 (asyncio): Extract details of the calendar event.
+    """
+    logger.debug(f"Description: {description}")
+
+    response = await get_async_client().chat.completions.create(
+        model=model,
+        messages=_event_details_messages(description, data_structure),
+        response_format={"type": "json_object"},
+        temperature=0.5
+    )
+    result = load_json(response.choices[0].message.content, data_structure, "confirmation.event_details")
+    logger.debug(json.dumps(result, indent=2))
+
+    return result
+
+@stage("confirmation.confirmation_message")
+async def generate_confirmation_message_async(event_details: json, data_structure=ConfirmationMessageModel) -> json:
+    """
+    Step 3 (asyncio): Generate a confirmation message for the calendar event.
+    """
+    logger.debug(f"Event details: {json.dumps(event_details, indent=2)}")
+
+    response = await get_async_client().chat.completions.create(
+        model=model,
+        messages=_confirmation_message_messages(event_details, data_structure),
+        response_format={"type": "json_object"},
+        temperature=0.5
+    )
+    result = load_json(response.choices[0].message.content, data_structure, "confirmation.confirmation_message")
+    logger.debug(json.dumps(result, indent=2))
+
+    return result
+
+@stage("confirmation.fused_request")
+async def fused_calendar_request_async(user_input: str, data_structure=FusedCalendarRequestModel) -> json:
+    """
+    Fused mode (asyncio): answer all three steps in a single model call.
+    """
+    logger.debug(f"User input: {user_input}")
+
+    response = await get_async_client().chat.completions.create(
+        model=model,
+        messages=_fused_request_messages(user_input, data_structure),
+        response_format={"type": "json_object"},
+        temperature=0.5
+    )
+    try:
+        result = load_json(response.choices[0].message.content, data_structure, "confirmation.fused_request")
+    except StructuredOutputError as e:
+        logger.warning(f"Failed to parse fused response: {e}")
+        return None
+    logger.debug(json.dumps(result, indent=2))
+
+    return result
+
 # --------------------------------------------------------------
 # Step 3: Chain the functions together
 # --------------------------------------------------------------
 
-def process_calendar_request(user_input: str) -> json:
+def _check_mode(mode: str):
+    if mode not in EXECUTION_MODES:
+        raise ValueError(f"Unknown execution mode {mode!r}, expected one of {EXECUTION_MODES}")
+
+def _resolve_fused_result(fused: json) -> tuple:
+    """
+    Decide what to do with a fused response.
+    Returns (done, confirmation_message). When `done` is False the fused
+    result failed validation or the confidence gate, and the caller
+    should fall back to the staged chain.
+    """
+    errors = validate_result(fused, EventExtractionModel)
+    if not errors and fused["confidence_score"] >= 0.7:
+        if not fused["is_calendar_event"]:
+            logger.warning("The input does not describe a calendar event.")
+            return True, None
+
+        errors = validate_result(fused, EventDetailsModel + ConfirmationMessageModel)
+        if not errors:
+            logger.info("Calendar request processing completed in fused mode.")
+            return True, {"confirmation_message": fused["confirmation_message"]}
+    elif not errors:
+        errors = [f"confidence score {fused['confidence_score']} is below 0.7"]
+
+    logger.warning(f"Fused result rejected ({'; '.join(errors)}), falling back to the staged chain.")
+    return False, None
+
+@traced("confirmation.process_calendar_request")
+def process_calendar_request(user_input: str, mode: str = "staged") -> json:
     """
     Main function to process the calendar request.
     It chains the steps together to extract event details 
     and generate a confirmation message.
+
+    With `mode="fused"` all three steps are requested in one model call,
+    and the staged chain only runs if that result is invalid or below
+    the confidence gate.
     """
+    _check_mode(mode)
     logger.info("Processing calendar request.")
     logger.debug(f"User input: {user_input}")
+
+    if mode == "fused":
+        done, confirmation_message = _resolve_fused_result(fused_calendar_request(user_input))
+        if done:
+            return confirmation_message
     
     # Step 1: Determine if the description is a calendar event
     event_extraction = determine_event_extraction(user_input)
     
-    if (not event_extraction.get("is_calendar_event", False)
-        or event_extraction.get("confidence_score", 0) < 0.7):
-        logger.warning("The input does not describe a calendar event.")
+    if not _is_confirmed_event(event_extraction):
         return None
-    
-    logger.info("Input is confirmed as a calendar event.")
 
     # Step 2: Extract details of the calendar event
     event_details = extract_event_details(event_extraction["description"])
@@ -239,23 +445,117 @@ def process_calendar_request(user_input: str) -> json:
     
     return confirmation_message
 
+@traced("confirmation.process_calendar_request")
+async def process_calendar_request_async(user_input: str, mode: str = "staged") -> json:
+    """
+    asyncio version of process_calendar_request.
+    The three stages still run one after the other for a single request,
+    but the event loop is free to serve other requests while we wait.
+    """
+    _check_mode(mode)
+    logger.info("Processing calendar request.")
+    logger.debug(f"User input: {user_input}")
+
+    if mode == "fused":
+        done, confirmation_message = _resolve_fused_result(
+            await fused_calendar_request_async(user_input))
+        if done:
+            return confirmation_message
+
+    event_extraction = await determine_event_extraction_async(user_input)
+
+    if not _is_confirmed_event(event_extraction):
+        return None
+
+    event_details = await extract_event_details_async(event_extraction["description"])
+    confirmation_message = await generate_confirmation_message_async(event_details)
+
+    logger.info("Calendar request processing completed.")
+
+    return confirmation_message
+
+async def process_many(user_inputs: list, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                       mode: str = "staged") -> list:
+    """
+    Process many calendar requests concurrently.
+
+    At most `max_concurrency` requests are in flight at any time.
+    Results are returned in the same order as `user_inputs`. A request that
+    raised has its exception in its slot instead of a result, so one bad
+    request does not throw away the rest of the batch.
+    """
+    _check_mode(mode)
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1")
+
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _bounded(user_input: str):
+        async with semaphore:
+            return await process_calendar_request_async(user_input, mode=mode)
+
+    results = await asyncio.gather(
+        *(_bounded(user_input) for user_input in user_inputs),
+        return_exceptions=True
+    )
+
+    for user_input, result in zip(user_inputs, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to process calendar request {user_input!r}: {result}")
+
+    return results
+
 # --------------------------------------------------------------
 # Step 3: Test the chain 
 # --------------------------------------------------------------
 
-# Valid calendar event request
-user_input = "Let's schedule a 1h team meeting next Tuesday at 2pm with Said and Arthur to discuss the project roadmap. Mel doesnt need to attend"
-result = process_calendar_request(user_input)
-if result:
-    logger.info(f"Confirmation: {result['confirmation_message']}")
-else:
-    logger.info(f"This doesn't appear to be a calendar event request.")
-
-# Invalid calendar event request
-user_input = "Can you send an email to Alice and Bob to discuss the project roadmap?"
-result = process_calendar_request(user_input)
-if result:
-    logger.info(f"Confirmation: {result['confirmation_message']}")
-
-else:
-    logger.info("This doesn't appear to be a calendar event request.")
\ No newline at end of file
+def main():
+    """Run the example requests: python Calendar_confirmation_aiagent.py"""
+    # Set up logging configuration
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    # Spans of each request, if [TRACING] is enabled in config.ini (see tracing.py)
+    configure_tracing()
+
+    # Valid calendar event request
+    user_input = "Let's schedule a 1h team meeting next Tuesday at 2pm with Said and Arthur to discuss the project roadmap. Mel doesnt need to attend"
+    result = process_calendar_request(user_input)
+    if result:
+        logger.info(f"Confirmation: {result['confirmation_message']}")
+    else:
+        logger.info(f"This doesn't appear to be a calendar event request.")
+
+    # Invalid calendar event request
+    user_input = "Can you send an email to Alice and Bob to discuss the project roadmap?"
+    result = process_calendar_request(user_input)
+    if result:
+        logger.info(f"Confirmation: {result['confirmation_message']}")
+
+    else:
+        logger.info("This doesn't appear to be a calendar event request.")
+
+    # Same request answered in a single model call
+    user_input = "Let's schedule a 1h team meeting next Tuesday at 2pm with Said and Arthur to discuss the project roadmap. Mel doesnt need to attend"
+    result = process_calendar_request(user_input, mode="fused")
+    if result:
+        logger.info(f"Confirmation: {result['confirmation_message']}")
+    else:
+        logger.info("This doesn't appear to be a calendar event request.")
+
+    # Several requests at once, sharing one event loop
+    results = asyncio.run(process_many([
+        "Book a 30 minute call with Nada tomorrow at 10am about the budget",
+        "Can you send an email to Alice and Bob to discuss the project roadmap?",
+    ], max_concurrency=2))
+    for result in results:
+        if isinstance(result, dict):
+            logger.info(f"Confirmation: {result['confirmation_message']}")
+        else:
+            logger.info("This doesn't appear to be a calendar event request.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+from pydantic import BaseModel, Field
+
+class KBResponse(BaseModel):
+    answer: str = Field(description="The answer to the user's question.")
+    source: int = Field(description="The record id of the answer.")
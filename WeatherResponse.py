@@ -0,0 +1,5 @@
+from pydantic import BaseModel, Field
+
+class WeatherResponse(BaseModel):
+    temperature: float = Field(description="<float> - Current temperature in Celsius")
+    response: str = Field(description="<string> A natural language response to the user's question.")
@@ -0,0 +1,184 @@
+"""
+agent_loop.py
+
+Reusable tool-use loop for the agents.
+
+Each round sends the conversation to the model with the tools (and, when a
+response model is given, JSON mode with the response fields in the system
+prompt). If the model asks for tools, the ToolExecutor runs them, their
+results go back to the model and the next round starts. The loop stops as
+soon as the model answers without tool calls, so the final structured
+answer arrives in the round after the last tool use, with no separate
+"now format it" call. The last allowed round is sent with tool_choice="none",
+so the model has to answer.
+
+A final answer that does not validate, even after the local repair in
+structured_output.py, is sent back with the error while steps are left.
+
+Round trips per request are counted per agent in `round_trip_metrics`.
+
+Usage:
+    result = run_agent(client, messages, tools=tools, executor=tool_executor,
+                       response_model=WeatherResponse, name="weather")
+    result.output        # WeatherResponse, or None if it did not validate
+    result.round_trips   # model calls made for this request
+"""
+import logging
+import threading
+from collections import Counter
+
+from structured_output import (StructuredOutputError, parse_structured, retry_message, structured_metrics,
+                               with_response_fields)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_STEPS = 5
+
+
+class AgentResult:
+    """What run_agent returns."""
+
+    def __init__(self, output, content, messages, round_trips, completion, stopped, error=None):
+        self.output = output            # validated response model, parsed JSON or text
+        self.content = content          # the final message content as returned
+        self.messages = messages        # the conversation, including tool turns
+        self.round_trips = round_trips  # model calls made
+        self.completion = completion    # the last completion
+        self.stopped = stopped          # "final", "invalid" or "max_steps"
+        self.error = error
+
+    def __repr__(self):
+        return f"AgentResult(stopped={self.stopped!r}, round_trips={self.round_trips}, output={self.output!r})"
+
+
+class RoundTripMetrics:
+    """Model round trips per request, by agent name."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = Counter()
+        self._round_trips = Counter()
+        self._distribution = {}
+        self._stopped = {}
+
+    def record(self, name: str, round_trips: int, stopped: str):
+        with self._lock:
+            self._requests[name] += 1
+            self._round_trips[name] += round_trips
+            self._distribution.setdefault(name, Counter())[round_trips] += 1
+            self._stopped.setdefault(name, Counter())[stopped] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    "requests": requests,
+                    "round_trips": self._round_trips[name],
+                    "mean_round_trips": round(self._round_trips[name] / requests, 3),
+                    "distribution": dict(sorted(self._distribution[name].items())),
+                    "stopped": dict(self._stopped[name]),
+                }
+                for name, requests in self._requests.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self.__init__()
+
+
+round_trip_metrics = RoundTripMetrics()
+
+
+def _final_output(content: str, response_model) -> tuple:
+    """(output, error) of a final answer."""
+    if response_model is None:
+        return content, None
+    try:
+        return parse_structured(content, response_model), None
+    except StructuredOutputError as e:
+        return None, str(e)
+
+
+def _request(model, messages, tools, response_model, last_step, create_kwargs) -> dict:
+    request = {"model": model, "messages": messages, **create_kwargs}
+    if tools:
+        request["tools"] = tools
+        if last_step:
+            request["tool_choice"] = "none"
+    if response_model is not None:
+        request["response_format"] = {"type": "json_object"}
+    return request
+
+
+def _finish(name, history, round_trips, completion, output, error) -> AgentResult:
+    message = completion.choices[0].message
+    if message.tool_calls:
+        stopped, output, error = "max_steps", None, "model still asked for tools at the last step"
+    else:
+        stopped = "final" if error is None else "invalid"
+    history.append(message)
+    if error:
+        logger.warning("%s: %s", name, error)
+    round_trip_metrics.record(name, round_trips, stopped)
+    return AgentResult(output, message.content, history, round_trips, completion, stopped, error)
+
+
+def _step(name, history, step, max_steps, completion, response_model, retried) -> tuple:
+    """
+    What to do with a completion that ends the tool rounds: (AgentResult, retried),
+    or (None, True) after sending an invalid answer back to the model.
+    """
+    message = completion.choices[0].message
+    if message.tool_calls:
+        return _finish(name, history, step, completion, None, None), retried
+    output, error = _final_output(message.content, response_model)
+    if error is None:
+        if retried:
+            structured_metrics.record(response_model.__name__, "retry_valid")
+    elif step < max_steps:
+        logger.info("%s: invalid answer, asking again: %s", name, error)
+        structured_metrics.record(response_model.__name__, "retries")
+        history.extend([message, retry_message(error)])
+        return None, True
+    return _finish(name, history, step, completion, output, error), retried
+
+
+def run_agent(client, messages: list, tools: list = None, executor=None, response_model=None,
+              model: str = "deepseek-chat", max_steps: int = DEFAULT_MAX_STEPS, name: str = "agent",
+              **create_kwargs) -> AgentResult:
+    """
+    Run the tool loop for at most max_steps model calls.
+    `executor` is a tool_executor.ToolExecutor for the tools; `response_model`
+    a pydantic model the final answer is validated against (None for text).
+    Extra keyword arguments (temperature, ...) go to every create call.
+    """
+    history = with_response_fields(messages, response_model) if response_model is not None else list(messages)
+    retried = False
+    for step in range(1, max_steps + 1):
+        completion = client.chat.completions.create(
+            **_request(model, history, tools, response_model, step == max_steps, create_kwargs))
+        message = completion.choices[0].message
+        if not message.tool_calls or step == max_steps or executor is None:
+            result, retried = _step(name, history, step, max_steps, completion, response_model, retried)
+            if result is not None:
+                return result
+            continue
+        executor.respond(history, message)
+
+
+async def run_agent_async(client, messages: list, tools: list = None, executor=None, response_model=None,
+                          model: str = "deepseek-chat", max_steps: int = DEFAULT_MAX_STEPS, name: str = "agent",
+                          **create_kwargs) -> AgentResult:
+    """run_agent for async clients; tools run through executor.run_async."""
+    history = with_response_fields(messages, response_model) if response_model is not None else list(messages)
+    retried = False
+    for step in range(1, max_steps + 1):
+        completion = await client.chat.completions.create(
+            **_request(model, history, tools, response_model, step == max_steps, create_kwargs))
+        message = completion.choices[0].message
+        if not message.tool_calls or step == max_steps or executor is None:
+            result, retried = _step(name, history, step, max_steps, completion, response_model, retried)
+            if result is not None:
+                return result
+            continue
+        await executor.respond_async(history, message)
@@ -3,51 +3,115 @@ app.py
 
 Using Streamlit to create a fast simple UI for my AI Agents
 
+Streamlit reruns this whole script on every interaction, so a rerun only
+does cheap work:
+- the client and the background worker are built once per server process
+  (st.cache_resource), not on every rerun
+- only the latest HISTORY_PAGE messages are rendered, older turns are
+  paginated
+- parsing runs on the worker (see meeting_worker.py); a fragment polls it
+  and shows the fields as they stream in, without blocking the rest of the UI
+
 to run: write in terminal: streamlit run app.py
 """
 
 import streamlit as st
-from calender_meeting_ai_agent import parse_meeting, client
+from llm_client import get_client
+from meeting_worker import MeetingWorker
+
+# messages rendered per page of chat history
+HISTORY_PAGE = 20
+
+# seconds between polls of a running parse
+POLL_SECONDS = 0.2
+
+st.set_page_config(page_title="Meeting Parser Chat", page_icon="📅") #Set Tab Page
+
+
+@st.cache_resource
+def meeting_worker() -> MeetingWorker:
+    """The shared client and the worker pool, built once per server process for all sessions."""
+    return MeetingWorker(get_client())
 
-st.set_page_config(page_title="Meeting Parser Chat", page_icon="📅") #Set Tab Page 
 
 st.title("📅 Meeting Parser Chat")
 
 # Initialize chat history
 if "messages" not in st.session_state:
     st.session_state["messages"] = []
+if "history_page" not in st.session_state:
+    st.session_state["history_page"] = 0  # 0 is the latest page
+if "pending" not in st.session_state:
+    st.session_state["pending"] = None
+
 
-# Display chat history
-for msg in st.session_state["messages"]:
+def render_message(msg: dict):
     with st.chat_message(msg["role"]):
         if msg["role"] == "assistant" and isinstance(msg["content"], dict):
             st.json(msg["content"])  # show parsed JSON nicely
         else:
             st.markdown(msg["content"])
 
-# Input box at the bottom
-if user_input := st.chat_input("Describe your meeting details..."):
-    # Add user message to history
-    st.session_state["messages"].append({"role": "user", "content": user_input})
-    
-    # Display user message immediately
-    with st.chat_message("user"):
-        st.markdown(user_input)
 
-    # Process with your parse_meeting function
-    try:
-        meeting = parse_meeting(client, user_input)
-        meeting_json = meeting.model_dump()
+def history_window(messages: list, page: int) -> tuple:
+    """The messages of a page (0 = latest) and the number of pages."""
+    pages = max(1, -(-len(messages) // HISTORY_PAGE))
+    page = min(page, pages - 1)
+    end = len(messages) - page * HISTORY_PAGE
+    return messages[max(0, end - HISTORY_PAGE):end], pages
 
+
+# Display chat history, one page at a time
+messages = st.session_state["messages"]
+window, pages = history_window(messages, st.session_state["history_page"])
+if pages > 1:
+    older, position, newer = st.columns([1, 2, 1])
+    if older.button("⬆ Older", disabled=st.session_state["history_page"] >= pages - 1):
+        st.session_state["history_page"] += 1
+        st.rerun()
+    position.caption(f"Page {pages - st.session_state['history_page']} of {pages} "
+                     f"({len(messages)} messages)")
+    if newer.button("⬇ Newer", disabled=st.session_state["history_page"] == 0):
+        st.session_state["history_page"] -= 1
+        st.rerun()
+
+for msg in window:
+    render_message(msg)
+
+
+@st.fragment(run_every=POLL_SECONDS)
+def pending_meeting():
+    """Shows the running parse; moves it into the history once it is done."""
+    job = st.session_state["pending"]
+    if job is None:
+        return
+    fields, meeting, error, done = job.snapshot()
+    with st.chat_message("assistant"):
+        if error:
+            st.error(f"⚠️ Error: {error}")
+        elif fields:
+            st.json(fields)
+        else:
+            st.caption("Reading your meeting...")
+    if done:
         # Save assistant response
-        st.session_state["messages"].append({"role": "assistant", "content": meeting_json})
+        content = f"⚠️ Error: {error}" if error else meeting.model_dump(mode="json")
+        st.session_state["messages"].append({"role": "assistant", "content": content})
+        st.session_state["pending"] = None
+        st.rerun()
 
-        # Display assistant response
-        with st.chat_message("assistant"):
-            st.json(meeting_json)
 
-    except Exception as e:
-        error_msg = f"⚠️ Error: {e}"
-        st.session_state["messages"].append({"role": "assistant", "content": error_msg})
-        with st.chat_message("assistant"):
-            st.error(error_msg)
\ No newline at end of file
+# Only registered while a parse is running, so idle reruns do not poll
+if st.session_state["pending"] is not None:
+    pending_meeting()
+
+# Input box at the bottom
+if user_input := st.chat_input("Describe your meeting details...",
+                               disabled=st.session_state["pending"] is not None):
+    # Add user message to history, and jump back to the latest page
+    st.session_state["messages"].append({"role": "user", "content": user_input})
+    st.session_state["history_page"] = 0
+
+    # Parse on the worker; the fragment shows the fields as they arrive
+    st.session_state["pending"] = meeting_worker().submit(user_input)
+    st.rerun()
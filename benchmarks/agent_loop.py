@@ -0,0 +1,155 @@
+"""
+benchmarks/agent_loop.py
+
+Model round trips and wall time per request: the old hard-coded flow (one
+tool round, then a separate get_structured_response call) against
+agent_loop.run_agent, for questions that need no tool, one tool round or
+two dependent tool rounds, and for the calendar SQL-tool path (which used
+to run the tool and never show the result to the model).
+
+to run (from the repo root): python -m benchmarks.agent_loop
+"""
+import argparse
+import json
+import logging
+import time
+
+from pydantic import BaseModel, Field
+
+from agent_loop import round_trip_metrics, run_agent
+from benchmarks.common import print_table
+from benchmarks.fake_llm import FakeClient, LatencyModel, scripted_response
+from tool_executor import ToolExecutor
+
+
+class WeatherResponse(BaseModel):
+    temperature: float = Field(description="<float> - Current temperature in Celsius")
+    response: str = Field(description="<string> A natural language response to the user's question.")
+
+
+def get_weather(latitude, longitude):
+    return {"temperature_2m": 18.4, "wind_speed_10m": 11.2}
+
+
+def get_weather_at(latitude, longitude, time):
+    return {"time": time, "temperature_2m": 14.9}
+
+
+executor = ToolExecutor({"get_weather": get_weather, "get_weather_at": get_weather_at})
+
+tools = [
+    {"type": "function", "function": {"name": name, "parameters": {"type": "object", "properties": {}}}}
+    for name in ("get_weather", "get_weather_at")
+]
+
+# question -> the tool calls the model makes, one list per round
+PLANS = {
+    "Is it usually warm in Berlin in summer?": [],
+    "What is the weather in Berlin?": [[("get_weather", {"latitude": 52.52, "longitude": 13.41})]],
+    "Will Berlin be colder tonight than now?": [
+        [("get_weather", {"latitude": 52.52, "longitude": 13.41})],
+        [("get_weather_at", {"latitude": 52.52, "longitude": 13.41, "time": "2025-09-01T21:00"})],
+    ],
+}
+
+
+def weather_model(request: dict) -> dict:
+    """A scripted model that follows PLANS and answers once it has the tool results it needs."""
+    if "weather assistant" not in json.dumps(request["messages"][0]):
+        return scripted_response(request)
+    question = next(m["content"] for m in request["messages"] if isinstance(m, dict) and m["role"] == "user")
+    rounds_done = sum(1 for m in request["messages"] if not isinstance(m, dict) and m.tool_calls)
+    plan = PLANS[question]
+    if rounds_done < len(plan) and request.get("tool_choice") != "none":
+        return {"tool_calls": [{"name": name, "arguments": args} for name, args in plan[rounds_done]]}
+    if request.get("response_format"):
+        return {"content": json.dumps({"temperature": 18.4, "response": "18.4 degrees in Berlin."})}
+    return {"content": "It is 18.4 degrees in Berlin."}
+
+
+def weather_messages(question: str) -> list:
+    return [{"role": "system", "content": "You are a helpful weather assistant."},
+            {"role": "user", "content": question}]
+
+
+def old_weather_flow(client, question: str) -> tuple:
+    """What weather_ai_agent.py did: one tool round, then a separate structured call."""
+    messages = weather_messages(question)
+    calls = 0
+    completion = client.chat.completions.create(model="deepseek-chat", messages=messages, tools=tools)
+    calls += 1
+    executor.respond(messages, completion.choices[0].message)
+    messages[0] = {**messages[0], "content": messages[0]["content"] + "\nAnswer in JSON."}
+    response = client.chat.completions.create(model="deepseek-chat", messages=messages, tools=tools,
+                                              response_format={"type": "json_object"})
+    calls += 1
+    try:
+        return calls, WeatherResponse(**json.loads(response.choices[0].message.content)) is not None
+    except (TypeError, ValueError):
+        return calls, False
+
+
+def new_weather_flow(client, question: str) -> tuple:
+    result = run_agent(client, weather_messages(question), tools=tools, executor=executor,
+                       response_model=WeatherResponse, max_steps=4, name="weather")
+    return result.round_trips, result.output is not None
+
+
+def calendar_messages() -> list:
+    details = {"name_of_event": "Standup", "date": "2025-09-01 09:00", "duration": 15,
+               "participants": ["Alice", "Bob"]}
+    return [{"role": "system", "content": "Insert the new calendar event into the database."},
+            {"role": "user", "content": json.dumps(details)}]
+
+
+calendar_tools = [{"type": "function", "function": {"name": "access_database_for_events"}}]
+calendar_executor = ToolExecutor({"access_database_for_events": lambda query: [["ok"]]})
+
+
+def old_calendar_flow(client, _) -> tuple:
+    """insert_new_event's SQL path: the tool ran, its result never went back."""
+    messages = calendar_messages()
+    completion = client.chat.completions.create(model="deepseek-chat", messages=messages, tools=calendar_tools)
+    calendar_executor.respond(messages, completion.choices[0].message)
+    return 1, False
+
+
+def new_calendar_flow(client, _) -> tuple:
+    result = run_agent(client, calendar_messages(), tools=calendar_tools, executor=calendar_executor,
+                       max_steps=3, name="calendar.insert")
+    return result.round_trips, result.stopped == "final"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--requests", type=int, default=20, help="requests per scenario and flow")
+    parser.add_argument("--base-latency", type=float, default=0.05, help="seconds per fake completion")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    client = FakeClient(LatencyModel(base_s=args.base_latency, jitter=0.0), responder=weather_model)
+
+    scenarios = [(question, f"weather, {len(plan)} tool round(s)", old_weather_flow, new_weather_flow)
+                 for question, plan in PLANS.items()]
+    scenarios.append((None, "calendar SQL tool", old_calendar_flow, new_calendar_flow))
+
+    rows = []
+    for question, label, old, new in scenarios:
+        for flow, function in (("hard-coded (before)", old), ("run_agent (after)", new)):
+            start = time.perf_counter()
+            outcomes = [function(client, question) for _ in range(args.requests)]
+            elapsed = time.perf_counter() - start
+            rows.append({
+                "request": label,
+                "flow": flow,
+                "round_trips": sum(calls for calls, _ in outcomes) / len(outcomes),
+                "answered": f"{sum(ok for _, ok in outcomes)}/{len(outcomes)}",
+                "ms/request": round(1000 * elapsed / len(outcomes), 1),
+            })
+
+    print_table(rows, ["request", "flow", "round_trips", "answered", "ms/request"])
+    print(json.dumps(round_trip_metrics.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+benchmarks/agent_throughput.py
+
+Throughput and latency of every agent over HTTP, at several concurrency
+levels: the agents run through the real openai client against the local
+mock server (benchmarks/mock_llm_server.py), and the weather tool against
+the Open-Meteo stub. For each agent and concurrency level it reports
+requests per second, failed requests, p50/p95/p99 latency and model calls
+per request.
+
+Agents: calender_meeting_ai_agent.parse_meeting (and its streaming variant,
+over server-sent events), Calendar_confirmation_aiagent
+process_calendar_request (staged and fused, and the async staged one),
+calendar_adjustment_aiagent.process_calendar_request (on a copy of the
+database), weather_ai_agent.ask_weather and ecommerce_assistant_aiagent's
+model path (answer_with_llm). Sync agents run in a thread pool, the async
+one as tasks, `concurrency` requests at a time.
+
+to run (from the repo root): python -m benchmarks.agent_throughput --concurrency 1 4 16
+"""
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import openai
+
+import Calendar_confirmation_aiagent as confirmation_agent
+import calendar_adjustment_aiagent as adjustment_agent
+import calendar_db
+import calender_meeting_ai_agent as meeting_agent
+import ecommerce_assistant_aiagent as ecommerce_agent
+import weather_ai_agent as weather_agent
+import weather_client
+from benchmarks.common import UsageMeter, print_table, summarize_latencies
+from benchmarks.fake_llm import LatencyModel
+from benchmarks.mock_llm_server import MockLLMServer
+from benchmarks.open_meteo_stub import OpenMeteoStub
+from llm_client import get_async_client, get_client, set_client
+
+MEETINGS = [
+    "Let's meet with Mustafa and Nora at 9pm on July 20th at the office.",
+    "Lunch with Sana and Omar on Friday at noon in the cafeteria.",
+]
+CONFIRMATIONS = [
+    "Let's schedule a 1h team meeting next Tuesday at 2pm with Said and Arthur to discuss the project roadmap.",
+    "Book a 30 minute call with Nada tomorrow at 10am about the budget",
+    "Can you send an email to Alice and Bob to discuss the project roadmap?",
+]
+ADJUSTMENTS = [
+    "Let's schedule a team lunch next Tuesday at 2pm with Nada and Sana",
+    "Can you move the team meeting with Alice, Bob and Charlie to Wednesday at 3pm instead?",
+]
+WEATHER = ["What is the weather in Berlin?", "How warm is it in Paris and Tokyo right now?",
+           "Is it sunny in Cairo?"]
+KB = ["Do you have any discounts available?", "How long does international shipping take?",
+      "Can I pay with PayPal?"]
+
+
+# each workload: inputs, and a function of one input that returns True if the agent answered
+def _parse_meeting(text):
+    return meeting_agent.parse_meeting(get_client(), text) is not None
+
+
+def _parse_meeting_stream(text):
+    _, meeting = list(meeting_agent.parse_meeting_stream(get_client(), text))[-1]
+    return meeting is not None
+
+
+def _confirmation(mode):
+    def run(text):
+        confirmation_agent.process_calendar_request(text, mode=mode)
+        return True
+    return run
+
+
+async def _confirmation_async(text):
+    await confirmation_agent.process_calendar_request_async(text)
+    return True
+
+
+def _adjustment(text):
+    adjustment_agent.process_calendar_request(text)
+    return True
+
+
+def _weather(text):
+    return weather_agent.ask_weather(text).output is not None
+
+
+def _kb(text):
+    return ecommerce_agent.answer_with_llm(text)[0] is not None
+
+
+WORKLOADS = {
+    "meeting.parse_meeting": (MEETINGS, _parse_meeting),
+    "meeting.parse_meeting_stream": (MEETINGS, _parse_meeting_stream),
+    "confirmation (staged)": (CONFIRMATIONS, _confirmation("staged")),
+    "confirmation (fused)": (CONFIRMATIONS, _confirmation("fused")),
+    "confirmation async (staged)": (CONFIRMATIONS, _confirmation_async),
+    "adjustment": (ADJUSTMENTS, _adjustment),
+    "weather": (WEATHER, _weather),
+    "ecommerce (model path)": (KB, _kb),
+}
+
+
+def _timed(function, text) -> tuple:
+    start = time.perf_counter()
+    try:
+        ok = function(text)
+    except Exception:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+async def _timed_async(function, text, semaphore) -> tuple:
+    async with semaphore:
+        start = time.perf_counter()
+        try:
+            ok = await function(text)
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+
+async def _run_async(function, texts: list, concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+    return await asyncio.gather(*(_timed_async(function, text, semaphore) for text in texts))
+
+
+def run(name: str, concurrency: int, n_requests: int) -> dict:
+    inputs, function = WORKLOADS[name]
+    texts = [inputs[i % len(inputs)] for i in range(n_requests)]
+    meters = (get_client(), get_async_client())
+    for meter in meters:
+        meter.reset()
+
+    start = time.perf_counter()
+    if asyncio.iscoroutinefunction(function):
+        outcomes = asyncio.run(_run_async(function, texts, concurrency))
+    else:
+        with ThreadPoolExecutor(concurrency) as pool:
+            outcomes = list(pool.map(lambda text: _timed(function, text), texts))
+    elapsed = time.perf_counter() - start
+
+    summary = summarize_latencies([seconds for seconds, _ in outcomes])
+    return {"agent": name, "concurrency": concurrency, "n": n_requests,
+            "req/s": round(n_requests / elapsed, 1),
+            "failed": sum(not ok for _, ok in outcomes),
+            "p50_ms": summary["p50_ms"], "p95_ms": summary["p95_ms"], "p99_ms": summary["p99_ms"],
+            "llm_calls/req": round(sum(meter.calls for meter in meters) / n_requests, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="requests per agent and concurrency level")
+    parser.add_argument("--agents", nargs="+", choices=list(WORKLOADS), default=list(WORKLOADS))
+    parser.add_argument("--base-latency", type=float, default=0.05, help="seconds per completion")
+    parser.add_argument("--per-completion-token", type=float, default=0.001,
+                        help="seconds per completion token")
+    parser.add_argument("--jitter", type=float, default=0.25)
+    parser.add_argument("--distribution", choices=LatencyModel.DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of completions that fail")
+    parser.add_argument("--max-retries", type=int, default=2, help="retries of the openai client")
+    parser.add_argument("--weather-latency", type=float, default=0.02, help="Open-Meteo stub latency")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    latency = LatencyModel(base_s=args.base_latency, per_completion_token_s=args.per_completion_token,
+                           jitter=args.jitter, seed=1, distribution=args.distribution)
+
+    with MockLLMServer(latency, error_rate=args.error_rate, seed=1) as server, \
+            OpenMeteoStub(args.weather_latency) as stub, \
+            tempfile.TemporaryDirectory() as directory:
+        # the openai client with no response cache in front, so every request reaches the server
+        set_client(
+            UsageMeter(openai.OpenAI(base_url=server.url, api_key="mock", max_retries=args.max_retries,
+                                     http_client=openai.DefaultHttpxClient(trust_env=False))),
+            UsageMeter(openai.AsyncOpenAI(base_url=server.url, api_key="mock", max_retries=args.max_retries,
+                                          http_client=openai.DefaultAsyncHttpxClient(trust_env=False))))
+        weather_client._shared_client = weather_client.WeatherClient(stub.url)
+        weather_client._shared_client.session.trust_env = False
+
+        calendar_db.DB_FILE = os.path.join(directory, "calender.db")
+        repo_root = os.path.dirname(os.path.abspath(calendar_db.__file__))
+        shutil.copy(os.path.join(repo_root, "calender.db"), calendar_db.DB_FILE)
+
+        rows = []
+        for name in args.agents:
+            run(name, 1, 2)  # warm up: imports, prompt compilation, connections
+            for concurrency in args.concurrency:
+                rows.append(run(name, concurrency, args.requests))
+        calendar_db.get_pool().close()
+        stats = server.stats()
+
+    print_table(rows, ["agent", "concurrency", "n", "req/s", "failed", "p50_ms", "p95_ms", "p99_ms",
+                       "llm_calls/req"])
+    print(f"\nmock server: {stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+benchmarks/app_rerun.py
+
+Time of one Streamlit rerun of app.py with a long chat history, against
+the old script that rendered every stored message with st.json on every
+rerun. Uses Streamlit's AppTest, so no browser or server is needed; a
+rerun while a parse is running on the worker is timed too.
+
+to run (needs config.ini, as the agent module reads it on import):
+    python -m benchmarks.app_rerun
+"""
+import argparse
+import os
+import time
+
+from streamlit.testing.v1 import AppTest
+
+from benchmarks.common import print_table, summarize_latencies
+from benchmarks.fake_llm import FakeClient, LatencyModel
+from meeting_worker import MeetingWorker
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "app.py")
+
+# The history part of app.py before it was paginated
+RENDER_ALL = '''
+import streamlit as st
+from calender_meeting_ai_agent import parse_meeting, client
+
+st.title("Meeting Parser Chat")
+for msg in st.session_state["messages"]:
+    with st.chat_message(msg["role"]):
+        if msg["role"] == "assistant" and isinstance(msg["content"], dict):
+            st.json(msg["content"])
+        else:
+            st.markdown(msg["content"])
+st.chat_input("Describe your meeting details...")
+'''
+
+
+def history(n: int) -> list:
+    messages = []
+    for i in range(n // 2):
+        messages.append({"role": "user", "content": f"Lunch with Nora and Mustafa on day {i} at noon"})
+        messages.append({"role": "assistant", "content": {
+            "date": f"2025-07-{1 + i % 28:02d}T12:00:00", "place": "the office",
+            "participants": ["Nora", "Mustafa"]}})
+    return messages
+
+
+def time_reruns(app: AppTest, messages: list, reruns: int, pending=None) -> list:
+    app.session_state["messages"] = messages
+    if pending is not None:
+        app.session_state["pending"] = pending
+    app.run(timeout=30)  # first run: imports and cache_resource
+    latencies = []
+    for _ in range(reruns):
+        start = time.perf_counter()
+        app.run(timeout=30)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--messages", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--reruns", type=int, default=20)
+    args = parser.parse_args()
+
+    # a parse that stays pending for the whole measurement
+    slow_worker = MeetingWorker(FakeClient(LatencyModel(base_s=3600)))
+
+    rows = []
+    for n in args.messages:
+        for label, app, pending in (
+                ("render all (before)", AppTest.from_string(RENDER_ALL, default_timeout=30), None),
+                ("app.py, paginated", AppTest.from_file(APP, default_timeout=30), None),
+                ("app.py, parse running", AppTest.from_file(APP, default_timeout=30),
+                 slow_worker.submit("Lunch with Nora on Friday at noon"))):
+            summary = summarize_latencies(time_reruns(app, history(n), args.reruns, pending))
+            rows.append({"app": label, "messages": n, "p50_ms": summary["p50_ms"], "p95_ms": summary["p95_ms"]})
+
+    print_table(rows, ["app", "messages", "p50_ms", "p95_ms"])
+    slow_worker.shutdown()
+    os._exit(0)  # the pending parse sleeps on a worker thread
+
+
+if __name__ == "__main__":
+    main()
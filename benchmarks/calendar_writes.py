@@ -0,0 +1,75 @@
+"""
+benchmarks/calendar_writes.py
+
+Latency of create and update requests in calendar_adjustment_aiagent with
+the old two-call path (the model writes SQL for access_database_for_events)
+against the typed insert_event / update_event_fields path (one LLM call).
+The router is skipped; each request goes straight to create_new_event or
+update_event. The agent talks to the in-process fake client and writes to
+a temporary copy of the database.
+
+to run (from the repo root): python -m benchmarks.calendar_writes --requests 20
+"""
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import calendar_adjustment_aiagent as agent
+import calendar_db
+from benchmarks.common import UsageMeter, print_table, summarize_latencies
+from benchmarks.fake_llm import FakeClient, LatencyModel
+from llm_client import get_client, set_client
+
+CREATE_REQUEST = "Let's schedule a team lunch next Tuesday at 2pm with Nada and Sana"
+UPDATE_REQUEST = "Can you move the team meeting with Alice, Bob and Charlie to Wednesday at 3pm instead?"
+
+
+def run(operation: str, use_sql_tool: bool, n_requests: int) -> dict:
+    handler = agent.create_new_event if operation == "create" else agent.update_event
+    request = CREATE_REQUEST if operation == "create" else UPDATE_REQUEST
+
+    get_client().reset()
+    latencies = []
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        handler(request, use_sql_tool=use_sql_tool)
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        "operation": operation,
+        "path": "sql tool (before)" if use_sql_tool else "typed (after)",
+        **summarize_latencies(latencies),
+        "llm_calls/req": round(get_client().calls / n_requests, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--requests", type=int, default=20, help="requests per operation and path")
+    parser.add_argument("--base-latency", type=float, default=0.25,
+                        help="fixed latency of one fake completion in seconds")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    set_client(UsageMeter(FakeClient(LatencyModel(base_s=args.base_latency, seed=1))))
+
+    with tempfile.TemporaryDirectory() as directory:
+        calendar_db.DB_FILE = os.path.join(directory, "calender.db")
+        repo_root = os.path.dirname(os.path.abspath(calendar_db.__file__))
+        shutil.copy(os.path.join(repo_root, "calender.db"), calendar_db.DB_FILE)
+
+        rows = [
+            run(operation, use_sql_tool, args.requests)
+            for operation in ("create", "update")
+            for use_sql_tool in (True, False)
+        ]
+        calendar_db.get_pool().close()
+
+    print_table(rows, ["operation", "path", "n", "p50_ms", "p95_ms", "llm_calls/req"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+benchmarks/common.py
+
+Small helpers shared by the benchmark scripts: latency percentiles,
+a usage meter that wraps a client, and table printing.
+"""
+import inspect
+import math
+import threading
+import time
+
+
+def percentile(values, q: float) -> float:
+    """Nearest-rank percentile, q between 0 and 100."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(1, math.ceil(q / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize_latencies(latencies) -> dict:
+    return {
+        "n": len(latencies),
+        "mean_ms": round(1000 * sum(latencies) / len(latencies), 2) if latencies else float("nan"),
+        "p50_ms": round(1000 * percentile(latencies, 50), 2),
+        "p95_ms": round(1000 * percentile(latencies, 95), 2),
+        "p99_ms": round(1000 * percentile(latencies, 99), 2),
+    }
+
+
+def print_table(rows: list, columns: list):
+    """Print a list of dicts as a plain text table."""
+    widths = {
+        column: max(len(column), *(len(str(row.get(column, ""))) for row in rows))
+        for column in columns
+    }
+    print("  ".join(column.ljust(widths[column]) for column in columns))
+    print("  ".join("-" * widths[column] for column in columns))
+    for row in rows:
+        print("  ".join(str(row.get(column, "")).ljust(widths[column]) for column in columns))
+
+
+class UsageMeter:
+    """
+    Wraps a client (sync or async) and adds up `response.usage`
+    of every chat completion made through it.
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.Lock()
+        self.reset()
+
+        wrapped = client.chat.completions.create
+        meter = self
+
+        def create(*args, **kwargs):
+            response = wrapped(*args, **kwargs)
+            if inspect.isawaitable(response):
+                return meter._record_async(response)
+            return meter._record(response)
+
+        self.chat = _Namespace(completions=_Namespace(create=create))
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+
+    def _record(self, response):
+        usage = getattr(response, "usage", None)
+        with self._lock:
+            self.calls += 1
+            if usage is not None:
+                self.prompt_tokens += usage.prompt_tokens or 0
+                self.completion_tokens += usage.completion_tokens or 0
+        return response
+
+    async def _record_async(self, awaitable):
+        return self._record(await awaitable)
+
+
+class Stopwatch:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
+
+
+class _Namespace:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
@@ -0,0 +1,64 @@
+"""
+benchmarks/confirmation_modes.py
+
+Compares the "staged" and "fused" execution modes of
+Calendar_confirmation_aiagent.process_calendar_request:
+p50/p95 latency per request and prompt/completion tokens per request.
+
+By default the agent talks to the in-process fake client; pass --live to
+use the real client configured in config.ini.
+
+to run (from the repo root): python -m benchmarks.confirmation_modes --requests 50
+"""
+import argparse
+import logging
+import time
+
+import Calendar_confirmation_aiagent as agent
+from benchmarks.common import UsageMeter, print_table, summarize_latencies
+from benchmarks.fake_llm import FakeClient, LatencyModel
+from llm_client import get_client, set_client
+
+SAMPLE_REQUESTS = [
+    "Let's schedule a 1h team meeting next Tuesday at 2pm with Said and Arthur to discuss the project roadmap.",
+    "Book a 30 minute call with Nada tomorrow at 10am about the budget",
+    "Can you send an email to Alice and Bob to discuss the project roadmap?",
+    "Schedule lunch with Sana and Omar on Friday at noon",
+]
+
+
+def run_mode(mode: str, n_requests: int) -> dict:
+    meter = get_client()
+    meter.reset()
+    latencies = []
+    for i in range(n_requests):
+        start = time.perf_counter()
+        agent.process_calendar_request(SAMPLE_REQUESTS[i % len(SAMPLE_REQUESTS)], mode=mode)
+        latencies.append(time.perf_counter() - start)
+
+    row = {"mode": mode, **summarize_latencies(latencies)}
+    row["calls/req"] = round(meter.calls / n_requests, 2)
+    row["prompt_tokens/req"] = round(meter.prompt_tokens / n_requests, 1)
+    row["completion_tokens/req"] = round(meter.completion_tokens / n_requests, 1)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--requests", type=int, default=40, help="requests per mode")
+    parser.add_argument("--live", action="store_true", help="call the real API instead of the fake client")
+    parser.add_argument("--base-latency", type=float, default=0.25,
+                        help="fixed latency of one fake completion in seconds")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    client = get_client() if args.live else FakeClient(LatencyModel(base_s=args.base_latency, seed=1))
+    set_client(UsageMeter(client))
+
+    rows = [run_mode(mode, args.requests) for mode in agent.EXECUTION_MODES]
+    print_table(rows, ["mode", "n", "p50_ms", "p95_ms", "calls/req",
+                       "prompt_tokens/req", "completion_tokens/req"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+benchmarks/db_queries.py
+
+Lookup latency on the version 2 calendar schema: by event name, by date
+range and by participant, on a database filled with synthetic events
+(one million by default). The database is built in a temporary directory.
+
+to run (from the repo root): python -m benchmarks.db_queries --events 1000000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import calendar_db
+from benchmarks.common import print_table, summarize_latencies
+
+N_NAMES = 20_000
+N_PARTICIPANTS = 50_000
+
+
+def populate(path: str, n_events: int, seed: int = 1):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    conn = sqlite3.connect(path)
+    calendar_db.migrate(conn)
+
+    def rows():
+        for _ in range(n_events):
+            date = start + timedelta(minutes=15 * rng.randrange(4 * 24 * 730))
+            participants = ",".join(
+                f"person{rng.randrange(N_PARTICIPANTS)}" for _ in range(rng.randint(1, 4)))
+            yield (f"event {rng.randrange(N_NAMES)}", date.isoformat(), rng.choice((15, 30, 60, 90)),
+                   participants)
+
+    conn.executemany(
+        "INSERT INTO calender_events (name_of_event, date, duration_minutes, participants) "
+        "VALUES (?, ?, ?, ?)", rows())
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def time_queries(label: str, query, args_list) -> dict:
+    latencies, n_rows = [], 0
+    for args in args_list:
+        start = time.perf_counter()
+        n_rows += len(query(*args))
+        latencies.append(time.perf_counter() - start)
+    return {"query": label, **summarize_latencies(latencies),
+            "rows/query": round(n_rows / len(args_list), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=500, help="queries per lookup type")
+    args = parser.parse_args()
+
+    rng = random.Random(2)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "calender.db")
+        start = time.perf_counter()
+        populate(path, args.events)
+        print(f"Inserted {args.events} events in {time.perf_counter() - start:.1f}s")
+
+        def day_window():
+            day = datetime(2024, 1, 1) + timedelta(days=rng.randrange(730))
+            return (day.isoformat(), (day + timedelta(days=1)).isoformat(), 100, path)
+
+        rows = [
+            time_queries("by name", calendar_db.events_named,
+                         [(f"event {rng.randrange(N_NAMES)}", path) for _ in range(args.queries)]),
+            time_queries("by date range (1 day)", calendar_db.events_in_range,
+                         [day_window() for _ in range(args.queries)]),
+            time_queries("by participant", calendar_db.events_with_participant,
+                         [(f"person{rng.randrange(N_PARTICIPANTS)}", 100, path)
+                          for _ in range(args.queries)]),
+        ]
+        calendar_db.get_pool(path).close()
+
+    print_table(rows, ["query", "n", "p50_ms", "p95_ms", "p99_ms", "rows/query"])
+
+
+if __name__ == "__main__":
+    main()
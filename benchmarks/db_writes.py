@@ -0,0 +1,115 @@
+"""
+benchmarks/db_writes.py
+
+Writes/sec into calender_events at 1, 8 and 32 concurrent writer threads,
+comparing the old access pattern (a fresh sqlite3.connect per write,
+followed by a full-table dump) with the pooled WAL connections of
+calendar_db. Each run uses a fresh database in a temporary directory.
+
+to run (from the repo root): python -m benchmarks.db_writes --writes 200
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from benchmarks.common import print_table
+from calendar_db import ConnectionPool
+
+CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS calender_events (
+    name_of_event TEXT NOT NULL,
+    date TEXT NOT NULL,
+    duration_minutes INTEGER NOT NULL,
+    participants TEXT NOT NULL)
+"""
+
+INSERT = """
+INSERT INTO calender_events (name_of_event, date, duration_minutes, participants)
+VALUES (?, ?, ?, ?)
+"""
+
+
+def _row(writer: int, i: int) -> tuple:
+    return (f"event {writer}-{i}", "2025-09-02T14:00:00", 60, "Alice,Bob,Charlie")
+
+
+def write_per_connection(path: str, writer: int, n_writes: int):
+    """What access_database_for_events used to do for every write."""
+    for i in range(n_writes):
+        conn = sqlite3.connect(path)
+        cursor = conn.cursor()
+        cursor.execute(INSERT, _row(writer, i))
+        conn.commit()
+        cursor.execute("SELECT * FROM calender_events")
+        cursor.fetchall()
+        conn.close()
+
+
+def write_pooled(pool: ConnectionPool, writer: int, n_writes: int):
+    for i in range(n_writes):
+        with pool.connection() as conn:
+            conn.execute(INSERT, _row(writer, i))
+            conn.commit()
+
+
+def run(strategy: str, n_writers: int, n_writes: int) -> dict:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "calender.db")
+        conn = sqlite3.connect(path)
+        conn.execute(CREATE_TABLE)
+        conn.close()
+
+        # both strategies write to the same version 1 table
+        pool = ConnectionPool(path, size=n_writers, migrate=False) if strategy == "pooled" else None
+        errors = []
+
+        def writer(index: int):
+            try:
+                if pool is None:
+                    write_per_connection(path, index, n_writes)
+                else:
+                    write_pooled(pool, index, n_writes)
+            except sqlite3.OperationalError as e:
+                errors.append(str(e))
+
+        threads = [threading.Thread(target=writer, args=(index,)) for index in range(n_writers)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        conn = sqlite3.connect(path)
+        written = conn.execute("SELECT COUNT(*) FROM calender_events").fetchone()[0]
+        conn.close()
+        if pool is not None:
+            pool.close()
+
+    return {
+        "strategy": strategy,
+        "writers": n_writers,
+        "rows_written": written,
+        "writes/sec": round(written / elapsed, 1),
+        "failed_writers": len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--writes", type=int, default=200, help="writes per writer thread")
+    args = parser.parse_args()
+
+    rows = [
+        run(strategy, n_writers, args.writes)
+        for n_writers in (1, 8, 32)
+        for strategy in ("per-connection", "pooled")
+    ]
+    print_table(rows, ["strategy", "writers", "rows_written", "writes/sec", "failed_writers"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+"""
+benchmarks/fake_llm.py
+
+In-process stand-in for the OpenAI client, so the agents can be benchmarked
+without calling the DeepSeek API.
+
+FakeClient / AsyncFakeClient answer `chat.completions.create` with real
+`ChatCompletion` objects. The content comes from a responder (by default
+`scripted_response`, which knows the prompts of our agents), token usage is
+estimated from the request and response size, and each call sleeps for a
+latency drawn from a LatencyModel.
+
+With stream=True the content comes back as ChatCompletionChunk objects of
+about one token (four characters) each: the first one after the prompt
+part of the latency, then one per completion token, and with
+stream_options={"include_usage": True} a last chunk with the usage.
+"""
+import asyncio
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count, about four characters per token."""
+    return math.ceil(len(text) / 4) if text else 0
+
+
+def _message_text(message) -> str:
+    if isinstance(message, dict):
+        content = message.get("content") or ""
+        tool_calls = message.get("tool_calls") or []
+    else:
+        content = getattr(message, "content", None) or ""
+        tool_calls = getattr(message, "tool_calls", None) or []
+    if tool_calls:
+        content += json.dumps([
+            call if isinstance(call, dict) else call.model_dump() for call in tool_calls
+        ])
+    return content
+
+
+def _system_prompt(request: dict) -> str:
+    for message in request.get("messages", []):
+        role = message.get("role") if isinstance(message, dict) else getattr(message, "role", None)
+        if role == "system":
+            return _message_text(message)
+    return ""
+
+
+def _tool_result(request: dict):
+    """Content of the tool message the request ends with, or None."""
+    messages = request.get("messages", [])
+    last = messages[-1] if messages else None
+    if isinstance(last, dict) and last.get("role") == "tool":
+        return last.get("content")
+    return None
+
+
+def _last_user_message(request: dict) -> str:
+    for message in reversed(request.get("messages", [])):
+        role = message.get("role") if isinstance(message, dict) else getattr(message, "role", None)
+        if role == "user":
+            return _message_text(message)
+    return ""
+
+
+class LatencyModel:
+    """
+    Latency of a fake completion: a fixed base, a cost per prompt token and
+    per completion token, times a jitter factor drawn from `distribution`:
+      lognormal    (default) median 1, sigma = jitter; a long right tail like real APIs
+      normal       mean 1, standard deviation = jitter (never below 0)
+      exponential  1 - jitter plus an exponential part with mean jitter; rare very slow calls
+      constant     always 1
+    """
+
+    DISTRIBUTIONS = ("lognormal", "normal", "exponential", "constant")
+
+    def __init__(self, base_s: float = 0.25, per_prompt_token_s: float = 0.00005,
+                 per_completion_token_s: float = 0.01, jitter: float = 0.25, seed: int = None,
+                 distribution: str = "lognormal"):
+        if distribution not in self.DISTRIBUTIONS:
+            raise ValueError(f"distribution must be one of {self.DISTRIBUTIONS}, not {distribution!r}")
+        self.base_s = base_s
+        self.per_prompt_token_s = per_prompt_token_s
+        self.per_completion_token_s = per_completion_token_s
+        self.jitter = jitter
+        self.distribution = distribution
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _factor(self) -> float:
+        if not self.jitter or self.distribution == "constant":
+            return 1.0
+        with self._lock:
+            if self.distribution == "normal":
+                return max(0.0, self._random.gauss(1, self.jitter))
+            if self.distribution == "exponential":
+                return max(0.0, 1 - self.jitter) + self._random.expovariate(1 / self.jitter)
+            return self._random.lognormvariate(0, self.jitter)
+
+    def sample(self, prompt_tokens: int, completion_tokens: int) -> float:
+        factor = self._factor()
+        return factor * (self.base_s
+                         + self.per_prompt_token_s * prompt_tokens
+                         + self.per_completion_token_s * completion_tokens)
+
+
+# --------------------------------------------------------------
+# Scripted responses for the agents' prompts
+# --------------------------------------------------------------
+
+def _looks_like_event(text: str) -> bool:
+    return bool(re.search(r"\b(schedule|meeting|book|call|lunch|appointment)\b", text, re.I)) \
+        and not re.search(r"\bemail\b", text, re.I)
+
+
+def _event_details(text: str) -> dict:
+    return {
+        "name_of_event": "Team meeting",
+        "date": "2025-09-02T14:00:00",
+        "duration_minutes": 60,
+        "participants": re.findall(r"\b[A-Z][a-z]+\b", text)[1:4] or ["Alice"],
+    }
+
+
+def _confirmation(details: dict) -> str:
+    return (f"Your event '{details['name_of_event']}' is scheduled for {details['date']} "
+            f"for {details['duration_minutes']} minutes with "
+            f"{', '.join(details['participants'])}. Best regards, Bob")
+
+
+def _fused_calendar_request(request):
+    text = _last_user_message(request)
+    is_event = _looks_like_event(text)
+    result = {"description": text, "is_calendar_event": is_event, "confidence_score": 0.95}
+    if is_event:
+        details = _event_details(text)
+        result.update(details, confirmation_message=_confirmation(details))
+    else:
+        result.update(name_of_event=None, date=None, duration_minutes=None,
+                      participants=None, confirmation_message=None)
+    return {"content": json.dumps(result)}
+
+
+def _event_extraction(request):
+    text = _last_user_message(request)
+    return {"content": json.dumps({
+        "description": text,
+        "is_calendar_event": _looks_like_event(text),
+        "confidence_score": 0.95,
+    })}
+
+
+def _event_details_extraction(request):
+    return {"content": json.dumps(_event_details(_last_user_message(request)))}
+
+
+def _confirmation_message(request):
+    details = json.loads(_last_user_message(request))
+    return {"content": json.dumps({"confirmation_message": _confirmation(details)})}
+
+
+def _calendar_request_type(request):
+    text = _last_user_message(request)
+    if re.search(r"\b(move|change|reschedule|update|rename)\b", text, re.I):
+        request_type = "update"
+    elif _looks_like_event(text):
+        request_type = "create"
+    else:
+        request_type = "other"
+    return {"content": json.dumps({
+        "request_type": request_type, "confidence_score": 0.9, "description": text})}
+
+
+def _create_event_extraction(request):
+    details = _event_details(_last_user_message(request))
+    details["duration"] = details.pop("duration_minutes")
+    return {"content": json.dumps(details)}
+
+
+def _update_event_extraction(request):
+    # pick the best candidate event listed at the end of the system prompt
+    candidates = re.search(r"participants\):\s*(\[.*\])", _system_prompt(request), re.S)
+    rows = json.loads(candidates.group(1)) if candidates else []
+    return {"content": json.dumps({
+        "event_id": rows[0][0] if rows else None,
+        "name_of_event": rows[0][1] if rows else "team meeting",
+        "requested_changes": [{"field_to_update": "date", "new_value": "2025-09-03T15:00:00"}],
+    })}
+
+
+def _meeting_extraction(request):
+    text = _last_user_message(request)
+    return {"content": json.dumps({
+        "date": "2025-07-20T21:00:00",
+        "place": "the office",
+        "participants": re.findall(r"\b[A-Z][a-z]+\b", text)[:3] or ["Nora"],
+    }, indent=2)}
+
+
+def _sql_literal(value) -> str:
+    if isinstance(value, list):
+        value = ",".join(value)
+    if isinstance(value, (int, float)):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _insert_event_sql(request):
+    if _tool_result(request) is not None:
+        return {"content": "The event was added to the calendar."}
+    details = json.loads(_last_user_message(request))
+    values = ", ".join(_sql_literal(details[key])
+                       for key in ("name_of_event", "date", "duration", "participants"))
+    query = ("INSERT INTO calender_events (name_of_event, date, duration_minutes, participants) "
+             f"VALUES ({values})")
+    return {"tool_calls": [{"name": "access_database_for_events", "arguments": {"query": query}}]}
+
+
+def _update_event_sql(request):
+    if _tool_result(request) is not None:
+        return {"content": "The event was updated."}
+    update = json.loads(_last_user_message(request))
+    assignments = ", ".join(f"{change['field_to_update']} = {_sql_literal(change['new_value'])}"
+                            for change in update["requested_changes"])
+    query = (f"UPDATE calender_events SET {assignments} "
+             f"WHERE name_of_event = {_sql_literal(update['name_of_event'])}")
+    return {"tool_calls": [{"name": "access_database_for_events", "arguments": {"query": query}}]}
+
+
+# city -> (latitude, longitude), for the weather questions of the benchmarks
+CITIES = {
+    "berlin": (52.52, 13.41), "paris": (48.85, 2.35), "tokyo": (35.68, 139.69),
+    "cairo": (30.04, 31.24), "new york": (40.71, -74.01), "sydney": (-33.87, 151.21),
+}
+
+
+def _tool_json(content):
+    try:
+        return json.loads(content)
+    except (TypeError, ValueError):
+        return None
+
+
+def _weather(request):
+    result = _tool_json(_tool_result(request))
+    if result is None and request.get("tool_choice") != "none":
+        text = _last_user_message(request).lower()
+        calls = [{"name": "get_weather", "arguments": {"latitude": latitude, "longitude": longitude}}
+                 for city, (latitude, longitude) in CITIES.items() if city in text]
+        return {"tool_calls": calls or [{"name": "get_weather",
+                                         "arguments": {"latitude": 52.52, "longitude": 13.41}}]}
+    temperature = result.get("temperature_2m", 18.4) if isinstance(result, dict) else 18.4
+    return {"content": json.dumps({"temperature": temperature,
+                                   "response": f"It is {temperature} degrees right now."})}
+
+
+def _kb_answer(request):
+    result = _tool_json(_tool_result(request))
+    if result is None and request.get("tool_choice") != "none":
+        return {"tool_calls": [{"name": "search_kb",
+                                "arguments": {"question": _last_user_message(request), "k": 3}}]}
+    records = result.get("records") if isinstance(result, dict) else None
+    if not records:
+        return {"content": json.dumps({"answer": "I don't know the answer to that question.", "source": 0})}
+    return {"content": json.dumps({"answer": records[0]["answer"], "source": records[0]["id"]})}
+
+
+# (pattern searched in the system prompt, responder); first match wins.
+SCRIPTS = [
+    # Calendar_confirmation_aiagent.py
+    (r"write a natural language confirmation message", _fused_calendar_request),
+    (r"Analyze if the text describes a calendar event", _event_extraction),
+    (r"Extract the calendar event details", _event_details_extraction),
+    (r"Generate a natural language confirmation message", _confirmation_message),
+    # calender_meeting_ai_agent.py
+    (r"extracts meeting details and outputs STRICT JSON", _meeting_extraction),
+    # calendar_adjustment_aiagent.py
+    (r"Determine if this is a request to create a new calendar event", _calendar_request_type),
+    (r"Extract details for creating a new calendar event", _create_event_extraction),
+    (r"Extract details for updating an existing calendar event", _update_event_extraction),
+    (r"Insert the new calendar event into the database", _insert_event_sql),
+    (r"Update the calendar event in the database", _update_event_sql),
+    # weather_ai_agent.py
+    (r"You are a helpful weather assistant", _weather),
+    # ecommerce_assistant_aiagent.py
+    (r"answers questions\s+from the knowledge base", _kb_answer),
+]
+
+
+def scripted_response(request: dict) -> dict:
+    """
+    Answer a chat completion request made by one of the agents.
+    Returns {"content": str} or {"tool_calls": [{"name": ..., "arguments": {...}}]}.
+    """
+    system_prompt = _system_prompt(request)
+    for pattern, responder in SCRIPTS:
+        if re.search(pattern, system_prompt):
+            return responder(request)
+    return {"content": "{}"}
+
+
+# --------------------------------------------------------------
+# Clients
+# --------------------------------------------------------------
+
+class FakeClient:
+    """Drop-in replacement for `OpenAI` that never leaves the process."""
+
+    def __init__(self, latency: LatencyModel = None, responder=scripted_response):
+        self.latency = latency or LatencyModel()
+        self.responder = responder
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _build(self, request: dict) -> tuple:
+        answer = self.responder(request)
+
+        prompt_text = "".join(_message_text(message) for message in request.get("messages", []))
+        if request.get("tools"):
+            prompt_text += json.dumps(request["tools"])
+
+        message = {"role": "assistant", "content": answer.get("content")}
+        completion_text = answer.get("content") or ""
+        finish_reason = "stop"
+        if answer.get("tool_calls"):
+            message["tool_calls"] = [
+                {
+                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                    "type": "function",
+                    "function": {"name": call["name"], "arguments": json.dumps(call["arguments"])},
+                }
+                for call in answer["tool_calls"]
+            ]
+            completion_text += json.dumps(message["tool_calls"])
+            finish_reason = "tool_calls"
+
+        prompt_tokens = estimate_tokens(prompt_text)
+        completion_tokens = estimate_tokens(completion_text)
+        completion = ChatCompletion.model_validate({
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "deepseek-chat"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        })
+        return completion, self.latency.sample(prompt_tokens, completion_tokens)
+
+    def _chunks(self, completion: ChatCompletion) -> tuple:
+        """
+        The completion as stream chunks, and the delay before the first and
+        between the others. Tool calls come whole, in one delta after the content.
+        """
+        choice = completion.choices[0]
+        content = choice.message.content or ""
+        deltas = [{"content": content[i:i + 4]} for i in range(0, len(content), 4)]
+        if choice.message.tool_calls:
+            deltas.append({"tool_calls": [{"index": i, **call.model_dump()}
+                                          for i, call in enumerate(choice.message.tool_calls)]})
+        deltas = deltas or [{"content": ""}]
+        first_s = self.latency.sample(completion.usage.prompt_tokens, 0)
+        per_chunk_s = self.latency.per_completion_token_s
+        chunks = [
+            ChatCompletionChunk.model_validate({
+                "id": completion.id,
+                "object": "chat.completion.chunk",
+                "created": completion.created,
+                "model": completion.model,
+                "choices": [{"index": 0, "delta": delta,
+                             "finish_reason": choice.finish_reason if i == len(deltas) - 1 else None}],
+            })
+            for i, delta in enumerate(deltas)
+        ]
+        return chunks, first_s, per_chunk_s
+
+    def _stream_chunks(self, request: dict, completion: ChatCompletion) -> tuple:
+        """_chunks, plus the usage chunk if the request asks for it."""
+        chunks, first_s, per_chunk_s = self._chunks(completion)
+        if (request.get("stream_options") or {}).get("include_usage"):
+            chunks.append(ChatCompletionChunk.model_validate({
+                "id": completion.id, "object": "chat.completion.chunk", "created": completion.created,
+                "model": completion.model, "choices": [], "usage": completion.usage.model_dump()}))
+        return chunks, first_s, per_chunk_s
+
+    def _stream(self, request: dict, completion: ChatCompletion):
+        chunks, first_s, per_chunk_s = self._stream_chunks(request, completion)
+        time.sleep(first_s)
+        for i, chunk in enumerate(chunks):
+            if i:
+                time.sleep(per_chunk_s)
+            yield chunk
+
+    def _create(self, **request):
+        completion, delay = self._build(request)
+        if request.get("stream"):
+            return self._stream(request, completion)
+        time.sleep(delay)
+        return completion
+
+
+class AsyncFakeClient(FakeClient):
+    """Drop-in replacement for `AsyncOpenAI`."""
+
+    async def _stream_async(self, request: dict, completion: ChatCompletion):
+        chunks, first_s, per_chunk_s = self._stream_chunks(request, completion)
+        await asyncio.sleep(first_s)
+        for i, chunk in enumerate(chunks):
+            if i:
+                await asyncio.sleep(per_chunk_s)
+            yield chunk
+
+    async def _create(self, **request):
+        completion, delay = self._build(request)
+        if request.get("stream"):
+            return self._stream_async(request, completion)
+        await asyncio.sleep(delay)
+        return completion
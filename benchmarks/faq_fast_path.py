@@ -0,0 +1,119 @@
+"""
+benchmarks/faq_fast_path.py
+
+Threshold sweep for the FAQ fast path (faq_matcher.py) on a synthetic
+knowledge base. Each question is a variant of a KB question (verbatim,
+re-cased and re-punctuated, with a typo, with a word dropped, reworded) or
+a question the KB does not contain. For each threshold and min_margin it reports how often
+the fast path answers, how often that answer is the wrong record, and the
+match latency, next to the latency of the two-call LLM path on the fake
+client's latency model.
+
+to run (from the repo root): python -m benchmarks.faq_fast_path --records 10000
+"""
+import argparse
+import itertools
+import logging
+import random
+import time
+
+from benchmarks.common import percentile, print_table, summarize_latencies
+from benchmarks.fake_llm import LatencyModel
+from benchmarks.kb_search import PRODUCTS, synthetic_kb
+from faq_matcher import FAQMatcher
+
+
+def _typo(text: str, rng) -> str:
+    i = rng.randrange(len(text) - 1)
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+def _drop_word(text: str, rng) -> str:
+    words = text.split()
+    del words[rng.randrange(1, len(words) - 1)]
+    return " ".join(words)
+
+
+VARIANTS = {
+    "verbatim": lambda question, rng: question,
+    "case/punctuation": lambda question, rng: question.upper().rstrip("?") + " ??",
+    "typo": _typo,
+    "word dropped": _drop_word,
+    "reworded": lambda question, rng: question.replace("What is the", "Tell me about your")
+                                              .replace(" policy for ", " rules on "),
+}
+
+
+def labelled_questions(records: list, n: int, seed: int = 3) -> list:
+    """(question, expected record id or None)"""
+    rng = random.Random(seed)
+    questions = []
+    for _ in range(n):
+        record = rng.choice(records)
+        variant = rng.choice(list(VARIANTS))
+        questions.append((variant, VARIANTS[variant](record["question"], rng), record["id"]))
+    for _ in range(n // 5):
+        questions.append(("not in KB", f"Can I pay for {rng.choice(PRODUCTS)} in bitcoin?", None))
+    return questions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--records", type=int, default=10_000)
+    parser.add_argument("--questions", type=int, default=1000)
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.75, 0.85, 0.9, 0.95])
+    parser.add_argument("--margins", type=float, nargs="+", default=[0.0, 0.05])
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    records = synthetic_kb(args.records)
+    # the synthetic KB repeats questions; keep the first record for each
+    seen, unique = set(), []
+    for record in records:
+        if record["question"] not in seen:
+            seen.add(record["question"])
+            unique.append(record)
+
+    start = time.perf_counter()
+    matcher = FAQMatcher(unique)
+    print(f"Indexed {len(matcher)} questions in {time.perf_counter() - start:.2f}s")
+
+    questions = labelled_questions(unique, args.questions)
+    scored = []
+    latencies = []
+    for variant, question, expected in questions:
+        start = time.perf_counter()
+        record, score, margin = matcher.best_match(question)
+        latencies.append(time.perf_counter() - start)
+        scored.append((variant, record["id"] if record else None, score, margin, expected))
+
+    rows = []
+    for threshold, min_margin in itertools.product(args.thresholds, args.margins):
+        matcher.threshold, matcher.min_margin = threshold, min_margin
+        answered = [(found, expected) for _, found, score, margin, expected in scored
+                    if matcher.is_hit(score, margin)]
+        wrong = sum(found != expected for found, expected in answered)
+        by_variant = {}
+        for variant, found, score, margin, expected in scored:
+            hits, total = by_variant.get(variant, (0, 0))
+            by_variant[variant] = (hits + (matcher.is_hit(score, margin) and found == expected), total + 1)
+        rows.append({
+            "threshold": threshold,
+            "min_margin": min_margin,
+            "fast path rate": round(len(answered) / len(scored), 3),
+            "wrong answers": wrong,
+            **{variant: f"{hits}/{total}" for variant, (hits, total) in by_variant.items()},
+        })
+
+    print_table(rows, ["threshold", "min_margin", "fast path rate", "wrong answers", *VARIANTS, "not in KB"])
+
+    latency = LatencyModel(seed=1)
+    llm_path = [latency.sample(400, 40) + latency.sample(700, 60) for _ in range(1000)]
+    print()
+    print(f"match p50/p99: {summarize_latencies(latencies)['p50_ms']} / "
+          f"{summarize_latencies(latencies)['p99_ms']} ms, "
+          f"two-call LLM path p50 (fake latency model): {round(1000 * percentile(llm_path, 50))} ms")
+
+
+if __name__ == "__main__":
+    main()
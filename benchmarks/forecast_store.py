@@ -0,0 +1,98 @@
+"""
+benchmarks/forecast_store.py
+
+Later-time weather questions ("at 6pm", "tonight") against the local
+Open-Meteo stub: fetching the forecast again for each question (what the
+agent had to do, as get_weather only kept "current") against interpolating
+from the hourly series kept in forecast_store. Also compares the memory of
+a cell's hourly block as parsed JSON and as a NumPy series, and shows the
+LRU bound holding across many locations.
+
+to run (from the repo root): python -m benchmarks.forecast_store --cities 50
+"""
+import argparse
+import json
+import logging
+import random
+import time
+import tracemalloc
+
+from benchmarks.common import print_table, summarize_latencies
+from benchmarks.open_meteo_stub import forecast as stub_forecast
+from benchmarks.open_meteo_stub import OpenMeteoStub
+from forecast_store import HourlySeries
+from weather_client import WeatherClient
+
+LATER_TIMES = ["2025-09-01T18:00", "2025-09-01T21:00", "2025-09-02T09:00", "2025-09-02T13:30",
+               "2025-09-03T07:15"]
+
+
+def new_client(url: str, **kwargs) -> WeatherClient:
+    client = WeatherClient(url, **kwargs)
+    client.session.trust_env = False
+    return client
+
+
+def ask(client: WeatherClient, locations: list, fetch_every_time: bool) -> dict:
+    latencies = []
+    for latitude, longitude in locations:
+        client.current(latitude, longitude)
+        for when in LATER_TIMES:
+            start = time.perf_counter()
+            if fetch_every_time:
+                client.clear()
+            client.weather_at(latitude, longitude, when)
+            latencies.append(time.perf_counter() - start)
+    return summarize_latencies(latencies)
+
+
+def measure_memory(build) -> int:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = build()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    return used
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--cities", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub latency in seconds")
+    parser.add_argument("--store-bytes", type=int, default=256 * 1024, help="store bound for the LRU check")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    rng = random.Random(1)
+    locations = [(rng.uniform(-60, 60), rng.uniform(-180, 180)) for _ in range(args.cities)]
+
+    rows = []
+    with OpenMeteoStub(args.latency) as stub:
+        for label, fetch_every_time in (("fetch per question (before)", True),
+                                        ("hourly store (after)", False)):
+            client = new_client(stub.url)
+            requests_before = stub.requests
+            summary = ask(client, locations, fetch_every_time)
+            rows.append({"later-time questions": label, **summary,
+                         "http requests": stub.requests - requests_before})
+
+    # LRU bound across many more locations than fit
+    with OpenMeteoStub(latency_s=0) as stub:
+        client = new_client(stub.url, max_store_bytes=args.store_bytes)
+        for _ in range(2000):
+            client.current(rng.uniform(-60, 60), rng.uniform(-180, 180))
+        bounded = client.store.stats()
+
+    print_table(rows, ["later-time questions", "n", "p50_ms", "p95_ms", "http requests"])
+
+    body = json.dumps(stub_forecast(52.52, 13.41, timezone="auto"))
+    json_bytes = measure_memory(lambda: json.loads(body)["hourly"])
+    numpy_bytes = measure_memory(lambda: HourlySeries(json.loads(body), 0))
+    print(f"\nhourly block of one cell: {json_bytes} bytes as parsed JSON, "
+          f"{numpy_bytes} bytes as a NumPy series ({HourlySeries(json.loads(body), 0).nbytes} in arrays)")
+    print(f"store bound {args.store_bytes} bytes after 2000 locations: {bounded}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+benchmarks/import_time.py
+
+Cold-start cost of importing each agent module, from `python -X importtime`
+in a fresh interpreter per run (so nothing is cached in sys.modules). The
+median of the module's cumulative import time is compared to a target, and
+the script exits with status 1 if a module is over it, so it can gate a CI job.
+A module holding only a pydantic model is timed for reference: pydantic
+alone is close to the target, so the agents import it, and define their
+response models, on first use.
+
+to run (from the repo root): python -m benchmarks.import_time
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from benchmarks.common import print_table
+
+AGENT_MODULES = [
+    "calender_meeting_ai_agent",
+    "Calendar_confirmation_aiagent",
+    "calendar_adjustment_aiagent",
+    "weather_ai_agent",
+    "ecommerce_assistant_aiagent",
+]
+
+# a module with nothing but a pydantic model: what an agent would cost if it defined one
+REFERENCE_MODULE = "CalendarMeeting"
+
+# modules that must not be imported just by importing an agent
+HEAVY_MODULES = ("openai", "requests", "numpy", "pydantic")
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.realpath(__file__)))
+
+_LINE = re.compile(r"import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)")
+
+
+def import_times(module: str) -> tuple:
+    """
+    One fresh interpreter: the cumulative microseconds of importing `module`,
+    its direct imports as {name: microseconds}, and every module it loaded.
+    """
+    env = {**os.environ, "PYTHONPATH": REPO_ROOT, "PYTHONDONTWRITEBYTECODE": "1"}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True, env=env, cwd=REPO_ROOT)
+    if result.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{result.stderr[-2000:]}")
+
+    # -X importtime prints a module after its imports, indented by depth
+    entries = [(match.group(3), int(match.group(1)), len(match.group(2)))
+               for match in map(_LINE.match, result.stderr.splitlines()) if match]
+    end = max(i for i, (name, _, _) in enumerate(entries) if name == module)
+    start = end
+    while start > 0 and entries[start - 1][2] > entries[end][2]:
+        start -= 1
+    children = entries[start:end]
+    depth = min((level for _, _, level in children), default=0)
+    direct = {name: us for name, us, level in children if level == depth}
+    return entries[end][1], direct, {name for name, _, _ in children}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--runs", type=int, default=7, help="fresh interpreters per module")
+    parser.add_argument("--target-ms", type=float, default=200.0)
+    parser.add_argument("modules", nargs="*", default=AGENT_MODULES)
+    args = parser.parse_args()
+
+    rows, over = [], []
+    for module in [REFERENCE_MODULE] + args.modules:
+        runs = [import_times(module) for _ in range(args.runs)]
+        total_ms = statistics.median(total for total, _, _ in runs) / 1000
+        _, direct, loaded = runs[-1]
+        heaviest = sorted(direct.items(), key=lambda item: item[1], reverse=True)[:3]
+        rows.append({
+            "module": module,
+            "import_ms": round(total_ms, 1),
+            "ok": total_ms <= args.target_ms,
+            "heavy modules loaded": ", ".join(name for name in HEAVY_MODULES if name in loaded) or "-",
+            "heaviest imports": ", ".join(f"{name} {us / 1000:.0f}ms" for name, us in heaviest),
+        })
+        if module == REFERENCE_MODULE:
+            rows[-1].update(module=f"{module} (pydantic only)", ok="")
+        elif total_ms > args.target_ms:
+            over.append(module)
+
+    print(f"target: {args.target_ms:.0f} ms, median of {args.runs} runs")
+    print_table(rows, ["module", "import_ms", "ok", "heavy modules loaded", "heaviest imports"])
+    if over:
+        print(f"over target: {', '.join(over)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+benchmarks/kb_search.py
+
+The e-commerce assistant's knowledge base tool at 10k and 100k records:
+the old load_kb (reopen and parse kb.json on every call, return all of it)
+against search_kb (BM25 index built once, top-k records returned).
+Reports per-call latency and the prompt tokens the tool result adds.
+The synthetic knowledge bases are written to a temporary directory.
+
+to run (from the repo root): python -m benchmarks.kb_search --sizes 10000 100000
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.common import print_table, summarize_latencies
+from benchmarks.fake_llm import estimate_tokens
+from kb_search import DEFAULT_K, KnowledgeBase
+
+TOPICS = ["return", "refund", "shipping", "delivery", "payment", "warranty", "order", "account",
+          "discount", "coupon", "gift card", "exchange", "size", "tracking", "invoice", "subscription"]
+PRODUCTS = [f"product{i}" for i in range(5_000)]
+WORDS = ("please note that customers can contact support team within business days after purchase "
+         "original receipt store credit fees may apply depending destination our policy allows "
+         "items online in store securely processed standard express available").split()
+
+
+def synthetic_kb(n_records: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    records = []
+    for i in range(n_records):
+        topic, product = rng.choice(TOPICS), rng.choice(PRODUCTS)
+        answer = " ".join(rng.choice(WORDS) for _ in range(rng.randint(20, 40)))
+        records.append({
+            "id": i + 1,
+            "question": f"What is the {topic} policy for {product}?",
+            "answer": f"For {product}, {topic}: {answer}.",
+        })
+    return records
+
+
+def load_kb(path: str):
+    """What the assistant's tool used to do on every call."""
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def time_calls(tool, questions) -> tuple:
+    latencies, tokens = [], 0
+    for question in questions:
+        start = time.perf_counter()
+        result = tool(question)
+        latencies.append(time.perf_counter() - start)
+        tokens += estimate_tokens(json.dumps(result))
+    return summarize_latencies(latencies), tokens // len(questions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=500, help="search_kb calls per size")
+    parser.add_argument("--load-calls", type=int, default=10, help="load_kb calls per size")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    rng = random.Random(2)
+    rows = []
+    for size in args.sizes:
+        questions = [f"how does {rng.choice(TOPICS)} work for {rng.choice(PRODUCTS)}"
+                     for _ in range(args.queries)]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "kb.json")
+            with open(path, "w") as f:
+                json.dump({"records": synthetic_kb(size)}, f)
+
+            latency, tokens = time_calls(lambda question: load_kb(path), questions[:args.load_calls])
+            rows.append({"records": size, "tool": "load_kb (before)", **latency, "result_tokens": tokens})
+
+            start = time.perf_counter()
+            kb = KnowledgeBase.from_file(path)
+            build_ms = round(1000 * (time.perf_counter() - start), 1)
+
+            latency, tokens = time_calls(lambda question: {"records": kb.search(question, DEFAULT_K)},
+                                         questions)
+            rows.append({"records": size, "tool": "search_kb (after)", **latency,
+                         "result_tokens": tokens, "build_ms": build_ms})
+
+    print_table(rows, ["records", "tool", "n", "p50_ms", "p95_ms", "p99_ms", "result_tokens", "build_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+benchmarks/kb_store.py
+
+Parsed kb.json against the compiled, memory-mapped kb.kbc at 10k and 100k
+records: startup time, record-by-id and search latency, private memory of
+worker processes (Linux only, from /proc/self/smaps_rollup), and how long
+readers stall while the file is rebuilt under them.
+The synthetic knowledge bases are written to a temporary directory.
+
+to run (from the repo root): python -m benchmarks.kb_store --sizes 10000 100000
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import random
+import tempfile
+import threading
+import time
+
+from benchmarks.common import print_table, summarize_latencies
+from benchmarks.kb_search import PRODUCTS, TOPICS, synthetic_kb
+from kb_search import KnowledgeBase
+from kb_store import CompiledKB, KBStore, compile_kb
+
+
+def private_mb() -> float:
+    """Private (not shared with other processes) memory of this process in MB."""
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return float("nan")
+    kilobytes = sum(int(fields[name].split()[0]) for name in ("Private_Clean", "Private_Dirty"))
+    return round(kilobytes / 1024, 1)
+
+
+def _questions(n: int, seed: int) -> list:
+    rng = random.Random(seed)
+    return [f"how does {rng.choice(TOPICS)} work for {rng.choice(PRODUCTS)}" for _ in range(n)]
+
+
+def _worker(strategy: str, source: str, target: str, results):
+    before = private_mb()
+    kb = KnowledgeBase.from_file(source) if strategy == "json" else CompiledKB(target)
+    for question in _questions(200, os.getpid()):
+        kb.search(question, 3)
+    results.put(private_mb() - before)
+
+
+def worker_memory(strategy: str, source: str, target: str, n_workers: int) -> float:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    workers = [context.Process(target=_worker, args=(strategy, source, target, results))
+               for _ in range(n_workers)]
+    for worker in workers:
+        worker.start()
+    growth = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    return round(sum(growth) / n_workers, 1)
+
+
+def time_calls(function, arguments) -> dict:
+    latencies = []
+    for argument in arguments:
+        start = time.perf_counter()
+        function(argument)
+        latencies.append(time.perf_counter() - start)
+    return summarize_latencies(latencies)
+
+
+def reload_under_load(source: str, n_readers: int = 4) -> dict:
+    """Rewrite the source while reader threads search; report the swap time and reader stalls."""
+    store = KBStore(source)
+    latencies, stop = [], threading.Event()
+
+    def reader(seed):
+        questions = _questions(100, seed)
+        while not stop.is_set():
+            start = time.perf_counter()
+            store.search(questions[len(latencies) % len(questions)], 3)
+            latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=reader, args=(seed,)) for seed in range(n_readers)]
+    for thread in threads:
+        thread.start()
+    while len(latencies) < 100:
+        time.sleep(0.01)
+    latencies.clear()
+
+    with open(source) as f:
+        records = json.load(f)["records"]
+    records[0]["answer"] = "updated answer"
+    with open(source, "w") as f:
+        json.dump({"records": records}, f)
+    start = time.perf_counter()
+    store.reload_if_changed()
+    swap_s = time.perf_counter() - start
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    return {"reload_s": round(swap_s, 2), "reads during reload": len(latencies),
+            "reader p99_ms": summarize_latencies(latencies)["p99_ms"],
+            "reader max_ms": round(1000 * max(latencies), 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    rows, reload_rows = [], []
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "kb.json")
+            with open(source, "w") as f:
+                json.dump({"records": synthetic_kb(size)}, f)
+
+            start = time.perf_counter()
+            target = compile_kb(source)
+            compile_s = round(time.perf_counter() - start, 2)
+
+            rng = random.Random(3)
+            ids = [rng.randint(1, size) for _ in range(args.queries)]
+            questions = _questions(args.queries, 4)
+
+            for strategy in ("json", "mmap"):
+                start = time.perf_counter()
+                if strategy == "json":
+                    kb = KnowledgeBase.from_file(source)
+                    by_id = {record["id"]: record for record in kb.records}
+                    get = by_id.get
+                else:
+                    kb = CompiledKB(target)
+                    get = kb.get
+                startup_ms = round(1000 * (time.perf_counter() - start), 1)
+
+                rows.append({
+                    "records": size,
+                    "format": "kb.json (parsed)" if strategy == "json" else "kb.kbc (mmap)",
+                    "startup_ms": startup_ms,
+                    "get p50_ms": time_calls(get, ids)["p50_ms"],
+                    "search p50_ms": time_calls(lambda q: kb.search(q, 3), questions)["p50_ms"],
+                    "private MB/worker": worker_memory(strategy, source, target, args.workers),
+                    "compile_s": compile_s if strategy == "mmap" else "",
+                })
+                del kb, get
+
+            reload_rows.append({"records": size, **reload_under_load(source)})
+
+    print_table(rows, ["records", "format", "startup_ms", "get p50_ms", "search p50_ms",
+                       "private MB/worker", "compile_s"])
+    print()
+    print_table(reload_rows, ["records", "reload_s", "reads during reload", "reader p99_ms", "reader max_ms"])
+
+
+if __name__ == "__main__":
+    main()
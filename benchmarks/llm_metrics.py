@@ -0,0 +1,113 @@
+"""
+benchmarks/llm_metrics.py
+
+Cost of the metrics layer (llm_metrics.MetricsClient) per completion, and
+what it records: the calendar agents run against the in-process fake
+client behind MetricsClient, then the per-stage numbers are printed from
+llm_metrics.snapshot() and scraped once from the /metrics endpoint.
+
+to run (from the repo root): python -m benchmarks.llm_metrics
+"""
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import time
+import urllib.request
+
+import Calendar_confirmation_aiagent as confirmation_agent
+import calendar_adjustment_aiagent as adjustment_agent
+import calendar_db
+import calender_meeting_ai_agent as meeting_agent
+from benchmarks.common import print_table
+from benchmarks.fake_llm import AsyncFakeClient, FakeClient, LatencyModel
+from llm_client import set_client
+from llm_metrics import LLMMetrics, MetricsClient, llm_metrics
+
+REQUESTS = [
+    "Let's schedule a 1h team meeting next Tuesday at 2pm with Said and Arthur to discuss the project roadmap.",
+    "Can you send an email to Alice and Bob to discuss the project roadmap?",
+]
+CREATE_REQUEST = "Let's schedule a team lunch next Tuesday at 2pm with Nada and Sana"
+UPDATE_REQUEST = "Can you move the team meeting with Alice, Bob and Charlie to Wednesday at 3pm instead?"
+
+
+def overhead(calls: int) -> list:
+    """Microseconds per create call with and without MetricsClient, on a zero-latency fake."""
+    fake = FakeClient(LatencyModel(base_s=0.0, per_prompt_token_s=0.0, per_completion_token_s=0.0, jitter=0.0))
+    request = {"model": "deepseek-chat", "messages": [{"role": "user", "content": REQUESTS[0]}]}
+    rows = []
+    for label, client in (("FakeClient", fake), ("MetricsClient(FakeClient)", MetricsClient(fake, LLMMetrics()))):
+        start = time.perf_counter()
+        for _ in range(calls):
+            client.chat.completions.create(**request)
+        rows.append({"client": label, "us/call": round(1e6 * (time.perf_counter() - start) / calls, 1)})
+    rows[1]["overhead_us"] = round(rows[1]["us/call"] - rows[0]["us/call"], 1)
+    return rows
+
+
+def run_agents(rounds: int):
+    for _ in range(rounds):
+        for request in REQUESTS:
+            confirmation_agent.process_calendar_request(request, mode="staged")
+            confirmation_agent.process_calendar_request(request, mode="fused")
+        asyncio.run(confirmation_agent.process_many(REQUESTS))
+        adjustment_agent.process_calendar_request(CREATE_REQUEST, speculative=True)
+        adjustment_agent.create_new_event(CREATE_REQUEST, use_sql_tool=True)
+        adjustment_agent.update_event(UPDATE_REQUEST)
+        meeting_agent.parse_meeting(meeting_agent.get_client(), REQUESTS[0])
+        list(meeting_agent.parse_meeting_stream(meeting_agent.get_client(), REQUESTS[0]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--calls", type=int, default=20000, help="create calls per overhead measurement")
+    parser.add_argument("--rounds", type=int, default=3, help="passes over the agent requests")
+    parser.add_argument("--base-latency", type=float, default=0.02, help="seconds per fake completion")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    print_table(overhead(args.calls), ["client", "us/call", "overhead_us"])
+
+    latency = LatencyModel(base_s=args.base_latency, seed=1)
+    set_client(MetricsClient(FakeClient(latency)), MetricsClient(AsyncFakeClient(latency)))
+    llm_metrics.prices["deepseek-chat"] = (0.28, 0.42, 0.028)
+    llm_metrics.reset()
+
+    with tempfile.TemporaryDirectory() as directory:
+        calendar_db.DB_FILE = os.path.join(directory, "calender.db")
+        repo_root = os.path.dirname(os.path.abspath(calendar_db.__file__))
+        shutil.copy(os.path.join(repo_root, "calender.db"), calendar_db.DB_FILE)
+        run_agents(args.rounds)
+        calendar_db.get_pool().close()
+
+    snapshot = llm_metrics.snapshot()
+    rows = [{"stage": stage_name, "model": model, "requests": series["requests"], "errors": series["errors"],
+             "cancelled": series["cancelled"], "prompt_tokens": series["prompt_tokens"],
+             "completion_tokens": series["completion_tokens"],
+             "mean_ms": round(1000 * series["latency"]["mean"], 1), "cost_usd": series["cost_usd"]}
+            for stage_name, models in sorted(snapshot["completions"].items()) for model, series in models.items()]
+    print()
+    print_table(rows, ["stage", "model", "requests", "errors", "cancelled", "prompt_tokens",
+                       "completion_tokens", "mean_ms", "cost_usd"])
+    rows = [{"stage": stage_name, "tool": tool, "calls": series["calls"], "errors": series["errors"],
+             "timeouts": series["timeouts"], "mean_ms": round(1000 * series["latency"]["mean"], 2)}
+            for stage_name, tools in sorted(snapshot["tools"].items()) for tool, series in tools.items()]
+    print()
+    print_table(rows, ["stage", "tool", "calls", "errors", "timeouts", "mean_ms"])
+
+    server = llm_metrics.serve(0, host="127.0.0.1")
+    start = time.perf_counter()
+    with urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics") as response:
+        body = response.read().decode()
+    scrape_ms = 1000 * (time.perf_counter() - start)
+    server.shutdown()
+    samples = [line for line in body.splitlines() if line and not line.startswith("#")]
+    print(f"\n/metrics: {len(samples)} samples, {len(body)} bytes, scraped in {scrape_ms:.1f} ms")
+    print("\n".join(line for line in body.splitlines() if line.startswith("llm_requests_total")))
+
+
+if __name__ == "__main__":
+    main()
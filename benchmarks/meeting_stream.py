@@ -0,0 +1,62 @@
+"""
+benchmarks/meeting_stream.py
+
+Time to the first visible field of a parsed meeting: the blocking
+parse_meeting (nothing shows until the whole completion is validated)
+against parse_meeting_stream (fields show as soon as they are complete).
+Also reports the time to the final validated meeting for both.
+
+to run (needs config.ini, as the agent module reads it on import):
+    python -m benchmarks.meeting_stream
+"""
+import argparse
+import time
+
+from benchmarks.common import print_table, summarize_latencies
+from benchmarks.fake_llm import FakeClient, LatencyModel
+from calender_meeting_ai_agent import parse_meeting, parse_meeting_stream
+
+STATEMENT = ("Arthur and Nora were having lunch today with Mustafa. Mustafa said he will have "
+             "a meeting on July 20, 2025 with Nora at 9pm in the office.")
+
+
+def blocking(client) -> tuple:
+    start = time.perf_counter()
+    parse_meeting(client, STATEMENT)
+    done = time.perf_counter() - start
+    return done, done
+
+
+def streaming(client) -> tuple:
+    start = time.perf_counter()
+    first = None
+    for fields, meeting in parse_meeting_stream(client, STATEMENT):
+        if first is None and fields:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--base-latency", type=float, default=0.25, help="seconds to the first token")
+    parser.add_argument("--token-latency", type=float, default=0.02, help="seconds per completion token")
+    args = parser.parse_args()
+
+    client = FakeClient(LatencyModel(base_s=args.base_latency, per_completion_token_s=args.token_latency,
+                                     jitter=0.1, seed=7))
+    rows = []
+    for label, run in (("parse_meeting (blocking)", blocking), ("parse_meeting_stream", streaming)):
+        results = [run(client) for _ in range(args.requests)]
+        first = summarize_latencies([first for first, _ in results])
+        final = summarize_latencies([final for _, final in results])
+        rows.append({"path": label, "n": first["n"],
+                     "first_field_p50_ms": first["p50_ms"], "first_field_p95_ms": first["p95_ms"],
+                     "validated_p50_ms": final["p50_ms"], "validated_p95_ms": final["p95_ms"]})
+
+    print_table(rows, ["path", "n", "first_field_p50_ms", "first_field_p95_ms",
+                       "validated_p50_ms", "validated_p95_ms"])
+
+
+if __name__ == "__main__":
+    main()
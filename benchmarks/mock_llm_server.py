@@ -0,0 +1,258 @@
+"""
+benchmarks/mock_llm_server.py
+
+Local stand-in for an OpenAI-compatible chat completions API (what
+DeepSeek serves at https://api.deepseek.com), so the agents can be
+benchmarked over real HTTP through the openai client, without the API.
+
+POST /chat/completions (or /v1/chat/completions) is answered like
+benchmarks/fake_llm.py's FakeClient answers `create`: the scripted responses
+for our agents' prompts (tool calls included), usage from the request and
+response size and a latency from a LatencyModel (lognormal, normal,
+exponential or constant jitter). `response_format` may be text or
+json_object, like DeepSeek; anything else is a 400. With "stream": true the
+answer comes as server-sent events, one chunk per token, then
+`data: [DONE]`; stream_options.include_usage adds the usage chunk.
+
+Errors can be injected: with error_rate > 0 that share of the requests
+gets one of error_statuses (429 with Retry-After, 500, 503) and an
+OpenAI-style error body instead of an answer. The server counts requests,
+streams and errors by status, and the most requests it had in flight.
+
+Usage:
+    with MockLLMServer(LatencyModel(base_s=0.2), error_rate=0.01) as server:
+        set_client(OpenAI(base_url=server.url, api_key="mock"))
+
+to run standalone: python -m benchmarks.mock_llm_server --port 8000
+and point the agents at it with
+    LLM_BASE_URL=http://127.0.0.1:8000 LLM_API_KEY=mock python weather_ai_agent.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.fake_llm import FakeClient, LatencyModel, scripted_response
+
+PATHS = ("/chat/completions", "/v1/chat/completions")
+RESPONSE_FORMATS = ("text", "json_object")
+
+ERRORS = {
+    400: ("invalid_request_error", "invalid_request_error"),
+    429: ("rate_limit_exceeded", "Rate limit reached, please retry after a short wait."),
+    500: ("server_error", "The server had an error while processing your request."),
+    503: ("server_overloaded", "The server is overloaded, please try again later."),
+}
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class MockLLMServer:
+    """Threaded HTTP server on localhost; use as a context manager."""
+
+    def __init__(self, latency: LatencyModel = None, responder=scripted_response, port: int = 0,
+                 error_rate: float = 0.0, error_statuses=(429, 500, 503), retry_after_s: float = 0.05,
+                 seed: int = None):
+        self.fake = FakeClient(latency or LatencyModel(), responder)
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.retry_after_s = retry_after_s
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.reset()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if self.path.split("?")[0] not in PATHS:
+                    self._error(404, f"Unknown path {self.path}")
+                    return
+                try:
+                    request = json.loads(body)
+                except ValueError:
+                    self._error(400, "The request body is not valid JSON.")
+                    return
+                problem = _invalid(request)
+                if problem:
+                    self._error(400, problem)
+                    return
+                status = server._injected_error()
+                if status:
+                    self._error(status)
+                    return
+                server._started(request)
+                try:
+                    completion, delay = server.fake._build(request)
+                    if request.get("stream"):
+                        self._stream(request, completion)
+                    else:
+                        time.sleep(delay)
+                        self._json(200, completion.model_dump(exclude_none=True))
+                finally:
+                    server._finished()
+
+            def _json(self, status: int, payload: dict, headers: dict = None):
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _error(self, status: int, message: str = None):
+                server._count_error(status)
+                code, default_message = ERRORS.get(status, ("error", "Error"))
+                headers = {}
+                if status == 429:
+                    headers = {"Retry-After": str(max(1, round(server.retry_after_s))),
+                               "retry-after-ms": str(round(1000 * server.retry_after_s))}
+                self._json(status, {"error": {"message": message or default_message,
+                                              "type": "invalid_request_error" if status < 500 else "api_error",
+                                              "param": None, "code": code}}, headers)
+
+            def _event(self, data: str):
+                # one server-sent event, as one chunk of the chunked body
+                payload = f"data: {data}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(payload):x}\r\n".encode("ascii") + payload + b"\r\n")
+                self.wfile.flush()
+
+            def _stream(self, request: dict, completion):
+                chunks, first_s, per_chunk_s = server.fake._chunks(completion)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                time.sleep(first_s)
+                for i, chunk in enumerate(chunks):
+                    if i:
+                        time.sleep(per_chunk_s)
+                    self._event(chunk.model_dump_json(exclude_none=True))
+                if (request.get("stream_options") or {}).get("include_usage"):
+                    self._event(json.dumps({"id": completion.id, "object": "chat.completion.chunk",
+                                            "created": completion.created, "model": completion.model,
+                                            "choices": [], "usage": completion.usage.model_dump()}))
+                self._event("[DONE]")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = _Server(("127.0.0.1", port), Handler)
+        self._thread = None
+
+    # --------------------------------------------------------------
+    # Counters
+    # --------------------------------------------------------------
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.streams = 0
+            self.errors = {}
+            self.in_flight = 0
+            self.max_in_flight = 0
+
+    def _injected_error(self):
+        if not self.error_rate:
+            return None
+        with self._lock:
+            if self._random.random() < self.error_rate:
+                return self._random.choice(self.error_statuses)
+        return None
+
+    def _count_error(self, status: int):
+        with self._lock:
+            self.requests += 1
+            self.errors[status] = self.errors.get(status, 0) + 1
+
+    def _started(self, request: dict):
+        with self._lock:
+            self.requests += 1
+            self.streams += bool(request.get("stream"))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def _finished(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"requests": self.requests, "streams": self.streams,
+                    "errors": dict(sorted(self.errors.items())), "max_in_flight": self.max_in_flight}
+
+    # --------------------------------------------------------------
+    # Lifecycle
+    # --------------------------------------------------------------
+
+    @property
+    def url(self) -> str:
+        """The base_url to give the openai client."""
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def _invalid(request) -> str:
+    """Why the request would be rejected by the API, or ""."""
+    if not isinstance(request, dict) or not request.get("messages"):
+        return "messages is required"
+    if not request.get("model"):
+        return "model is required"
+    response_format = (request.get("response_format") or {}).get("type", "text")
+    if response_format not in RESPONSE_FORMATS:
+        return f"This response_format type is unavailable now: {response_format}"
+    if request.get("tool_choice") not in (None, "none", "auto", "required") and not request.get("tools"):
+        return "tool_choice is set but there are no tools"
+    return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--base-latency", type=float, default=0.25, help="seconds per completion")
+    parser.add_argument("--per-completion-token", type=float, default=0.01, help="seconds per completion token")
+    parser.add_argument("--jitter", type=float, default=0.25)
+    parser.add_argument("--distribution", choices=LatencyModel.DISTRIBUTIONS, default="lognormal")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of requests answered with an error")
+    args = parser.parse_args()
+
+    latency = LatencyModel(base_s=args.base_latency, per_completion_token_s=args.per_completion_token,
+                           jitter=args.jitter, distribution=args.distribution)
+    with MockLLMServer(latency, port=args.port, error_rate=args.error_rate) as server:
+        print(f"Serving {server.url}/chat/completions (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+        print(server.stats())
+
+
+if __name__ == "__main__":
+    main()
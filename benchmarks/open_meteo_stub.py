@@ -0,0 +1,180 @@
+"""
+benchmarks/open_meteo_stub.py
+
+Local stand-in for the Open-Meteo forecast endpoint (/v1/forecast), so the
+weather tool can be benchmarked without the public API.
+
+It answers latitude/longitude queries with a deterministic forecast in
+Open-Meteo's response shape ("current" plus 168 "hourly" values, local
+times with a longitude-based offset for timezone=auto; a list of them for
+comma-separated coordinates), after a
+configurable latency, and counts requests and TCP connections. HTTP/1.1
+keep-alive is supported. With tls=True it serves HTTPS with a throwaway
+self-signed certificate (made with the openssl command line tool).
+
+to run standalone: python -m benchmarks.open_meteo_stub --port 8080
+"""
+import argparse
+import json
+import math
+import os
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+HOURS = 168
+
+
+def forecast(latitude: float, longitude: float, hours: int = HOURS, timezone: str = "GMT") -> dict:
+    start = datetime(2025, 9, 1)
+    # timezone=auto: a whole-hour offset from the longitude, like a real local timezone
+    utc_offset_seconds = 3600 * round(longitude / 15) if timezone == "auto" else 0
+    base = 15 + 10 * math.cos(math.radians(latitude))
+    times = [(start + timedelta(hours=hour)).strftime("%Y-%m-%dT%H:%M") for hour in range(hours)]
+    temperatures = [round(base + 5 * math.sin((hour + longitude / 15) * math.pi / 12), 1)
+                    for hour in range(hours)]
+    return {
+        "latitude": latitude,
+        "longitude": longitude,
+        "generationtime_ms": 0.1,
+        "utc_offset_seconds": utc_offset_seconds,
+        "timezone": "GMT" if not utc_offset_seconds else f"Etc/GMT{-utc_offset_seconds // 3600:+d}",
+        "current_units": {"time": "iso8601", "interval": "seconds", "temperature_2m": "°C",
+                          "wind_speed_10m": "km/h"},
+        "current": {"time": times[0], "interval": 900, "temperature_2m": temperatures[0],
+                    "wind_speed_10m": round(10 + abs(longitude) % 7, 1)},
+        "hourly_units": {"time": "iso8601", "temperature_2m": "°C", "relative_humidity_2m": "%",
+                         "wind_speed_10m": "km/h"},
+        "hourly": {
+            "time": times,
+            "temperature_2m": temperatures,
+            "relative_humidity_2m": [60 + hour % 30 for hour in range(hours)],
+            "wind_speed_10m": [round(10 + (hour * 7) % 13 / 2, 1) for hour in range(hours)],
+        },
+    }
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    tls_context = None
+
+    def get_request(self):
+        sock, address = super().get_request()
+        if self.tls_context is not None:
+            # handshake later, in the connection's own thread
+            sock = self.tls_context.wrap_socket(sock, server_side=True, do_handshake_on_connect=False)
+        return sock, address
+
+
+class OpenMeteoStub:
+    """Threaded HTTP server on localhost; use as a context manager."""
+
+    def __init__(self, latency_s: float = 0.05, port: int = 0, tls: bool = False, hang_s: float = 0):
+        self.latency_s = latency_s
+        self.hang_s = hang_s
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._tls_dir = None
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                with stub._lock:
+                    stub.connections += 1
+                super().setup()
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path != "/v1/forecast" or "latitude" not in query or "longitude" not in query:
+                    self.send_error(400, "latitude and longitude are required")
+                    return
+                latitudes = [float(value) for value in query["latitude"][0].split(",")]
+                longitudes = [float(value) for value in query["longitude"][0].split(",")]
+                if len(latitudes) != len(longitudes):
+                    self.send_error(400, "latitude and longitude must have the same number of elements")
+                    return
+                time.sleep(stub.hang_s or stub.latency_s)
+                timezone = query.get("timezone", ["GMT"])[0]
+                forecasts = [forecast(latitude, longitude, timezone=timezone)
+                             for latitude, longitude in zip(latitudes, longitudes)]
+                # like Open-Meteo: a list for several locations, a single object for one
+                body = json.dumps(forecasts if len(forecasts) > 1 else forecasts[0]).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = _Server(("127.0.0.1", port), Handler)
+        self.scheme = "http"
+        if tls:
+            self.server.tls_context = self._tls_context()
+            self.scheme = "https"
+        self._thread = None
+
+    def _tls_context(self) -> ssl.SSLContext:
+        self._tls_dir = tempfile.TemporaryDirectory()
+        cert = os.path.join(self._tls_dir.name, "cert.pem")
+        key = os.path.join(self._tls_dir.name, "key.pem")
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+                        "-subj", "/CN=localhost", "-keyout", key, "-out", cert],
+                       check=True, capture_output=True)
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        return context
+
+    @property
+    def url(self) -> str:
+        return f"{self.scheme}://127.0.0.1:{self.server.server_address[1]}/v1/forecast"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self._tls_dir is not None:
+            self._tls_dir.cleanup()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per response")
+    parser.add_argument("--tls", action="store_true")
+    args = parser.parse_args()
+
+    with OpenMeteoStub(args.latency, args.port, args.tls) as stub:
+        print(f"Serving {stub.url} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""
+benchmarks/structured_output.py
+
+Structured responses before and after structured_output.py: parse time per
+response (json.loads + model(**data), with the field descriptions rebuilt
+on every call, against the cached TypeAdapter), how many of a corpus of
+malformed responses validate, and the model round trips needed to get a
+valid answer when every malformed response has to be retried.
+
+to run (from the repo root): python -m benchmarks.structured_output
+"""
+import argparse
+import json
+import logging
+import time
+
+from pydantic import BaseModel, Field, ValidationError
+
+from benchmarks.common import print_table
+from benchmarks.fake_llm import FakeClient, LatencyModel
+from CalendarMeeting import CalendarMeeting
+from structured_output import (StructuredOutputError, get_structured_response, parse_structured,
+                               structured_metrics)
+
+
+class WeatherResponse(BaseModel):
+    temperature: float = Field(description="<float> - Current temperature in Celsius")
+    response: str = Field(description="<string> A natural language response to the user's question.")
+    confidence_score: float = Field(description="<float> - confidence between 0 and 1")
+    sunny: bool = Field(description="<bool> - is it sunny")
+
+
+VALID = {
+    WeatherResponse: json.dumps({"temperature": 18.4, "response": "18.4 degrees in Berlin.",
+                                 "confidence_score": 0.9, "sunny": True}),
+    CalendarMeeting: json.dumps({"date": "2025-07-20T21:00:00", "place": "office",
+                                 "participants": ["Mustafa", "Nora"]}),
+}
+
+# what models send back in JSON mode now and then
+MALFORMED = [
+    ("code fence", '```json\n{"temperature": 18.4, "response": "Mild.", "confidence_score": 0.9, "sunny": true}\n```'),
+    ("prose around", 'Here is the answer:\n{"temperature": 18.4, "response": "Mild.", "confidence_score": 0.9, '
+                     '"sunny": true}\nLet me know if you need more.'),
+    ("trailing commas", '{"temperature": 18.4, "response": "Mild, dry.", "confidence_score": 0.9, "sunny": true,}'),
+    ("percent confidence", '{"temperature": 18.4, "response": "Mild.", "confidence_score": "90%", "sunny": true}'),
+    ("python literals", "{\"temperature\": 18.4, \"response\": \"Mild.\", \"confidence_score\": 0.9, \"sunny\": True}"),
+    ("yes for a bool", '{"temperature": "18.4", "response": "Mild.", "confidence_score": 0.9, "sunny": "yes"}'),
+    ("missing field", '{"temperature": 18.4, "confidence_score": 0.9, "sunny": true}'),
+    ("truncated", '{"temperature": 18.4, "response": "Mild and'),
+]
+
+
+def old_parse(content: str, output_type):
+    """What the agents did: the descriptions dict on every call, json.loads, then model(**data)."""
+    {name: field.description for name, field in output_type.model_fields.items()}
+    try:
+        return output_type(**json.loads(content))
+    except (TypeError, json.JSONDecodeError, ValidationError):
+        return None
+
+
+def new_parse(content: str, output_type):
+    try:
+        return parse_structured(content, output_type)
+    except StructuredOutputError:
+        return None
+
+
+def throughput(parse, content: str, output_type, runs: int) -> float:
+    start = time.perf_counter()
+    for _ in range(runs):
+        parse(content, output_type)
+    return 1e6 * (time.perf_counter() - start) / runs
+
+
+def malformed_model(request: dict) -> dict:
+    """Answers with the malformed response named in the user message, and valid JSON when asked again."""
+    if any(isinstance(m, dict) and "not valid JSON" in m.get("content", "") for m in request["messages"]):
+        return {"content": VALID[WeatherResponse]}
+    label = next(m["content"] for m in request["messages"] if isinstance(m, dict) and m["role"] == "user")
+    return {"content": dict(MALFORMED)[label]}
+
+
+def retry_only(client, label: str, max_retries: int = 1) -> tuple:
+    """Strict validation, and another model call for every failure."""
+    messages = [{"role": "system", "content": "weather"}, {"role": "user", "content": label}]
+    for attempt in range(max_retries + 1):
+        response = client.chat.completions.create(model="deepseek-chat", messages=messages,
+                                                  response_format={"type": "json_object"})
+        if old_parse(response.choices[0].message.content, WeatherResponse) is not None:
+            return attempt + 1, True
+        messages = messages + [{"role": "user", "content": "Your last response was not valid JSON."}]
+    return max_retries + 1, False
+
+
+def repair_then_retry(client, label: str, max_retries: int = 1) -> tuple:
+    messages = [{"role": "system", "content": "weather"}, {"role": "user", "content": label}]
+    before = structured_metrics.stats().get("WeatherResponse", {}).get("retries", 0)
+    output, _ = get_structured_response(client, messages, "deepseek-chat", None, WeatherResponse,
+                                        max_retries=max_retries)
+    retries = structured_metrics.stats()["WeatherResponse"]["retries"] - before
+    return retries + 1, output is not None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--runs", type=int, default=20000, help="parses per throughput measurement")
+    parser.add_argument("--base-latency", type=float, default=0.05, help="seconds per fake completion")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+
+    print("parse time per valid response")
+    rows = []
+    for output_type, content in VALID.items():
+        old_us = throughput(old_parse, content, output_type, args.runs)
+        new_us = throughput(new_parse, content, output_type, args.runs)
+        rows.append({"model": output_type.__name__, "json.loads + model(**data) us": round(old_us, 2),
+                     "cached adapter us": round(new_us, 2), "speedup": f"{old_us / new_us:.2f}x"})
+    print_table(rows, ["model", "json.loads + model(**data) us", "cached adapter us", "speedup"])
+
+    print("\nmalformed responses")
+    rows = [{"response": label,
+             "before": "ok" if old_parse(content, WeatherResponse) else "fail",
+             "after": "ok" if new_parse(content, WeatherResponse) else "fail"}
+            for label, content in MALFORMED]
+    print_table(rows, ["response", "before", "after"])
+    print(f"valid before: {sum(r['before'] == 'ok' for r in rows)}/{len(rows)}, "
+          f"after local repair: {sum(r['after'] == 'ok' for r in rows)}/{len(rows)}")
+
+    print("\nround trips to a valid answer (one retry allowed)")
+    client = FakeClient(LatencyModel(base_s=args.base_latency, jitter=0.0), responder=malformed_model)
+    rows = []
+    for flow, function in (("retry every failure", retry_only), ("repair, then retry", repair_then_retry)):
+        start = time.perf_counter()
+        outcomes = [function(client, label) for label, _ in MALFORMED]
+        elapsed = time.perf_counter() - start
+        rows.append({"flow": flow,
+                     "round_trips": sum(calls for calls, _ in outcomes),
+                     "answered": f"{sum(ok for _, ok in outcomes)}/{len(outcomes)}",
+                     "ms/request": round(1000 * elapsed / len(outcomes), 1)})
+    print_table(rows, ["flow", "round_trips", "answered", "ms/request"])
+    print(json.dumps(structured_metrics.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
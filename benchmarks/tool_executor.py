@@ -0,0 +1,85 @@
+"""
+benchmarks/tool_executor.py
+
+Wall time of one model turn with several tool calls: the old sequential
+loop (call_function inline, one call after another) against ToolExecutor,
+sync (thread pool) and async (asyncio tasks). The tools sleep for their
+latency; one extra turn includes a hung tool to show the per-call timeout.
+
+to run (from the repo root): python -m benchmarks.tool_executor
+"""
+import argparse
+import asyncio
+import json
+import logging
+import time
+from types import SimpleNamespace
+
+from benchmarks.common import print_table
+from tool_executor import ToolExecutor
+
+
+def slow_tool(seconds: float):
+    time.sleep(seconds)
+    return {"slept": seconds}
+
+
+async def slow_tool_async(seconds: float):
+    await asyncio.sleep(seconds)
+    return {"slept": seconds}
+
+
+def tool_calls(latencies: list, name: str = "slow_tool") -> list:
+    return [
+        SimpleNamespace(id=f"call_{i}", function=SimpleNamespace(name=name, arguments=json.dumps({"seconds": s})))
+        for i, s in enumerate(latencies)
+    ]
+
+
+def sequential(calls: list) -> list:
+    """What the agents' tool loops used to do."""
+    messages = []
+    for tool_call in calls:
+        result = slow_tool(**json.loads(tool_call.function.arguments))
+        messages.append({"role": "tool", "content": json.dumps(result), "tool_call_id": tool_call.id})
+    return messages
+
+
+def timed(function) -> tuple:
+    start = time.perf_counter()
+    messages = function()
+    return round(1000 * (time.perf_counter() - start), 1), messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--latencies", type=float, nargs="+", default=[0.1, 0.2, 0.3, 0.4],
+                        help="seconds per tool call in the turn")
+    parser.add_argument("--timeout", type=float, default=0.5, help="per-call timeout for the hung-tool turn")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    executor = ToolExecutor({"slow_tool": slow_tool}, default_timeout=args.timeout)
+    async_executor = ToolExecutor({"slow_tool": slow_tool_async}, default_timeout=args.timeout)
+    calls = tool_calls(args.latencies)
+    hung = tool_calls(args.latencies + [60])
+
+    rows = []
+    for label, run, turn in (
+            ("sequential loop (before)", lambda: sequential(calls), calls),
+            ("ToolExecutor.run", lambda: executor.run(calls), calls),
+            ("ToolExecutor.run_async", lambda: asyncio.run(async_executor.run_async(calls)), calls),
+            ("ToolExecutor.run, one tool hangs", lambda: executor.run(hung), hung)):
+        wall_ms, messages = timed(run)
+        in_order = [message["tool_call_id"] for message in messages] == [call.id for call in turn]
+        errors = sum("error" in json.loads(message["content"]) for message in messages)
+        rows.append({"turn": label, "tool calls": len(turn), "wall_ms": wall_ms,
+                     "in call order": in_order, "error results": errors})
+
+    print(f"tool latencies: {args.latencies} s (sum {sum(args.latencies):.1f} s, slowest {max(args.latencies)} s)")
+    print_table(rows, ["turn", "tool calls", "wall_ms", "in call order", "error results"])
+    executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+benchmarks/tracing.py
+
+Overhead of tracing.py when it is off and on (per @traced call and per
+span, and per request of the calendar adjustment agent on a zero-latency
+fake client), and what a traced request looks like: the span tree of the
+slowest of a few requests with the time spent in each span, written as a
+Chrome trace-event file.
+
+to run (from the repo root): python -m benchmarks.tracing
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import calendar_adjustment_aiagent as agent
+import calendar_db
+from benchmarks.common import print_table
+from benchmarks.fake_llm import AsyncFakeClient, FakeClient, LatencyModel
+from llm_client import set_client
+from llm_metrics import MetricsClient
+from tracing import span, traced, tracer
+
+REQUESTS = [
+    ("Let's schedule a team lunch next Tuesday at 2pm with Nada and Sana", {}),
+    ("Can you move the team meeting with Alice, Bob and Charlie to Wednesday at 3pm instead?", {}),
+    ("Let's schedule a team lunch next Tuesday at 2pm with Nada and Sana", {"use_sql_tool": True}),
+    ("Can you move the team meeting with Alice, Bob and Charlie to Wednesday at 3pm instead?",
+     {"speculative": True}),
+]
+
+
+def plain():
+    return 1
+
+
+@traced("benchmark.traced")
+def decorated():
+    return 1
+
+
+def with_span():
+    with span("benchmark.span"):
+        return 1
+
+
+def per_call_ns(function, calls: int) -> float:
+    start = time.perf_counter_ns()
+    for _ in range(calls):
+        function()
+    return (time.perf_counter_ns() - start) / calls
+
+
+def micro(calls: int) -> list:
+    rows = []
+    for enabled in (False, True):
+        tracer.enable() if enabled else tracer.disable()
+        tracer.clear()
+        rows.append({"tracing": "on" if enabled else "off",
+                     "plain call ns": round(per_call_ns(plain, calls)),
+                     "@traced ns": round(per_call_ns(decorated, calls)),
+                     "with span() ns": round(per_call_ns(with_span, calls))})
+    tracer.disable()
+    tracer.clear()
+    return rows
+
+
+def set_fake_clients(base_s: float):
+    latency = LatencyModel(base_s=base_s, per_prompt_token_s=0.0 if base_s == 0 else 0.0004,
+                           per_completion_token_s=0.0 if base_s == 0 else 0.004, jitter=0.0)
+    set_client(MetricsClient(FakeClient(latency)), MetricsClient(AsyncFakeClient(latency)))
+
+
+def ms_per_request(rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for text, options in REQUESTS:
+            agent.process_calendar_request(text, **options)
+    return 1000 * (time.perf_counter() - start) / (rounds * len(REQUESTS))
+
+
+def span_tree(request_id: str) -> list:
+    """Rows of the request's spans, children under their parent, with total and self time."""
+    spans = tracer.spans(request_id)
+    children = {}
+    for s in spans:
+        children.setdefault(s.parent_id, []).append(s)
+    rows = []
+
+    def walk(parent_id, depth):
+        for s in sorted(children.get(parent_id, []), key=lambda s: s.start_ns):
+            child_ms = sum(c.duration_ms for c in children.get(s.span_id, []))
+            rows.append({"span": "  " * depth + s.name, "total_ms": round(s.duration_ms, 2),
+                         "self_ms": round(max(0.0, s.duration_ms - child_ms), 2)})
+            walk(s.span_id, depth + 1)
+
+    walk(None, 0)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--calls", type=int, default=200000, help="calls per micro benchmark")
+    parser.add_argument("--rounds", type=int, default=25, help="passes over the requests for the overhead")
+    parser.add_argument("--base-latency", type=float, default=0.05, help="seconds per fake completion")
+    parser.add_argument("--trace-file", default=os.path.join(tempfile.gettempdir(), "calendar_trace.json"))
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    print_table(micro(args.calls), ["tracing", "plain call ns", "@traced ns", "with span() ns"])
+
+    with tempfile.TemporaryDirectory() as directory:
+        calendar_db.DB_FILE = os.path.join(directory, "calender.db")
+        repo_root = os.path.dirname(os.path.abspath(calendar_db.__file__))
+        shutil.copy(os.path.join(repo_root, "calender.db"), calendar_db.DB_FILE)
+
+        set_fake_clients(0.0)
+        ms_per_request(2)  # warm up
+        rows = []
+        for enabled in (False, True):
+            tracer.enable() if enabled else tracer.disable()
+            rows.append({"tracing": "on" if enabled else "off",
+                         "ms/request": round(ms_per_request(args.rounds), 3),
+                         "spans/request": round(len(tracer.spans()) / (args.rounds * len(REQUESTS)), 1)})
+            tracer.clear()
+        print("\nadjustment agent, zero-latency fake client")
+        print_table(rows, ["tracing", "ms/request", "spans/request"])
+
+        set_fake_clients(args.base_latency)
+        tracer.enable()
+        for text, options in REQUESTS:
+            agent.process_calendar_request(text, **options)
+        calendar_db.get_pool().close()
+
+    requests = tracer.requests()
+    slowest = next(iter(requests))
+    print(f"\nrequests: " + ", ".join(f"{request_id} {ms:.0f} ms" for request_id, ms in requests.items()))
+    print(f"slowest request {slowest}:")
+    print_table(span_tree(slowest), ["span", "total_ms", "self_ms"])
+
+    tracer.export_chrome(args.trace_file, request_id=slowest)
+    with open(args.trace_file) as f:
+        events = json.load(f)["traceEvents"]
+    print(f"\nwrote {args.trace_file}: {sum(e['ph'] == 'X' for e in events)} spans, "
+          f"{sum(e['ph'] == 'M' for e in events)} lanes (open in chrome://tracing or ui.perfetto.dev)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+benchmarks/traffic_replay.py
+
+Record a run of the agents with traffic_replay.py, then replay it: the run
+is recorded against the mock model server and the Open-Meteo stub, then
+replayed from the log with the original timings and as fast as possible.
+The fast replay is the time of our own code; the rest of the original run
+was upstream latency. Also reports how many replayed calls missed the log
+and how compact the log is.
+
+to run (from the repo root): python -m benchmarks.traffic_replay --rounds 3
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+import openai
+
+import Calendar_confirmation_aiagent as confirmation_agent
+import calendar_adjustment_aiagent as adjustment_agent
+import calendar_db
+import calender_meeting_ai_agent as meeting_agent
+import ecommerce_assistant_aiagent as ecommerce_agent
+import weather_ai_agent as weather_agent
+import weather_client
+from benchmarks.common import print_table, summarize_latencies
+from benchmarks.fake_llm import LatencyModel
+from benchmarks.mock_llm_server import MockLLMServer
+from benchmarks.open_meteo_stub import OpenMeteoStub
+from llm_client import get_client, set_client
+from traffic_replay import RecordingClient, ReplayClient, TrafficLog, configure_session
+
+MEETING = "Let's meet with Mustafa and Nora at 9pm on July 20th at the office."
+EVENT = "Book a 30 minute call with Nada tomorrow at 10am about the budget"
+CREATE = "Let's schedule a team lunch next Tuesday at 2pm with Nada and Sana"
+UPDATE = "Can you move the team meeting with Alice, Bob and Charlie to Wednesday at 3pm instead?"
+
+# one round of the run: (agent, request)
+ROUND = [
+    ("meeting", lambda: meeting_agent.parse_meeting(get_client(), MEETING)),
+    ("meeting stream", lambda: list(meeting_agent.parse_meeting_stream(get_client(), MEETING))),
+    ("confirmation staged", lambda: confirmation_agent.process_calendar_request(EVENT)),
+    ("confirmation fused", lambda: confirmation_agent.process_calendar_request(EVENT, mode="fused")),
+    ("confirmation async", lambda: asyncio.run(confirmation_agent.process_calendar_request_async(EVENT))),
+    ("adjustment create", lambda: adjustment_agent.process_calendar_request(CREATE)),
+    ("adjustment update", lambda: adjustment_agent.process_calendar_request(UPDATE)),
+    ("weather", lambda: weather_agent.ask_weather("How warm is it in Paris and Tokyo right now?")),
+    ("ecommerce", lambda: ecommerce_agent.answer_with_llm("Do you have any discounts available?")),
+]
+
+
+def use_weather_session(url: str, mode: str, log: TrafficLog):
+    client = weather_client.WeatherClient(url)
+    client.session.trust_env = False
+    configure_session(client.session, mode=mode, log=log)
+    weather_client._shared_client = client
+
+
+def run(rounds: int, db_file: str) -> list:
+    """Seconds per request of `rounds` rounds, on a fresh copy of the database."""
+    repo_root = os.path.dirname(os.path.abspath(calendar_db.__file__))
+    shutil.copy(os.path.join(repo_root, "calender.db"), db_file)
+    calendar_db.DB_FILE = db_file
+    latencies = []
+    for _ in range(rounds):
+        for _, request in ROUND:
+            start = time.perf_counter()
+            request()
+            latencies.append(time.perf_counter() - start)
+    calendar_db.get_pool().close()
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--rounds", type=int, default=3, help="passes over the agents")
+    parser.add_argument("--base-latency", type=float, default=0.1, help="seconds per model completion")
+    parser.add_argument("--weather-latency", type=float, default=0.05, help="Open-Meteo stub latency")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "traffic.jsonl.gz")
+    rows = []
+    try:
+        latency = LatencyModel(base_s=args.base_latency, per_completion_token_s=0.002, seed=1)
+        with MockLLMServer(latency) as server, OpenMeteoStub(args.weather_latency) as stub:
+            log = TrafficLog(path)
+            set_client(
+                RecordingClient(openai.OpenAI(base_url=server.url, api_key="mock",
+                                              http_client=openai.DefaultHttpxClient(trust_env=False)), log),
+                RecordingClient(openai.AsyncOpenAI(base_url=server.url, api_key="mock",
+                                                   http_client=openai.DefaultAsyncHttpxClient(trust_env=False)),
+                                log))
+            weather_url = stub.url
+            use_weather_session(weather_url, "record", log)
+            start = time.perf_counter()
+            latencies = run(args.rounds, os.path.join(directory, "recorded.db"))
+            rows.append({"run": "recorded (mock server + stub)", "wall_s": round(time.perf_counter() - start, 2),
+                         **summarize_latencies(latencies), "misses": ""})
+            log.close()
+
+        for timing in ("original", "fast"):
+            log = TrafficLog(path, timing)
+            set_client(ReplayClient(log), ReplayClient(log, is_async=True))
+            # the same URL as recorded, though nothing listens there any more
+            use_weather_session(weather_url, "replay", log)
+            start = time.perf_counter()
+            latencies = run(args.rounds, os.path.join(directory, f"replayed_{timing}.db"))
+            rows.append({"run": f"replayed, {timing} timing", "wall_s": round(time.perf_counter() - start, 2),
+                         **summarize_latencies(latencies), "misses": log.stats()["misses"]})
+
+        records = list(TrafficLog(path).records())
+        plain_bytes = sum(len(json.dumps(record, separators=(",", ":"))) + 1 for record in records)
+        gzip_bytes = os.path.getsize(path)
+    finally:
+        shutil.rmtree(directory)
+
+    print_table(rows, ["run", "wall_s", "n", "p50_ms", "p95_ms", "p99_ms", "misses"])
+    upstream = sum(record["seconds"] for record in records)
+    print(f"\nour code: {1000 * rows[2]['wall_s'] / rows[2]['n']:.1f} ms/request; "
+          f"recorded upstream time: {upstream:.2f} s of {rows[0]['wall_s']} s")
+    print(f"log: {sum(r['kind'] == 'llm' for r in records)} completions "
+          f"({sum('chunks' in r for r in records)} streamed), {sum(r['kind'] == 'http' for r in records)} HTTP "
+          f"exchanges; {plain_bytes / len(records):.0f} bytes/exchange as JSON Lines, "
+          f"{gzip_bytes / len(records):.0f} gzipped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+benchmarks/update_prompt_size.py
+
+Prompt size of update_event's extraction call as the calendar grows:
+the old prompt listed every row of calender_events, the new one lists the
+top-k candidate events found with the full-text index. Next to the token
+counts: the mean time of that lookup, as update_event makes it (its window
+around today is empty here, so it falls back to the whole calendar), and
+with a window that holds every event (2024-2025).
+
+to run (from the repo root): python -m benchmarks.update_prompt_size
+"""
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+
+import calendar_adjustment_aiagent as agent
+import calendar_db
+from benchmarks.common import print_table
+from benchmarks.db_queries import populate
+from benchmarks.fake_llm import estimate_tokens
+
+UPDATE_REQUEST = "Can you move the event 42 with person7 to Wednesday at 3pm instead?"
+POPULATED_WINDOW = ("2024-01-01T00:00:00", "2026-01-01T00:00:00")
+
+
+def prompt_tokens(current_events: str) -> int:
+    messages = agent._update_event_messages(UPDATE_REQUEST, current_events)
+    return sum(estimate_tokens(message["content"]) for message in messages)
+
+
+def mean_ms(function, repeats: int) -> float:
+    function()  # the first call opens the pool's connection
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return round(1000 * (time.perf_counter() - start) / repeats, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 1_000, 100_000])
+    parser.add_argument("--lookups", type=int, default=20, help="timed lookups per size")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    rows = []
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            calendar_db.DB_FILE = os.path.join(directory, "calender.db")
+            populate(calendar_db.DB_FILE, size)
+
+            full_table = json.dumps(agent.access_database_for_events(), indent=2)
+            candidates = agent._candidate_events_json(UPDATE_REQUEST)
+
+            rows.append({
+                "events": size,
+                "full table prompt tokens": prompt_tokens(full_table),
+                "top-k prompt tokens": prompt_tokens(candidates),
+                "lookup_ms": mean_ms(lambda: agent._candidate_events_json(UPDATE_REQUEST), args.lookups),
+                "windowed lookup_ms": mean_ms(lambda: calendar_db.find_candidate_events(
+                    UPDATE_REQUEST, k=agent.CANDIDATE_EVENTS, window=POPULATED_WINDOW), args.lookups),
+            })
+            calendar_db.get_pool().close()
+
+    print_table(rows, ["events", "full table prompt tokens", "top-k prompt tokens", "lookup_ms",
+                       "windowed lookup_ms"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+benchmarks/weather_batch.py
+
+"Compare the weather in ..." turns against the local Open-Meteo stub: one
+get_weather request per location, one after another (how the agent ran
+several get_weather tool calls), against a single batched current_many
+request. The cache is cleared before every turn so each turn fetches.
+
+to run (from the repo root): python -m benchmarks.weather_batch --turns 20
+"""
+import argparse
+import logging
+import random
+import time
+
+from benchmarks.common import print_table, summarize_latencies
+from benchmarks.open_meteo_stub import OpenMeteoStub
+from weather_client import WeatherClient
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--locations", type=int, nargs="+", default=[3, 10, 30])
+    parser.add_argument("--latency", type=float, default=0.05, help="stub latency in seconds")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    rng = random.Random(1)
+    rows = []
+    with OpenMeteoStub(args.latency) as stub:
+        client = WeatherClient(stub.url)
+        client.session.trust_env = False
+        for n_locations in args.locations:
+            turns = [[(rng.uniform(-60, 60), rng.uniform(-180, 180)) for _ in range(n_locations)]
+                     for _ in range(args.turns)]
+            for label in ("get_weather per location (before)", "get_weather_many (after)"):
+                latencies, requests_before = [], stub.requests
+                for locations in turns:
+                    client.clear()
+                    start = time.perf_counter()
+                    if label.startswith("get_weather_many"):
+                        client.current_many(locations)
+                    else:
+                        for latitude, longitude in locations:
+                            client.current(latitude, longitude)
+                    latencies.append(time.perf_counter() - start)
+                summary = summarize_latencies(latencies)
+                rows.append({"locations/turn": n_locations, "tool": label, "p50_ms": summary["p50_ms"],
+                             "p95_ms": summary["p95_ms"],
+                             "requests/turn": (stub.requests - requests_before) / args.turns})
+
+    print_table(rows, ["locations/turn", "tool", "p50_ms", "p95_ms", "requests/turn"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+benchmarks/weather_client.py
+
+Throughput of get_weather's HTTP access against the local Open-Meteo stub:
+the old requests.get per call (new connection every time, no timeout, no
+cache) against WeatherClient with only the pooled session (TTL 0) and with
+the grid cache and single-flight coalescing. Worker threads query locations
+scattered around a handful of cities. Also checks that a hung upstream
+ends in a timeout.
+
+to run (from the repo root): python -m benchmarks.weather_client --threads 8 --requests 50 --tls
+"""
+import argparse
+import logging
+import random
+import threading
+import time
+
+import requests
+import urllib3
+
+from benchmarks.common import print_table, summarize_latencies
+from benchmarks.open_meteo_stub import OpenMeteoStub
+from weather_client import FORECAST_PARAMS, WeatherClient
+
+CITIES = [(52.52, 13.41), (48.85, 2.35), (51.51, -0.13), (40.71, -74.01), (35.68, 139.69),
+          (30.04, 31.24), (-33.87, 151.21), (19.43, -99.13), (55.76, 37.62), (1.35, 103.82)]
+
+
+def locations(n: int, seed: int) -> list:
+    """Locations within about 3 km of one of the cities."""
+    rng = random.Random(seed)
+    return [(latitude + rng.uniform(-0.03, 0.03), longitude + rng.uniform(-0.03, 0.03))
+            for latitude, longitude in (rng.choice(CITIES) for _ in range(n))]
+
+
+def old_get_weather(url: str, latitude: float, longitude: float) -> dict:
+    """What get_weather used to do (plus verify=False for the stub's certificate)."""
+    response = requests.get(
+        f"{url}?latitude={latitude}&longitude={longitude}"
+        f"&current={FORECAST_PARAMS['current']}&hourly={FORECAST_PARAMS['hourly']}",
+        verify=False,
+    )
+    return response.json()["current"]
+
+
+def _accept_stub_certificate(client: WeatherClient):
+    # a CA bundle from the environment (REQUESTS_CA_BUNDLE) would override session.verify
+    client.session.trust_env = False
+    client.session.verify = False
+
+
+def run(label: str, get_weather, stub: OpenMeteoStub, n_threads: int, n_requests: int) -> dict:
+    requests_before, connections_before = stub.requests, stub.connections
+    latencies, lock = [], threading.Lock()
+
+    def worker(seed):
+        for latitude, longitude in locations(n_requests, seed):
+            start = time.perf_counter()
+            get_weather(latitude, longitude)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(n_threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    summary = summarize_latencies(latencies)
+    return {
+        "client": label,
+        "requests/sec": round(len(latencies) / elapsed, 1),
+        "p50_ms": summary["p50_ms"],
+        "p95_ms": summary["p95_ms"],
+        "upstream requests": stub.requests - requests_before,
+        "connections": stub.connections - connections_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=50, help="requests per thread")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub latency in seconds")
+    parser.add_argument("--tls", action="store_true", help="serve the stub over HTTPS")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+
+    with OpenMeteoStub(args.latency, tls=args.tls) as stub:
+        pooled = WeatherClient(stub.url, ttl_seconds=0, pool_size=args.threads)
+        cached = WeatherClient(stub.url, pool_size=args.threads)
+        for client in (pooled, cached):
+            _accept_stub_certificate(client)
+
+        rows = [
+            run("requests.get (before)", lambda lat, lon: old_get_weather(stub.url, lat, lon),
+                stub, args.threads, args.requests),
+            run("pooled session, no cache", pooled.current, stub, args.threads, args.requests),
+            run("pooled + grid cache + single-flight", cached.current, stub, args.threads, args.requests),
+        ]
+        print_table(rows, ["client", "requests/sec", "p50_ms", "p95_ms", "upstream requests", "connections"])
+        print(f"\ncache stats: {cached.stats()}")
+
+    with OpenMeteoStub(hang_s=30, tls=args.tls) as stub:
+        client = WeatherClient(stub.url, connect_timeout=1, read_timeout=0.5, retries=0)
+        _accept_stub_certificate(client)
+        start = time.perf_counter()
+        try:
+            client.current(52.52, 13.41)
+        except requests.exceptions.RequestException as e:
+            print(f"hung upstream: {type(e).__name__} after {time.perf_counter() - start:.2f}s "
+                  f"(requests.get without a timeout would wait indefinitely)")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,28 +9,43 @@ Without this workflow, optimizing for one kind of input can hurt performance
 on other inputs."
 source: (https://www.anthropic.com/engineering/building-effective-agents)
 """
-import configparser
-from datetime import datetime
-from openai import OpenAI
+import asyncio
+from collections import deque
+from datetime import datetime, timedelta
+from calendar_db import fetch_all, find_candidate_events, get_pool, insert_event, update_event_fields
+from llm_client import get_async_client, get_client, run_async
+from llm_metrics import stage
+from tracing import configure_tracing, traced
+from prompt_compiler import compile_prompt
+from structured_output import coerce_value, load_json
+from tool_executor import ToolExecutor
+from agent_loop import run_agent
 import os
 import logging
 import json
-import sqlite3
-
-config = configparser.ConfigParser()
-config.read("config.ini")
-deep_seek_api_key = config.get("API_KEYS", "openai_key")
-
-# Set up logging configuration
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
+import time
+
 logger = logging.getLogger(__name__)
 
-client = OpenAI(api_key=deep_seek_api_key, base_url="https://api.deepseek.com")
-model = "deepseek-chat"  
+model = "deepseek-chat"
+
+
+def __getattr__(name):
+    # `client` and `async_client` are the shared clients, created on first use
+    # (see llm_client.get_client), so importing this module makes no client
+    if name == "client":
+        return get_client()
+    if name == "async_client":
+        return get_async_client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Number of existing events shown to the model when extracting an update, and
+# the window (days before, days after today) they are preferably taken from
+CANDIDATE_EVENTS = 5
+UPDATE_WINDOW_DAYS = (30, 365)
+
+# Per-request metrics of speculative routing, most recent last
+speculation_metrics = deque(maxlen=1000)
 
 # --------------------------------------------------------------
 # Data Models
@@ -45,7 +60,7 @@ CalendarRequestTypeModel = [{
 }, {
     "name": "confidence_score",
     "description": "LLM model confidence score between 0 and 1 for the request type classification",
-    "data_type": "int",
+    "data_type": "float",
     "required": True
 }, {
     "name": "description",
@@ -89,6 +104,11 @@ RequestedChangeModel = [{
 }]
 
 UpdateEventModel = [{
+    "name": "event_id",
+    "description": "id of the existing event to be updated, taken from the candidate events",
+    "data_type": "int",
+    "required": True
+}, {
     "name": "name_of_event",
     "description": "description of the existing event to be updated",
     "data_type": "string",
@@ -100,70 +120,160 @@ UpdateEventModel = [{
     "required": True
 }]
 
-data_model_descriptions = """
-Always return a JSON object using the following format:
-Below is the schema describing the fields.
-
-Schema:
-{schema_here}
-
-### INSTRUCTIONS
-- Use the `name` field as the key in the JSON output.  
-- Generate a value according to its `description` and `data_type`.  
-- Only include the keys (do not include `description`, `data_type`, or `required` in the output).  
-- If `required` is false, return a null value for that key.  
-- Your entire response must be a single valid JSON object, with no additional text, explanation, or Markdown formatting.  
-
-### OUTPUT FORMAT (example)
-{{
-  "field1": <value>,
-  "field2": <value>,
-  ...
-}}
-
-"""
-
-
 # --------------------------------------------------------------
 # Supporting functions
 # --------------------------------------------------------------
 #function to print output from model
 log_json = lambda data: logger.info(json.dumps(data, indent=2))
 
-def access_database_for_events(query: str = None):
+def access_database_for_events(query: str = None, log_rows: bool = False):
+    """
+    Read all events (no query) or run a write query on calender.db.
+    Connections come from the shared pool in calendar_db; pass
+    `log_rows=True` to log the whole table after a write.
+    """
     if query == None:
-        conn = sqlite3.connect('calender.db')
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM calender_events")
-        rows = cursor.fetchall()
-        conn.close()
-        return rows
-
-    conn = sqlite3.connect('calender.db')
-    cursor = conn.cursor()
+        return fetch_all("SELECT * FROM calender_events")
 
     logger.info("Executing query: %s", query)
-    cursor.execute(query)
-    conn.commit()
+    with get_pool().connection() as conn:
+        conn.execute(query)
+        conn.commit()
 
-    cursor.execute("SELECT * FROM calender_events")
-    logger.info("Query executed successfully. Fetching results...")
-    for row in cursor.fetchall():
-        logger.info(row)
-    conn.close()
+        logger.info("Query executed successfully.")
+        if log_rows:
+            for row in conn.execute("SELECT * FROM calender_events"):
+                logger.info(row)
 
 
 
-def call_function(name, args):
-    if name == "access_database_for_events":
-        return access_database_for_events(**args)
+tool_executor = ToolExecutor({"access_database_for_events": access_database_for_events},
+                             timeouts={"access_database_for_events": 10})
 
 
 
+# --------------------------------------------------------------
+# Prompts
+# --------------------------------------------------------------
+
+database_tools = [
+{
+    "type": "function",
+    "function": {
+        "name": "access_database_for_events",
+        "description": """Access the sqlite database with a query to fulfill a request.
+        - There is only one table in the database called calender_events.
+        - The table has the following columns: id, name_of_event, date, duration_minutes, participants.
+        - Use INSERT INTO to add a new calandar event.
+        - Use UPDATE to modify an existing calendar event.
+        """,
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {"type": "string"},
+            },
+            "required": ["query"],
+            "additionalProperties": False,
+        },
+        "strict": True,
+    },
+}
+]
+
+# The system prompts are compiled once at import. Volatile parts (the
+# current rows of the table) are appended after the static prefix.
+
+CALENDAR_REQUEST_PROMPT = compile_prompt(
+    "adjustment.calendar_request",
+    """
+    Determine if this is a request to create a new calendar event
+    or modify an existing one.
+    """,
+    data_structure=CalendarRequestTypeModel)
+
+CREATE_EVENT_PROMPT = compile_prompt(
+    "adjustment.create_event",
+    "Extract details for creating a new calendar event.",
+    data_structure=CreateEventModel)
+
+UPDATE_EVENT_PROMPT = compile_prompt(
+    "adjustment.update_event",
+    "Extract details for updating an existing calendar event.",
+    data_structure=UpdateEventModel,
+    appendix=f"""
+The `requested_changes` field should be a list of dictionaries, each containing:
+{json.dumps(RequestedChangeModel, indent=2)}
+ - Make sure that the field_to_update in the `requested_changes` field matches the column names in the database.
+ - Make sure that the new_value in the `requested_changes` field matches the data type of the column in the database.
+ - Combine date and time into a single string in ISO 8601 format when required.
+ - Note that result will be used to update the database calender_events which has a schema as follows:
+ id INTEGER PRIMARY KEY, name_of_event TEXT NOT NULL, date TEXT NOT NULL, duration_minutes INTEGER NOT NULL, participants TEXT NOT NULL
+""",
+    volatile="""
+    The existing events that best match the request are as follows for reference
+    (id, name_of_event, date, duration_minutes, participants):
+    {current_events}
+    """)
+
+INSERT_EVENT_PROMPT = compile_prompt(
+    "adjustment.insert_event",
+    """
+    Insert the new calendar event into the database using the following query format:
+    INSERT INTO calender_events (name_of_event, date, duration_minutes, participants)
+    """)
+
+APPLY_UPDATE_PROMPT = compile_prompt(
+    "adjustment.apply_update",
+    """
+    Update the calendar event in the database using the following query format:
+     UPDATE calender_events SET '...' = '...', '...' = '...' WHERE name_of_event = '...'
+     - Note that the schema for calender_events is as follows:
+     id INTEGER PRIMARY KEY, name_of_event TEXT NOT NULL, date TEXT NOT NULL, duration_minutes INTEGER NOT NULL, participants TEXT NOT NULL
+     - Update the event in one single query.
+     - Use tool calls to access the database.
+     - You dont need to know the current parameters of the event, just update the event with the new parameters provided.
+     - Use the `event_id` field (the id column) to identify the event to be updated,
+       or the `name_of_event` field if there is no `event_id`.
+    """)
+
+def _candidate_events_json(description: str) -> str:
+    """
+    The few events an update request is most likely about, so the prompt
+    stays the same size no matter how many events the calendar holds.
+    Events starting in the update window are preferred.
+    """
+    now = datetime.now()
+    window = ((now - timedelta(days=UPDATE_WINDOW_DAYS[0])).isoformat(),
+              (now + timedelta(days=UPDATE_WINDOW_DAYS[1])).isoformat())
+
+    candidates = find_candidate_events(description, k=CANDIDATE_EVENTS, window=window)
+    if not candidates:
+        candidates = find_candidate_events(description, k=CANDIDATE_EVENTS)
+    return json.dumps(candidates, indent=2)
+
+def _calendar_request_messages(user_input: str) -> list:
+    return [
+        {"role": "system", "content": CALENDAR_REQUEST_PROMPT.render()},
+        {"role": "user", "content": user_input},
+    ]
+
+def _create_event_messages(description: str) -> list:
+    return [
+        {"role": "system", "content": CREATE_EVENT_PROMPT.render()},
+        {"role": "user","content": description},
+    ]
+
+def _update_event_messages(description: str, current_events: str) -> list:
+    return [
+        {"role": "system", "content": UPDATE_EVENT_PROMPT.render(current_events=current_events)},
+        {"role": "user","content": description},
+    ]
+
 # --------------------------------------------------------------
 # Routing and processing functions
 # --------------------------------------------------------------
 
+@stage("adjustment.calendar_request")
 def determine_calendar_request(user_input: str) -> json:
     """
     Determins the calendar request type.
@@ -171,248 +281,338 @@ def determine_calendar_request(user_input: str) -> json:
 
     logger.info("Determining calendar request type...")
 
-    response = client.chat.completions.create(
+    response = get_client().chat.completions.create(
         model=model,
-        messages=[
-            {
-                "role": "system",
-                "content": f"""Determine if this is a request to create a new calendar event 
-                or modify an existing one. \n
-                {data_model_descriptions.format(
-                    schema_here=json.dumps(CalendarRequestTypeModel, indent=2))}""",
-            },
-            {
-                "role": "user",
-                "content": user_input,
-            },
-        ],
+        messages=_calendar_request_messages(user_input),
         response_format={"type": "json_object"})
 
     result = response.choices[0].message.content
-    result = json.loads(result)
+    result = load_json(result, CalendarRequestTypeModel, "adjustment.calendar_request")
     logger.info("Calendar request type determination completed.")
     log_json(result)
 
     return result
 
 
-def create_new_event(description:str) -> json:
+@stage("adjustment.create_event")
+def extract_new_event_details(description: str) -> json:
     """
-    Create a new calendar event based on the provided description.
+    Extract the details for a new calendar event from the description.
     """
 
     logger.info("Creating new calendar event...")
 
-    tools = [
-    {
-        "type": "function",
-        "function": {
-            "name": "access_database_for_events",
-            "description": """Access the sqlite database with a query to fulfill a request.
-            - There is only one table in the database called calender_events.
-            - The table has the following columns: name_of_event, date, duration, participants.
-            - Use INSERT INTO to add a new calandar event.
-            - Use UPDATE to modify an existing calendar event.
-            """,
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "query": {"type": "string"},
-                },
-                "required": ["query"],
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
-    }
-    ]
-
-    response = client.chat.completions.create(
+    response = get_client().chat.completions.create(
         model=model,
-        messages=[
-            {
-                "role": "system",
-                "content": f"""Extract details for creating a new calendar event. 
-                \n{data_model_descriptions.format(
-                    schema_here=json.dumps(CreateEventModel, indent=2))}""",
-            },
-            {"role": "user","content": description},
-        ],
+        messages=_create_event_messages(description),
         response_format={"type": "json_object"}
     )
 
     result = response.choices[0].message.content
-    result = json.loads(result)
+    result = load_json(result, CreateEventModel, "adjustment.create_event")
 
     logger.info("Calendar event details extracted...")
 
+    return result
+
+@stage("adjustment.insert_event")
+def insert_new_event(event_details: json, use_sql_tool: bool = False):
+    """
+    Insert an already extracted calendar event into the database.
+
+    The extracted fields are written with a parameterized INSERT. The model
+    is only asked to write SQL with the free-form database tool when
+    `use_sql_tool` is True, or as a fallback when the fields are invalid.
+    """
+
+    if not use_sql_tool:
+        try:
+            event_id = insert_event(event_details)
+            logger.info("New calendar event created successfully.")
+            return event_id
+        except ValueError as e:
+            logger.warning(f"Cannot insert extracted event ({e}), falling back to the SQL tool.")
+
     messages = [
-            {
-                "role": "system",
-                "content": f"""Insert the new calendar event into the database using the following query format:
-                \nINSERT INTO calender_events (name_of_event, date, duration_minutes, participants) 
-                """,
-            },
-            {"role": "user","content": json.dumps(result, indent=2)},
+            {"role": "system", "content": INSERT_EVENT_PROMPT.render()},
+            {"role": "user","content": json.dumps(event_details, indent=2)},
         ]
-    response2 = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        tools=tools,  # Automatically choose the best tool
-        temperature=0.7
-    )
+    # The tool results go back to the model, which confirms once the insert ran
+    result = run_agent(get_client(), messages, tools=database_tools, executor=tool_executor,
+                       model=model, max_steps=3, name="calendar.insert", temperature=0.7)
 
-    for tool_call in response2.choices[0].message.tool_calls:
-        name = tool_call.function.name
-        args = json.loads(tool_call.function.arguments)
-        messages.append(response2.choices[0].message) 
+    logger.info(f"New calendar event created ({result.round_trips} round trips): {result.content}")
 
-        result = call_function(name, args) # This is where the function is called
-        messages.append({
-            "role": "tool",
-            "content": json.dumps(result),
-            "tool_call_id": tool_call.id  # Critical: Match the original call
-        })
-
-    logger.info("New calendar event created successfully.")
+def create_new_event(description:str, use_sql_tool: bool = False) -> json:
+    """
+    Create a new calendar event based on the provided description.
+    """
+    return insert_new_event(extract_new_event_details(description), use_sql_tool)
 
-def update_event(description:str) -> json:
+@stage("adjustment.update_event")
+def extract_event_update_details(description: str) -> json:
     """
-    update existing calendar event based on the provided description.
+    Extract the requested changes to an existing calendar event.
     """
 
     logger.info("Updating existing calendar event...")
 
-    tools = [
-    {
-        "type": "function",
-        "function": {
-            "name": "access_database_for_events",
-            "description": """Access the sqlite database with a query to fulfill a request.
-            - There is only one table in the database called calender_events.
-            - The table has the following columns: name_of_event, date, duration, participants.
-            - Use INSERT INTO to add a new calandar event.
-            - Use UPDATE to modify an existing calendar event.
-            """,
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "query": {"type": "string"},
-                },
-                "required": ["query"],
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
-    }
-    ]
-    current_events = json.dumps(access_database_for_events(), indent=2)
+    current_events = _candidate_events_json(description)
 
-    response = client.chat.completions.create(
+    response = get_client().chat.completions.create(
         model=model,
-        messages=[
-            {
-                "role": "system",
-                "content": f"""Extract details for updating an existing calendar event. 
-                \n{data_model_descriptions.format(
-                    schema_here=json.dumps(UpdateEventModel, indent=2))}
-                \n
-                The `requested_changes` field should be a list of dictionaries, each containing:
-                \n{json.dumps(RequestedChangeModel, indent=2)}
-                \n - Make sure that the field_to_update in the `requested_changes` field matches the column names in the database.
-                \n - Make sure that the new_value in the `requested_changes` field matches the data type of the column in the database.
-                \n - Combine date and time into a single string in ISO 8601 format when required.
-                \n - Note that result will be used to update the database calender_events which has a schema as follows:
-                \n name_of_event TEXT NOT NULL, date TEXT NOT NULL, duration_minutes INTEGER NOT NULL, participants TEXT NOT NULL
-                \n The current rows in the database are as follows for reference:
-                \n {current_events}
-                """,
-            },
-            {"role": "user","content": description},
-        ],
+        messages=_update_event_messages(description, current_events),
         response_format={"type": "json_object"}
     )
 
     result = response.choices[0].message.content
-    result = json.loads(result)
+    result = load_json(result, UpdateEventModel, "adjustment.update_event")
 
     logger.info("Calendar event Update details extracted...")
     log_json(result)
 
+    return result
+
+@stage("adjustment.apply_update")
+def apply_event_update(update_details: json, use_sql_tool: bool = False):
+    """
+    Write already extracted changes of a calendar event to the database.
+
+    Like insert_new_event, the changes are written with a parameterized
+    UPDATE unless `use_sql_tool` is True or the changes are invalid.
+    """
+
+    if not use_sql_tool:
+        try:
+            updated = update_event_fields(update_details)
+            logger.info("Calender event updated successfully.")
+            return updated
+        except ValueError as e:
+            logger.warning(f"Cannot apply extracted changes ({e}), falling back to the SQL tool.")
+
     messages = [
-            {
-                "role": "system",
-                "content": f"""Update the calendar event in the database using the following query format:
-                \n UPDATE calender_events SET '...' = '...', '...' = '...' WHERE name_of_event = '...'
-                \n - Note that the schema for calender_events is as follows:
-                \n name_of_event TEXT NOT NULL, date TEXT NOT NULL, duration_minutes INTEGER NOT NULL, participants TEXT NOT NULL
-                \n - Update the event in one single query.
-                \n - Use tool calls to access the database.
-                \n - You dont need to know the current parameters of the event, just update the event with the new parameters provided.
-                \n - Use the `name_of_event` field to identify the event to be updated.
-                """,
-            },
-            {"role": "user","content": json.dumps(result, indent=2)},
+            {"role": "system", "content": APPLY_UPDATE_PROMPT.render()},
+            {"role": "user","content": json.dumps(update_details, indent=2)},
         ]
-    response2 = client.chat.completions.create(
-        model=model,
-        messages=messages,
-        tools=tools
-    )
+    result = run_agent(get_client(), messages, tools=database_tools, executor=tool_executor,
+                       model=model, max_steps=3, name="calendar.update")
 
-    logger.info(response2.model_dump())
+    logger.info(f"Calender event updated ({result.round_trips} round trips): {result.content}")
 
-    for tool_call in response2.choices[0].message.tool_calls:
-        name = tool_call.function.name
-        args = json.loads(tool_call.function.arguments)
-        messages.append(response2.choices[0].message) 
+def update_event(description:str, use_sql_tool: bool = False) -> json:
+    """
+    update existing calendar event based on the provided description.
+    """
+    return apply_event_update(extract_event_update_details(description), use_sql_tool)
 
-        result = call_function(name, args) # This is where the function is called
-        messages.append({
-            "role": "tool",
-            "content": json.dumps(result),
-            "tool_call_id": tool_call.id  # Critical: Match the original call
-        })
+# --------------------------------------------------------------
+# Speculative routing
+# --------------------------------------------------------------
 
-    logger.info("Calender event updated successfully.")
+async def _complete_json_async(messages: list, data_structure: list, name: str) -> tuple:
+    """
+    Run one JSON completion on the async client.
+    Returns the parsed result, the total tokens billed and the latency in seconds.
+    """
+    start = time.perf_counter()
+    with stage(name):
+        response = await get_async_client().chat.completions.create(
+            model=model,
+            messages=messages,
+            response_format={"type": "json_object"})
+    latency = time.perf_counter() - start
+
+    usage = getattr(response, "usage", None)
+    total_tokens = usage.total_tokens if usage else 0
+
+    return load_json(response.choices[0].message.content, data_structure, name), total_tokens, latency
+
+def _confidence(route_result: json) -> float:
+    """The router's confidence score, or 0.0 if it is missing or not a number."""
+    try:
+        return float(coerce_value(route_result.get("confidence_score") or 0, "float"))
+    except (TypeError, ValueError):
+        return 0.0
+
+def _prompt_tokens(messages: list) -> int:
+    """Rough prompt size of a request, about four characters per token."""
+    return sum(len(message["content"]) for message in messages) // 4
+
+async def _speculative_route(user_input: str) -> tuple:
+    """
+    Start the router and both extraction prompts at the same time.
 
-def process_calendar_request(user_input: str):
+    The extraction prompts only see the raw user input, since the router's
+    cleaned description is not known yet. Once the router answers, the
+    branch it picked is kept (subject to the confidence gate) and the
+    other one is cancelled, or dropped if it has already finished.
+    """
+    start = time.perf_counter()
+
+    # the router goes out first; the candidate events of the update prompt
+    # are looked up in a thread meanwhile, off the event loop
+    branch_messages = {"create": _create_event_messages(user_input)}
+    router = asyncio.create_task(_complete_json_async(
+        _calendar_request_messages(user_input), CalendarRequestTypeModel, "adjustment.calendar_request"))
+    branches = {
+        "create": asyncio.create_task(_complete_json_async(
+            branch_messages["create"], CreateEventModel, "adjustment.create_event")),
+    }
+    try:
+        current_events = await asyncio.to_thread(_candidate_events_json, user_input)
+        branch_messages["update"] = _update_event_messages(user_input, current_events)
+        branches["update"] = asyncio.create_task(_complete_json_async(
+            branch_messages["update"], UpdateEventModel, "adjustment.update_event"))
+        route_result, _, router_latency = await router
+    except BaseException:
+        for task in (router, *branches.values()):
+            task.cancel()
+        raise
+    log_json(route_result)
+
+    chosen = route_result.get("request_type")
+    if _confidence(route_result) < 0.7 or chosen not in branches:
+        chosen = None
+
+    # a finished branch cost its tokens; a cancelled one was sent already and
+    # is billed for at least its prompt, which is estimated
+    wasted_tokens = 0
+    cancelled_prompt_tokens = 0
+    cancelled, failed = [], []
+    for name, task in branches.items():
+        if name == chosen:
+            continue
+        if not task.done():
+            task.cancel()
+            cancelled.append(name)
+            cancelled_prompt_tokens += _prompt_tokens(branch_messages[name])
+        elif task.cancelled() or task.exception() is not None:
+            failed.append(name)
+        else:
+            wasted_tokens += task.result()[1]
+    await asyncio.gather(
+        *(task for name, task in branches.items() if name != chosen),
+        return_exceptions=True)
+
+    details = None
+    sequential_latency = router_latency
+    if chosen is not None:
+        details, _, branch_latency = await branches[chosen]
+        sequential_latency += branch_latency
+
+    wall_time = time.perf_counter() - start
+    metrics = {
+        "user_input": user_input,
+        "chosen_branch": chosen,
+        "router_latency_s": round(router_latency, 4),
+        "sequential_latency_s": round(sequential_latency, 4),
+        "speculative_latency_s": round(wall_time, 4),
+        "latency_saved_s": round(sequential_latency - wall_time, 4),
+        "wasted_tokens": wasted_tokens,
+        "cancelled_branches": cancelled,
+        "cancelled_prompt_tokens_estimate": cancelled_prompt_tokens,
+        "failed_branches": failed,
+    }
+
+    return route_result, details, metrics
+
+def _finish_speculative(route_result: json, details: json, metrics: dict, use_sql_tool: bool = False):
+    """The database step of a speculatively routed request."""
+    speculation_metrics.append(metrics)
+    logger.info("Speculative routing metrics:")
+    log_json(metrics)
+
+    if _confidence(route_result) < 0.7:
+        logger.warning(f"Low confidence score: {route_result.get('confidence_score')}")
+        return None
+
+    if metrics["chosen_branch"] == "create":
+        return insert_new_event(details, use_sql_tool)
+    elif metrics["chosen_branch"] == "update":
+        return apply_event_update(details, use_sql_tool)
+    else:
+        logger.warning("Request type not supported")
+        return None
+
+def _process_speculatively(user_input: str, use_sql_tool: bool = False):
+    # on the shared background loop, so its async client and connections are
+    # reused by the next request instead of closing with a per-call loop
+    return _finish_speculative(*run_async(_speculative_route(user_input)), use_sql_tool)
+
+@traced("adjustment.process_calendar_request")
+async def process_calendar_request_async(user_input: str, use_sql_tool: bool = False):
+    """
+    Speculative routing (see process_calendar_request) for callers that
+    already run in an event loop. The database step runs in a thread.
+    """
+    logger.info("Processing calendar request")
+    route_result, details, metrics = await _speculative_route(user_input)
+    return await asyncio.to_thread(_finish_speculative, route_result, details, metrics, use_sql_tool)
+
+@traced("adjustment.process_calendar_request")
+def process_calendar_request(user_input: str, speculative: bool = False, use_sql_tool: bool = False):
     """
     Main function implementing the routing workflow
+
+    With `speculative=True` the router and both extraction prompts run
+    concurrently, so the request pays one LLM latency before the database
+    step instead of two. Metrics for each speculative request are kept in
+    `speculation_metrics`. From async code, use process_calendar_request_async.
+
+    With `use_sql_tool=True` the model writes the SQL for the database
+    step itself, as before the typed insert/update operations existed.
     """
     logger.info("Processing calendar request")
 
+    if speculative:
+        return _process_speculatively(user_input, use_sql_tool)
+
     # Route the request
     route_result = determine_calendar_request(user_input)
 
     # Check confidence threshold
-    if route_result["confidence_score"] < 0.7:
-        logger.warning(f"Low confidence score: {route_result['confidence_score']}")
+    if _confidence(route_result) < 0.7:
+        logger.warning(f"Low confidence score: {route_result.get('confidence_score')}")
         return None
 
     # Route to appropriate handler
     if route_result["request_type"] == "create":
-        return create_new_event(route_result["description"])
+        return create_new_event(route_result["description"], use_sql_tool)
     elif route_result["request_type"] == "update":
-        return update_event(route_result["description"])
+        return update_event(route_result["description"], use_sql_tool)
     else:
         logger.warning("Request type not supported")
         return None
     
     
+
 # --------------------------------------------------------------
 # Tests
 # --------------------------------------------------------------
 
-new_event_input = "Let's schedule a team lunch next Tuesday at 2pm with Nada and Sana"
-result = process_calendar_request(new_event_input)
+def main():
+    """Run the example requests: python calendar_adjustment_aiagent.py"""
+    # Set up logging configuration
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(levelname)s - %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    # Spans of each request, if [TRACING] is enabled in config.ini (see tracing.py)
+    configure_tracing()
+
+    new_event_input = "Let's schedule a team lunch next Tuesday at 2pm with Nada and Sana"
+    result = process_calendar_request(new_event_input)
+
+    modify_event_input = (
+        "Can you move the team meeting with Alice, Bob and Charlie to Wednesday at 3pm instead?"
+    )
+    result = process_calendar_request(modify_event_input)
 
-modify_event_input = (
-    "Can you move the team meeting with Alice, Bob and Charlie to Wednesday at 3pm instead?"
-)
-result = process_calendar_request(modify_event_input)
 
+    invalid_input = "What's the weather like today?"
+    result = process_calendar_request(invalid_input)
 
-invalid_input = "What's the weather like today?"
-result = process_calendar_request(invalid_input)
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,576 @@
+"""
+calendar_db.py
+
+Access layer for the calendar sqlite database (calender.db).
+
+Connections are kept in a thread-safe pool instead of being opened and
+closed for every query. Every pooled connection runs in WAL journal mode
+(readers do not block the writer and the writer does not block readers),
+waits on a busy timeout instead of failing with "database is locked", and
+keeps its own cache of prepared statements, so parameterized queries that
+repeat are only compiled once per connection.
+
+Usage:
+    with get_pool().connection() as conn:
+        conn.execute("UPDATE calender_events SET date = ? WHERE id = ?", (date, event_id))
+
+    rows = fetch_all("SELECT * FROM calender_events WHERE name_of_event = ?", (name,))
+
+insert_event and update_event_fields write the JSON extracted by the
+calendar adjustment agent (CreateEventModel / UpdateEventModel) with
+parameterized statements, so no model has to write SQL for them. Dates
+are stored as ISO 8601 with seconds (2025-09-02T14:00:00), the form SQLite
+computes start_ts/end_ts from: a date without an offset is taken as UTC,
+one with an offset (2025-09-02T14:00:00+02:00) is converted to UTC for
+start_ts/end_ts and stored with its offset.
+
+The schema is versioned with `PRAGMA user_version`. The first pool opened
+on a database runs `migrate`, which upgrades older calender.db files in
+place (see SCHEMA_VERSION and _migrations below).
+"""
+import logging
+import queue
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from tracing import traced
+
+logger = logging.getLogger(__name__)
+
+DB_FILE = "calender.db"
+
+# --------------------------------------------------------------
+# Schema and migrations
+# --------------------------------------------------------------
+
+SCHEMA_VERSION = 3
+
+# Version 1: the original table created by generate_db.py
+_schema_v1 = """
+CREATE TABLE IF NOT EXISTS calender_events (
+    name_of_event TEXT NOT NULL,
+    date TEXT NOT NULL,
+    duration_minutes INTEGER NOT NULL,
+    participants TEXT NOT NULL);
+"""
+
+# Version 2: integer primary key, start/end as epoch seconds computed from
+# `date` and `duration_minutes`, and one row per participant in
+# event_participants. The triggers keep event_participants in sync with the
+# comma-joined `participants` column, whoever writes to calender_events.
+_schema_v2 = """
+CREATE TABLE calender_events (
+    id INTEGER PRIMARY KEY,
+    name_of_event TEXT NOT NULL,
+    date TEXT NOT NULL,
+    duration_minutes INTEGER NOT NULL,
+    participants TEXT NOT NULL,
+    start_ts INTEGER GENERATED ALWAYS AS (CAST(strftime('%s', date) AS INTEGER)) STORED,
+    end_ts INTEGER GENERATED ALWAYS AS
+        (CAST(strftime('%s', date) AS INTEGER) + duration_minutes * 60) STORED);
+
+CREATE INDEX idx_calender_events_name ON calender_events (name_of_event);
+CREATE INDEX idx_calender_events_start ON calender_events (start_ts);
+CREATE INDEX idx_calender_events_end ON calender_events (end_ts);
+
+CREATE TABLE event_participants (
+    participant TEXT NOT NULL COLLATE NOCASE,
+    event_id INTEGER NOT NULL,
+    PRIMARY KEY (participant, event_id)) WITHOUT ROWID;
+
+CREATE INDEX idx_event_participants_event ON event_participants (event_id);
+
+CREATE TRIGGER calender_events_participants_insert AFTER INSERT ON calender_events
+BEGIN
+    INSERT OR IGNORE INTO event_participants (participant, event_id)
+    SELECT trim(value), NEW.id
+    FROM json_each('["' || replace(PARTICIPANTS_JSON_SAFE, ',', '","') || '"]')
+    WHERE trim(value) <> '';
+END;
+
+CREATE TRIGGER calender_events_participants_update AFTER UPDATE OF participants ON calender_events
+BEGIN
+    DELETE FROM event_participants WHERE event_id = OLD.id;
+    INSERT OR IGNORE INTO event_participants (participant, event_id)
+    SELECT trim(value), NEW.id
+    FROM json_each('["' || replace(PARTICIPANTS_JSON_SAFE, ',', '","') || '"]')
+    WHERE trim(value) <> '';
+END;
+
+CREATE TRIGGER calender_events_participants_delete AFTER DELETE ON calender_events
+BEGIN
+    DELETE FROM event_participants WHERE event_id = OLD.id;
+END;
+""".replace(
+    # NEW.participants without the characters that cannot appear in a JSON string
+    "PARTICIPANTS_JSON_SAFE",
+    r"""replace(replace(replace(replace(replace(NEW.participants, '\', ''), '"', ''),
+        char(10), ' '), char(13), ' '), char(9), ' ')""")
+
+# Version 3: full-text index over event names and participants, used to
+# find the events an update request is most likely about.
+_schema_v3 = """
+CREATE VIRTUAL TABLE calender_events_fts USING fts5(
+    name_of_event, participants,
+    content='calender_events', content_rowid='id');
+
+CREATE TRIGGER calender_events_fts_insert AFTER INSERT ON calender_events
+BEGIN
+    INSERT INTO calender_events_fts (rowid, name_of_event, participants)
+    VALUES (NEW.id, NEW.name_of_event, NEW.participants);
+END;
+
+CREATE TRIGGER calender_events_fts_delete AFTER DELETE ON calender_events
+BEGIN
+    INSERT INTO calender_events_fts (calender_events_fts, rowid, name_of_event, participants)
+    VALUES ('delete', OLD.id, OLD.name_of_event, OLD.participants);
+END;
+
+CREATE TRIGGER calender_events_fts_update AFTER UPDATE OF name_of_event, participants ON calender_events
+BEGIN
+    INSERT INTO calender_events_fts (calender_events_fts, rowid, name_of_event, participants)
+    VALUES ('delete', OLD.id, OLD.name_of_event, OLD.participants);
+    INSERT INTO calender_events_fts (rowid, name_of_event, participants)
+    VALUES (NEW.id, NEW.name_of_event, NEW.participants);
+END;
+
+INSERT INTO calender_events_fts (calender_events_fts) VALUES ('rebuild');
+"""
+
+
+def _migrate_to_v1(conn: sqlite3.Connection):
+    conn.execute(_schema_v1)
+
+
+def _migrate_to_v2(conn: sqlite3.Connection):
+    conn.execute("ALTER TABLE calender_events RENAME TO calender_events_v1")
+    for statement in _split_statements(_schema_v2):
+        conn.execute(statement)
+    conn.execute("""
+        INSERT INTO calender_events (name_of_event, date, duration_minutes, participants)
+        SELECT name_of_event, date, duration_minutes, participants
+        FROM calender_events_v1 ORDER BY rowid""")
+    conn.execute("DROP TABLE calender_events_v1")
+
+
+def _migrate_to_v3(conn: sqlite3.Connection):
+    for statement in _split_statements(_schema_v3):
+        conn.execute(statement)
+
+
+# target version -> function upgrading from the version before it
+_migrations = {
+    1: _migrate_to_v1,
+    2: _migrate_to_v2,
+    3: _migrate_to_v3,
+}
+
+
+def _split_statements(script: str) -> list:
+    """Split a schema script into statements, keeping trigger bodies whole."""
+    statements, current = [], ""
+    for line in script.strip().splitlines(keepends=True):
+        current += line
+        if sqlite3.complete_statement(current):
+            statements.append(current.strip())
+            current = ""
+    return statements
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Upgrade the database to SCHEMA_VERSION in a single transaction.
+    Safe to call on an up-to-date database, and from several processes at
+    once: the version is checked again after taking the write lock.
+    """
+    if schema_version(conn) >= SCHEMA_VERSION:
+        return SCHEMA_VERSION
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = schema_version(conn)
+        for target in range(version + 1, SCHEMA_VERSION + 1):
+            logger.info("Migrating calendar database to schema version %d", target)
+            _migrations[target](conn)
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return SCHEMA_VERSION
+
+# --------------------------------------------------------------
+# Connection pool
+# --------------------------------------------------------------
+
+
+# put in the idle queue by close(), so threads waiting for a connection wake up
+_CLOSED = object()
+
+
+class ConnectionPool:
+    """
+    A fixed-size pool of sqlite connections to one database file.
+    Borrowers wait up to acquire_timeout seconds for a free connection and
+    then get sqlite3.OperationalError, like a busy database.
+    """
+
+    def __init__(self, path: str = DB_FILE, size: int = 8, busy_timeout_ms: int = 5000,
+                 cached_statements: int = 256, migrate: bool = True, acquire_timeout: float = 30):
+        self.path = path
+        self.size = size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cached_statements = cached_statements
+        self.acquire_timeout = acquire_timeout
+        self._needs_migration = migrate
+        self._migration_lock = threading.Lock()
+
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000,
+            check_same_thread=False,  # connections move between threads via the pool
+            cached_statements=self.cached_statements,
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        # the first connections may be opened concurrently; one of them migrates
+        # and the others wait for it, so none is used on the old schema
+        if self._needs_migration:
+            with self._migration_lock:
+                if self._needs_migration:
+                    migrate(conn)
+                    self._needs_migration = False
+        return conn
+
+    def _closed_error(self) -> sqlite3.OperationalError:
+        return sqlite3.OperationalError(f"connection pool for {self.path} is closed")
+
+    def _take(self, timeout: float = 0) -> sqlite3.Connection:
+        """An idle connection, waiting up to `timeout` seconds; raises queue.Empty."""
+        conn = self._idle.get(timeout=timeout) if timeout > 0 else self._idle.get_nowait()
+        if conn is _CLOSED:
+            self._idle.put(conn)  # for the next waiter
+            raise self._closed_error()
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._take()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._closed:
+                raise self._closed_error()
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._take(self.acquire_timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"no free connection in the pool for {self.path} "
+                f"after {self.acquire_timeout} seconds") from None
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection and give it back when the block ends.
+        Anything the block did not commit is rolled back, so the next
+        borrower always starts outside a transaction.
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            if self._closed:
+                conn.close()
+            else:
+                self._idle.put(conn)
+
+    def close(self):
+        """Close all idle connections; borrowed ones are closed when returned."""
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if conn is not _CLOSED:
+                conn.close()
+        self._idle.put(_CLOSED)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path: str = None) -> ConnectionPool:
+    """The process-wide pool for a database file (DB_FILE by default)."""
+    path = path or DB_FILE
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = ConnectionPool(path)
+        return pool
+
+
+@traced("sqlite.fetch_all")
+def fetch_all(query: str, params=(), path: str = None) -> list:
+    with get_pool(path).connection() as conn:
+        return conn.execute(query, params).fetchall()
+
+
+@traced("sqlite.execute_write")
+def execute_write(query: str, params=(), path: str = None) -> int:
+    """Run one write statement in its own transaction; returns the row count."""
+    with get_pool(path).connection() as conn:
+        cursor = conn.execute(query, params)
+        conn.commit()
+        return cursor.rowcount
+
+
+# --------------------------------------------------------------
+# Typed write operations
+# --------------------------------------------------------------
+
+# Field names the models may use -> column of calender_events
+_columns = {
+    "name_of_event": "name_of_event",
+    "date": "date",
+    "duration": "duration_minutes",
+    "duration_minutes": "duration_minutes",
+    "participants": "participants",
+}
+
+
+def _column_value(column: str, value):
+    """Check a value extracted by the model and convert it for its column."""
+    if column == "name_of_event":
+        if not isinstance(value, str) or not value.strip():
+            raise ValueError(f"name_of_event must be a non-empty string, got {value!r}")
+        return value.strip()
+
+    if column == "date":
+        # normalized, since fromisoformat accepts forms that SQLite's strftime
+        # does not (20250902T1400, 2025-W36-2) and start_ts would be NULL
+        try:
+            return datetime.fromisoformat(value).isoformat(timespec="seconds")
+        except (TypeError, ValueError):
+            raise ValueError(f"date must be an ISO 8601 string, got {value!r}") from None
+
+    if column == "duration_minutes":
+        if isinstance(value, str) and value.strip().isdigit():
+            value = int(value)
+        if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+            raise ValueError(f"duration must be a whole number of minutes, got {value!r}")
+        return value
+
+    # participants are stored comma-joined
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        value = value.split(",")
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise ValueError(f"participants must be a list of names, got {value!r}")
+    return ",".join(item.strip() for item in value if item.strip())
+
+
+@traced("sqlite.insert_event")
+def insert_event(event: dict, path: str = None) -> int:
+    """
+    Insert an event given as CreateEventModel JSON.
+    Returns the rowid of the new row; raises ValueError for invalid fields.
+    """
+    duration = event.get("duration", event.get("duration_minutes"))
+    row = (
+        _column_value("name_of_event", event.get("name_of_event")),
+        _column_value("date", event.get("date")),
+        _column_value("duration_minutes", duration),
+        _column_value("participants", event.get("participants")),
+    )
+    with get_pool(path).connection() as conn:
+        cursor = conn.execute(
+            "INSERT INTO calender_events (name_of_event, date, duration_minutes, participants) "
+            "VALUES (?, ?, ?, ?)", row)
+        conn.commit()
+        return cursor.lastrowid
+
+
+@traced("sqlite.update_event_fields")
+def update_event_fields(update: dict, path: str = None) -> int:
+    """
+    Apply an UpdateEventModel JSON in a single UPDATE. The event is found by
+    `event_id` when the model gave one, otherwise by `name_of_event`.
+    Returns the number of rows changed; raises ValueError for unknown
+    fields or invalid values.
+    """
+    event_id = update.get("event_id")
+    if isinstance(event_id, str) and event_id.strip().isdigit():
+        event_id = int(event_id)
+    if event_id is not None:
+        if isinstance(event_id, bool) or not isinstance(event_id, int):
+            raise ValueError(f"event_id must be an integer, got {event_id!r}")
+        where, key = "id = ?", event_id
+    else:
+        where, key = "name_of_event = ?", _column_value("name_of_event", update.get("name_of_event"))
+
+    changes = update.get("requested_changes")
+    if not isinstance(changes, list) or not changes:
+        raise ValueError("requested_changes must be a non-empty list")
+
+    assignments = {}
+    for change in changes:
+        field = change.get("field_to_update") if isinstance(change, dict) else None
+        column = _columns.get(field)
+        if column is None:
+            raise ValueError(f"Unknown field to update: {field!r}")
+        assignments[column] = _column_value(column, change.get("new_value"))
+
+    # column names come from _columns, never from the model
+    set_clause = ", ".join(f"{column} = ?" for column in assignments)
+    with get_pool(path).connection() as conn:
+        cursor = conn.execute(
+            f"UPDATE calender_events SET {set_clause} WHERE {where}",
+            (*assignments.values(), key))
+        conn.commit()
+        if cursor.rowcount == 0:
+            logger.warning("No event matching %s to update.", where.replace("?", repr(key)))
+        return cursor.rowcount
+
+# --------------------------------------------------------------
+# Indexed lookups
+# --------------------------------------------------------------
+
+_event_columns = "id, name_of_event, date, duration_minutes, participants"
+
+
+def events_named(name: str, path: str = None) -> list:
+    """Events with exactly this name (uses idx_calender_events_name)."""
+    return fetch_all(
+        f"SELECT {_event_columns} FROM calender_events WHERE name_of_event = ?", (name,), path)
+
+
+def events_in_range(start: str, end: str, limit: int = 100, path: str = None) -> list:
+    """
+    Events starting in [start, end), earliest first. `start` and `end` are
+    ISO 8601 strings, converted the same way as the `date` column.
+    """
+    return fetch_all(
+        f"""SELECT {_event_columns} FROM calender_events
+        WHERE start_ts >= CAST(strftime('%s', ?) AS INTEGER)
+          AND start_ts < CAST(strftime('%s', ?) AS INTEGER)
+        ORDER BY start_ts LIMIT ?""", (start, end, limit), path)
+
+
+def events_with_participant(participant: str, limit: int = 100, path: str = None) -> list:
+    """Events a participant takes part in, case-insensitive, earliest first."""
+    return fetch_all(
+        f"""SELECT {_event_columns.replace("id,", "e.id,")} FROM event_participants p
+        JOIN calender_events e ON e.id = p.event_id
+        WHERE p.participant = ?
+        ORDER BY e.start_ts LIMIT ?""", (participant.strip(), limit), path)
+
+
+# --------------------------------------------------------------
+# Candidate retrieval
+# --------------------------------------------------------------
+
+# Matching events ranked per lookup at most: ranking costs a BM25 score per
+# row, and a common word can match every event of the calendar
+MAX_RANKED_MATCHES = 1000
+
+# Words that say nothing about which event is meant
+_stopwords = frozenset("""
+a an and are at be can could do for from in instead is it let lets me my of on
+please the to with would you move change update reschedule rename set
+""".split())
+
+
+def _match_query(text: str) -> str:
+    """FTS5 query matching any of the meaningful words of `text`."""
+    terms = []
+    for term in re.findall(r"\w+", text.lower()):
+        if len(term) > 1 and term not in _stopwords and term not in terms:
+            terms.append(term)
+    return " OR ".join(f'"{term}"' for term in terms)
+
+
+@traced("sqlite.find_candidate_events")
+def find_candidate_events(description: str, k: int = 5, window: tuple = None,
+                          path: str = None) -> list:
+    """
+    The k events a request is most likely about, best match first, as
+    (id, name_of_event, date, duration_minutes, participants) rows.
+
+    Events are ranked with BM25 over their name and participants, names
+    weighing twice as much. `window` is an optional (start, end) pair of
+    ISO 8601 strings; only events starting in it are considered. At most
+    MAX_RANKED_MATCHES matching events are ranked, the most recently added
+    first. If no event matches any word of the description, the events
+    closest to the window (or the most recent ones) are returned instead.
+    """
+    window_clause, window_params = "", ()
+    limit_clause, limit_params = "ORDER BY f.rowid DESC LIMIT ?", (MAX_RANKED_MATCHES,)
+    if window is not None:
+        # the window first, counted on the start_ts index: an empty window
+        # needs no full-text search, and a small one is ranked whole
+        in_window = fetch_all(
+            """SELECT count(*) FROM (SELECT 1 FROM calender_events
+            WHERE start_ts >= CAST(strftime('%s', ?) AS INTEGER)
+              AND start_ts < CAST(strftime('%s', ?) AS INTEGER)
+            LIMIT ?)""", (*window, MAX_RANKED_MATCHES + 1), path)[0][0]
+        if not in_window:
+            return []
+        window_clause = """AND e.start_ts >= CAST(strftime('%s', ?) AS INTEGER)
+                           AND e.start_ts < CAST(strftime('%s', ?) AS INTEGER)"""
+        window_params = tuple(window)
+        if in_window <= MAX_RANKED_MATCHES:
+            limit_clause, limit_params = "", ()
+
+    match = _match_query(description)
+    if match:
+        rows = fetch_all(
+            f"""SELECT e.id, e.name_of_event, e.date, e.duration_minutes, e.participants
+            FROM (SELECT f.rowid AS id, bm25(calender_events_fts, 2.0, 1.0) AS score
+                  FROM calender_events_fts f
+                  JOIN calender_events e ON e.id = f.rowid
+                  WHERE calender_events_fts MATCH ? {window_clause}
+                  {limit_clause}) m
+            JOIN calender_events e ON e.id = m.id
+            ORDER BY m.score
+            LIMIT ?""", (match, *window_params, *limit_params, k), path)
+        if rows:
+            return rows
+
+    if window is not None:
+        return events_in_range(*window, limit=k, path=path)
+    return fetch_all(
+        f"SELECT {_event_columns} FROM calender_events ORDER BY start_ts DESC LIMIT ?", (k,), path)
@@ -5,59 +5,122 @@ In this script, i demonstrate my understanding of building an AI agent that can
 information about calendar meetings from a user prompt using the DeepSeek API.
 
 """
-import configparser
-from openai import OpenAI
 import json
-from CalendarMeeting import CalendarMeeting
-from datetime import datetime
+import sys
+from functools import lru_cache
+from incremental_json import IncrementalObjectParser
+from structured_output import parse_structured
+from prompt_compiler import DATE_CONTEXT, compile_prompt, today
+from llm_client import get_client
+from llm_metrics import stage
 
 
-config = configparser.ConfigParser()
-config.read("config.ini")
-deep_seek_api_key = config.get("API_KEYS", "openai_key")
+def __getattr__(name):
+    # `client` is the shared client, created on first use (see llm_client.get_client);
+    # the pydantic model and its prompt too, as pydantic alone takes most of a cold start
+    if name == "client":
+        return get_client()
+    if name == "CalendarMeeting":
+        return _model()
+    if name == "MEETING_PROMPT":
+        return _meeting_prompt()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-client = OpenAI(api_key=deep_seek_api_key, base_url="https://api.deepseek.com")
 
+def _model():
+    from CalendarMeeting import CalendarMeeting
+    return CalendarMeeting
 
-def parse_meeting(client, user_prompt: str) -> CalendarMeeting:
+
+@lru_cache(maxsize=None)
+def _meeting_prompt():
+    # The schema is rendered once; the date goes last so the prefix stays cacheable
+    return compile_prompt(
+        "meeting.parse_meeting",
+        """
+        You are an AI that extracts meeting details and outputs STRICT JSON.
+        Return only valid JSON.
+
+        Use the following schema:
+        """,
+        appendix=json.dumps(_model().model_json_schema(), indent=2),
+        volatile=DATE_CONTEXT)
+
+
+def _meeting_messages(user_prompt: str) -> list:
+    return [
+        {
+            "role": "system",
+            "content": _meeting_prompt().render(today=today())
+        },
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+@stage("meeting.parse_meeting")
+def parse_meeting(client, user_prompt: str) -> "CalendarMeeting":
     # Force JSON output via system prompt
-    today = datetime.now().strftime("%Y-%m-%d")
     response = client.chat.completions.create(
         model="deepseek-chat",  # Use the correct model name
-        messages=[
-            {
-                "role": "system",
-                "content": f"""
-                            You are an AI that extracts meeting details and outputs STRICT JSON.
-                            Today's date is {today}.
-
-                            Use the following schema:
-                            {json.dumps(CalendarMeeting.model_json_schema(), indent=2)}
-
-                            Return only valid JSON.
-                            """
-            },
-            {"role": "user", "content": user_prompt}
-        ],
+        messages=_meeting_messages(user_prompt),
         response_format={"type": "json_object"}, # Ensure response is in JSON format
         temperature = 1.0  
     )
     
-    # Parse the JSON response
-    try:
-        json_str = response.choices[0].message.content
-        data = CalendarMeeting(**json.loads(json_str))
-        
-        return data
-    except (KeyError, json.JSONDecodeError) as e:
-        raise ValueError(f"Failed to parse response: {e}")
+    # Parse the JSON response (repaired locally if needed, see structured_output.py);
+    # raises StructuredOutputError, a ValueError, if it does not validate
+    return parse_structured(response.choices[0].message.content, _model())
+
+def parse_meeting_stream(client, user_prompt: str):
+    """
+    Streaming variant of parse_meeting, for showing the meeting while the
+    model is still writing it.
 
+    Yields (fields, meeting): `fields` holds the CalendarMeeting fields whose
+    values are complete so far (raw JSON values, e.g. the date as a string),
+    and `meeting` is None until the stream has ended. The last item carries
+    the CalendarMeeting validated from the whole response.
+    Raises ValueError like parse_meeting if the response does not validate.
+    """
+    # a generator runs outside a decorator's stage, so the stage is set around the call
+    with stage("meeting.parse_meeting"):
+        stream = client.chat.completions.create(
+            model="deepseek-chat",
+            messages=_meeting_messages(user_prompt),
+            response_format={"type": "json_object"},
+            temperature = 1.0,
+            stream=True,
+            # the last chunk carries the usage, so the stream's tokens are recorded
+            stream_options={"include_usage": True},
+        )
+
+    model_fields = _model().model_fields
+    parser = IncrementalObjectParser()
+    for chunk in stream:
+        if not chunk.choices:
+            continue
+        completed = parser.feed(chunk.choices[0].delta.content or "")
+        if any(name in model_fields for name in completed):
+            yield {name: value for name, value in parser.fields.items()
+                   if name in model_fields}, None
+
+    # The fields are only trusted once the whole object validates
+    meeting = parse_structured(parser.text, _model())
+    yield meeting.model_dump(mode="json"), meeting
+
+
+# --------------------------------------------------------------
 # Example usage of parse_meeting function
+# --------------------------------------------------------------
+
+def main():
+    """python calender_meeting_ai_agent.py ["meeting description"]"""
+    meeting_statement = " ".join(sys.argv[1:]) or """Arthur and Nora were having lunch today with Mustafa.
+                    Mustafa said he will have a meeting on July 20,2025
+                    with Nora at 9pm in the office."""
+    meeting = parse_meeting(get_client(), meeting_statement)
+    print(meeting)
+
 
-# meeting_statement = """Arthur and Nora were having lunch today with Mustafa. 
-#                     Mustafa said he will have a meeting on July 20,2025 
-#                     with Nora at 9pm in the office."""
-# meeting = parse_meeting(
-#     client, meeting_statement
-# )
-# print(meeting) 
\ No newline at end of file
+if __name__ == "__main__":
+    main()
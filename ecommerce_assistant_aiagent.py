@@ -5,279 +5,134 @@ In this script, i demonstrate my understanding of building an AI agent that can
 information from a database or databank to answer user prompt.
 
 """
-import configparser
+import sys
+import time
 
-import json
-import os
+from llm_client import get_client
+from llm_metrics import stage
+from faq_matcher import shared_matcher, shared_metrics
+from kb_search import search_kb, search_kb_tool
+from prompt_compiler import compile_prompt
+from tool_executor import ToolExecutor
+from agent_loop import round_trip_metrics, run_agent
 
-from openai import OpenAI
-from pydantic import BaseModel, Field, ValidationError
-
-config = configparser.ConfigParser()
-config.read("config.ini")
-deep_seek_api_key = config.get("API_KEYS", "openai_key")
-
-client = OpenAI(api_key=deep_seek_api_key, base_url="https://api.deepseek.com")
-
-# --------------------------------------------------------------
-# Define the knowledge base retrieval tool
-# --------------------------------------------------------------
-def get_structured_response(client_object, messages, model, tools, object_structure) -> BaseModel:
-    """Generates a structured response from the AI model.
-       This primarily for deep-seek-chat model, which does not
-       support the parse method.
-    Args:
-        client_object: The OpenAI client object.
-        messages: List of messages to send to the model.
-        model: The model to use for generating the response.
-        tools: List of tools available for the model to use.
-        object_structure: Pydantic model defining the structure of the expected response."""
-
-    field_descriptions = {
-    name: field.description
-    for name, field in object_structure.model_fields.items()
-    }
-
-    for item in messages:
-        try:
-            if item["role"] == "system":
-                original_content = item["content"]
-                item["content"] = f"""The following is your system prompt:
-                                {original_content}
-        
-                                Ensure your response is in valid JSON format with these exact fields:
-                                {field_descriptions}"""
-                break
-        except TypeError:
-            continue
-
-    response = client_object.chat.completions.create(
-            model=model,  
-            messages=messages,
-            response_format={"type": "json_object"},
-            tools=tools, 
-            temperature = 1.0  
-        )
-    
-    try:
-        # print(response.model_dump())
-        json_str = response.choices[0].message.content
-        data = json.loads(json_str)
-
-        structured_response = object_structure(**data)
-
-        return structured_response, response
-    except (KeyError, json.JSONDecodeError, ValidationError) as e:
-        print(f"\n")
-        print(f"Failed to parse response: {e}")
-        print("Returning response as is...")
-        return None, response
-    
-    
-def load_kb(question: str):
-    """
-    Load the whole knowledge base from the JSON file.
-    """
-    with open("kb.json", "r") as f:
-        return json.load(f)
 
+def __getattr__(name):
+    # `client` is the shared client, created on first use (see llm_client.get_client);
+    # the pydantic model too, as pydantic alone takes most of a cold start
+    if name == "client":
+        return get_client()
+    if name == "KBResponse":
+        return _response_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # --------------------------------------------------------------
 # Step 1: Call model with search_kb tool defined
 # --------------------------------------------------------------
 
-tools = [
-    {
-        "type": "function",
-        "function": {
-            "name": "load_kb",
-            "description": "Get the answer to the user's question from the knowledge base.",
-            "parameters": {
-                "type": "object",
-                "properties": {
-                    "question": {"type": "string"},
-                },
-                "required": ["question"],
-                "additionalProperties": False,
-            },
-            "strict": True,
-        },
-    }
-]
+tools = [search_kb_tool]
 
-system_prompt = """You are a helpful assistant that answers questions
+system_prompt = compile_prompt("ecommerce.system", """You are a helpful assistant that answers questions
                     from the knowledge base about our e-commerce store.
                     
                     - If a user asks a question that is not in the knowledge base but related to the store,
                     you should respond with "I don't know the answer to that question."
                     - If a user asks a question that is not in the knowledge base and not related to the store,
                     you should respond with "Please ask questions only related to our e-commerce store."
-                    """
-
-
-messages = [
-    {"role": "system", "content": system_prompt},
-    {"role": "user", "content": "What is the return policy?"},
-]
-
-completion = client.chat.completions.create(
-    model="deepseek-chat",
-    messages=messages,
-    tools=tools,
-)
-
-# --------------------------------------------------------------
-# Step 2: Model decides to call function(s)
-# --------------------------------------------------------------
-# print(f"\n")
-# print(completion.model_dump())
+                    """).render()
 
-# --------------------------------------------------------------
-# Step 3: Execute search_kb function
-# --------------------------------------------------------------
 
+def _response_model():
+    from KBResponse import KBResponse
+    return KBResponse
 
-def call_function(name, args):
-    if name == "load_kb":
-        return load_kb(**args)
 
+tool_executor = ToolExecutor({"search_kb": search_kb}, timeouts={"search_kb": 10})
 
-for tool_call in completion.choices[0].message.tool_calls:
-    name = tool_call.function.name
-    args = json.loads(tool_call.function.arguments)
-    messages.append(completion.choices[0].message)
 
-    result = call_function(name, args)
-    messages.append(
-        {"role": "tool", "tool_call_id": tool_call.id, "content": json.dumps(result)}
+@stage("ecommerce")
+def answer_with_llm(question: str):
+    """
+    The model path: the agent loop (see agent_loop.py) lets the model call
+    search_kb (Steps 2-3) and sends the records back, and the model answers
+    from them in the same loop (Step 4), with no separate structured call.
+    Returns (KBResponse or None, the last completion).
+    """
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": question},
+    ]
+
+    # --------------------------------------------------------------
+    # Steps 2-4: Model calls search_kb, gets the records, answers
+    # --------------------------------------------------------------
+    result = run_agent(
+        get_client(),
+        messages,
+        tools=tools,
+        executor=tool_executor,
+        response_model=_response_model(),
+        max_steps=3,
+        name="ecommerce",
     )
-
-# --------------------------------------------------------------
-# Step 4: Supply result and call model again
-# --------------------------------------------------------------
+    return result.output, result.completion
 
 
-class KBResponse(BaseModel):
-    answer: str = Field(description="The answer to the user's question.")
-    source: int = Field(description="The record id of the answer.")
+def answer_question(question: str):
+    """
+    Answer straight from the knowledge base when the question closely matches
+    one of its questions (see faq_matcher.py), otherwise ask the model.
+    Returns (KBResponse or None, the last completion or None on the fast path).
+    """
+    matcher = shared_matcher()
+    if matcher is not None:
+        record, _ = matcher.match(question)
+        if record is not None:
+            return _response_model()(answer=record["answer"], source=record["id"]), None
 
+    start = time.perf_counter()
+    try:
+        return answer_with_llm(question)
+    finally:
+        shared_metrics.record_llm(time.perf_counter() - start)
 
-final_completion, final_completion_response = get_structured_response(
-    client_object=client,
-    messages=messages,
-    model="deepseek-chat",
-    tools=tools,
-    object_structure=KBResponse
-)
 
 # --------------------------------------------------------------
 # Step 5: Check model response
 # --------------------------------------------------------------
-print(f"\n")
-try:
-    print(final_completion.model_dump())
-except Exception as e:
-    print(f"Error: {e}")
-    print("returning raw response instead...")
-    print("Response content:", final_completion_response.choices[0].message.content)
-
-# --------------------------------------------------------------
-# Question that isnt related to the store
-# --------------------------------------------------------------
-
-print("\n")
-print("--------------------------------------------------------------")
-print("Question that isnt related to the store")
-print("--------------------------------------------------------------")
-
-messages = [
-    {"role": "system", "content": system_prompt},
-    {"role": "user", "content": "What is the weather in Tokyo?"},
-]
-
-completion = client.chat.completions.create(
-    model="deepseek-chat",
-    messages=messages,
-    tools=tools,
-)
 
-try:
-    for tool_call in completion.choices[0].message.tool_calls:
-        name = tool_call.function.name
-        args = json.loads(tool_call.function.arguments)
-        messages.append(completion.choices[0].message)
+def print_answer(question: str):
+    print("\n")
+    print("--------------------------------------------------------------")
+    print(question)
+    print("--------------------------------------------------------------")
 
-        result = call_function(name, args)
-        messages.append(
-            {"role": "tool", "tool_call_id": tool_call.id, "content": json.dumps(result)}
-        )
-except Exception as e:
-    print(f"Error: {e}")
-    print(completion.model_dump())
-else:
-    final_completion_2, final_completion_2_response = get_structured_response(
-        client_object=client,
-        messages=messages,
-        model="deepseek-chat",
-        tools=tools,
-        object_structure=KBResponse
-    )
-
-    print(f"\n")
+    final_completion, final_completion_response = answer_question(question)
     try:
-        print(final_completion_2.model_dump())
+        print(final_completion.model_dump())
     except Exception as e:
         print(f"Error: {e}")
         print("returning raw response instead...")
-        print(final_completion_2_response.model_dump())
+        print(final_completion_response.model_dump())
         print(f"\n")
 
-# --------------------------------------------------------------
-# Question that is related to the store but not int the knowledge base
-# --------------------------------------------------------------
-
-print("\n")
-print("--------------------------------------------------------------")
-print("Question that is related to the store but not in the knowledge base")
-print("--------------------------------------------------------------")
 
-messages = [
-    {"role": "system", "content": system_prompt},
-    {"role": "user", "content": "Do you have any discounts available?"},
-]
+def main():
+    """python ecommerce_assistant_aiagent.py ["question" ...]"""
+    questions = sys.argv[1:] or [
+        # Question in the knowledge base (answered by the FAQ fast path)
+        "What is the return policy?",
+        # Question that isnt related to the store
+        "What is the weather in Tokyo?",
+        # Question that is related to the store but not in the knowledge base
+        "Do you have any discounts available?",
+    ]
+    for question in questions:
+        print_answer(question)
 
-completion = client.chat.completions.create(
-    model="deepseek-chat",
-    messages=messages,
-    tools=tools,
-)
-try:
-    for tool_call in completion.choices[0].message.tool_calls:
-        name = tool_call.function.name
-        args = json.loads(tool_call.function.arguments)
-        messages.append(completion.choices[0].message)
+    print(shared_metrics.stats())
+    print(round_trip_metrics.stats())
 
-        result = call_function(name, args)
-        messages.append(
-            {"role": "tool", "tool_call_id": tool_call.id, "content": json.dumps(result)}
-        )
-except Exception as e:
-    print(f"Error: {e}")
-    print(completion.model_dump())
-else:
-    final_completion_3, final_completion_3_response = get_structured_response(
-        client_object=client,
-        messages=messages,
-        model="deepseek-chat",
-        tools=tools,
-        object_structure=KBResponse
-    )
 
-    print(f"\n")
-    try:
-        print(final_completion_3.model_dump())
-    except Exception as e:
-        print(f"Error: {e}")
-        print("returning raw response instead...")
-        print(final_completion_3_response.model_dump())
-        print(f"\n")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
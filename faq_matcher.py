@@ -0,0 +1,206 @@
+"""
+faq_matcher.py
+
+LLM-free fast path for questions that are (almost) the question of a
+knowledge base record.
+
+A question is normalized (lowercase, punctuation dropped, whitespace
+collapsed) and looked up among the normalized KB questions. If there is no
+exact match, it is compared with the KB questions by the Dice coefficient of
+their character trigrams, using a trigram inverted index to only score
+questions that share trigrams with it. A match at or above the threshold,
+and clearly ahead of the next closest question (min_margin), is answered
+from the record directly; anything else goes to the model.
+
+Hits, misses and latencies are counted in FAQMetrics, together with the
+latency of the LLM path (recorded by the caller), so the threshold can be
+tuned against it.
+
+The threshold can be configured in config.ini:
+    [FAQ_FAST_PATH]
+    enabled = true
+    threshold = 0.85
+    min_margin = 0.05
+"""
+import configparser
+import heapq
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from kb_search import shared_kb
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_THRESHOLD = 0.85
+DEFAULT_MIN_MARGIN = 0.05
+NGRAM_SIZE = 3
+
+_non_word = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(question: str) -> str:
+    """'What is the Return policy??' -> 'what is the return policy'"""
+    return _non_word.sub(" ", question.lower()).strip()
+
+
+def ngrams(text: str, n: int = NGRAM_SIZE) -> set:
+    """Character n-grams of normalized text, padded so word starts and ends count."""
+    padded = f" {text} "
+    return {padded[i:i + n] for i in range(max(1, len(padded) - n + 1))}
+
+
+def _median_ms(latencies) -> float:
+    ordered = sorted(latencies)
+    return round(1000 * ordered[len(ordered) // 2], 3) if ordered else None
+
+
+class FAQMetrics:
+    """Hit rate and latency of the fast path, next to the LLM path's latency."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.exact_hits = 0
+        self._match_latencies = deque(maxlen=window)
+        self._llm_latencies = deque(maxlen=window)
+
+    def record_match(self, seconds: float, hit: bool, exact: bool = False):
+        with self._lock:
+            self._match_latencies.append(seconds)
+            if hit:
+                self.hits += 1
+                self.exact_hits += exact
+            else:
+                self.misses += 1
+
+    def record_llm(self, seconds: float):
+        with self._lock:
+            self._llm_latencies.append(seconds)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "questions": total,
+                "hits": self.hits,
+                "exact_hits": self.exact_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "match_p50_ms": _median_ms(self._match_latencies),
+                "llm_p50_ms": _median_ms(self._llm_latencies),
+            }
+
+
+class FAQMatcher:
+    """Matches questions against the "question" field of knowledge base records."""
+
+    def __init__(self, records, threshold: float = DEFAULT_THRESHOLD, min_margin: float = DEFAULT_MIN_MARGIN,
+                 metrics: FAQMetrics = None):
+        self.threshold = threshold
+        self.min_margin = min_margin
+        self.metrics = metrics or FAQMetrics()
+
+        self._records = []
+        self._exact = {}
+        self._gram_counts = []
+        self._postings = defaultdict(list)  # trigram -> record positions
+        for record in records:
+            question = normalize(record.get("question", ""))
+            if not question:
+                continue
+            position = len(self._records)
+            self._records.append(record)
+            self._exact.setdefault(question, position)
+            grams = ngrams(question)
+            self._gram_counts.append(len(grams))
+            for gram in grams:
+                self._postings[gram].append(position)
+
+    def __len__(self):
+        return len(self._records)
+
+    def best_match(self, question: str) -> tuple:
+        """
+        (record, score, margin) of the most similar KB question, where margin
+        is how much better it scored than the runner-up. (None, 0.0, 0.0) if
+        no KB question shares a trigram with it.
+        """
+        text = normalize(question)
+        if text in self._exact:
+            return self._records[self._exact[text]], 1.0, 1.0
+
+        grams = ngrams(text)
+        shared = Counter()
+        for gram in grams:
+            positions = self._postings.get(gram)
+            if positions:
+                shared.update(positions)
+        if not shared:
+            return None, 0.0, 0.0
+
+        best = heapq.nlargest(
+            2, ((2 * count / (len(grams) + self._gram_counts[position]), position)
+                for position, count in shared.items()))
+        score, position = best[0]
+        margin = score - best[1][0] if len(best) > 1 else score
+        return self._records[position], score, margin
+
+    def is_hit(self, score: float, margin: float) -> bool:
+        """
+        At or above the threshold, and clearly closer than the next KB
+        question; near-ties are too ambiguous to answer without the model.
+        """
+        return score >= self.threshold and (score == 1.0 or margin >= self.min_margin)
+
+    def match(self, question: str) -> tuple:
+        """
+        (record, score) if the question is a hit, else (None, score).
+        Counted in the metrics.
+        """
+        start = time.perf_counter()
+        record, score, margin = self.best_match(question)
+        hit = record is not None and self.is_hit(score, margin)
+        self.metrics.record_match(time.perf_counter() - start, hit, exact=hit and score == 1.0)
+        if hit:
+            logger.info("FAQ fast path: record %s (score %.3f)", record.get("id"), score)
+            return record, score
+        return None, score
+
+
+# --------------------------------------------------------------
+# Shared matcher over the shared knowledge base
+# --------------------------------------------------------------
+
+_shared_matcher = None
+_shared_snapshot = None
+_shared_lock = threading.Lock()
+shared_metrics = FAQMetrics()
+
+
+def fast_path_settings(config_file: str = "config.ini") -> tuple:
+    """(enabled, threshold, min_margin) from the optional [FAQ_FAST_PATH] section of config.ini."""
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    return (config.getboolean("FAQ_FAST_PATH", "enabled", fallback=True),
+            config.getfloat("FAQ_FAST_PATH", "threshold", fallback=DEFAULT_THRESHOLD),
+            config.getfloat("FAQ_FAST_PATH", "min_margin", fallback=DEFAULT_MIN_MARGIN))
+
+
+def shared_matcher(config_file: str = "config.ini"):
+    """
+    Matcher over the records of kb_search.shared_kb(), rebuilt when the
+    knowledge base is reloaded. Returns None if the fast path is disabled.
+    """
+    global _shared_matcher, _shared_snapshot
+    snapshot = shared_kb().snapshot()
+    with _shared_lock:
+        if _shared_snapshot is not snapshot:
+            enabled, threshold, min_margin = fast_path_settings(config_file)
+            _shared_matcher = FAQMatcher(snapshot.records(), threshold, min_margin,
+                                         metrics=shared_metrics) if enabled else None
+            _shared_snapshot = snapshot
+        return _shared_matcher
@@ -0,0 +1,175 @@
+"""
+forecast_store.py
+
+Hourly forecast series kept per grid cell, so questions about a later time
+("what will it be at 6pm", "tonight in Berlin") are answered from the series
+the forecast request already returned instead of another HTTP call.
+
+Each series is a compact NumPy block: the hour timestamps as int64 UTC epoch
+seconds and one float32 row per variable. Values between two hours are
+linearly interpolated. Series expire with the forecast they came from, and
+the store evicts the least recently used cells once its arrays go over
+max_bytes.
+
+A forecast can run across a daylight saving switch, so local times are not
+converted with the response's single utc_offset_seconds. Local times asked
+for, and the times returned, use the offset of the location's timezone
+(the response's "timezone", looked up in the tz database) at that moment.
+An hourly series with a skipped or repeated hour holds wall-clock times, so
+each hour is converted with its own offset. An evenly spaced series has one
+offset throughout and is converted with utc_offset_seconds. If the tz
+database has no entry for the timezone (e.g. Windows without the tzdata
+package), utc_offset_seconds is used for everything, and times after a
+switch are off by the size of the shift.
+
+Usage:
+    store = ForecastStore(max_bytes=32 * 1024 * 1024)
+    store.put(cell, forecast_json, ttl_seconds=600)
+    store.at(cell, "2025-09-01T18:00")    # local time of the location
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import numpy as np
+
+
+@lru_cache(maxsize=None)
+def _zone(name: str):
+    """The tz database zone of a forecast's "timezone", or None if it is not known here."""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def _epoch_seconds(local_times, utc_offset_seconds: int, zone=None) -> np.ndarray:
+    """Open-Meteo's local "YYYY-MM-DDTHH:MM" strings to UTC epoch seconds."""
+    local = np.array(local_times, dtype="datetime64[m]").astype("datetime64[s]").astype(np.int64)
+    steps = np.diff(local)
+    if zone is None or not len(steps) or (steps == steps[0]).all():
+        return local - utc_offset_seconds
+    # wall-clock times across a switch: the second of a repeated hour is
+    # the one after the clocks went back (fold=1)
+    epochs = np.empty_like(local)
+    previous = None
+    for i, seconds in enumerate(local.tolist()):
+        wall = datetime(1970, 1, 1) + timedelta(seconds=seconds)
+        fold = int(previous is not None and seconds <= previous)
+        epochs[i] = int(wall.replace(tzinfo=zone, fold=fold).timestamp())
+        previous = seconds
+    return epochs
+
+
+def _local_epoch_seconds(when, utc_offset_seconds: int, zone=None) -> int:
+    """A local time at the location (ISO string or naive datetime), or an aware datetime, to epoch seconds."""
+    if isinstance(when, str):
+        when = datetime.fromisoformat(when)
+    if when.tzinfo is not None:
+        return int(when.timestamp())
+    if zone is not None:
+        return int(when.replace(tzinfo=zone).timestamp())
+    return int(when.replace(tzinfo=timezone.utc).timestamp()) - utc_offset_seconds
+
+
+class HourlySeries:
+    """The hourly block of one forecast response."""
+
+    def __init__(self, forecast: dict, expires_at: float):
+        hourly = forecast["hourly"]
+        self.utc_offset_seconds = int(forecast.get("utc_offset_seconds", 0))
+        self.timezone = forecast.get("timezone", "GMT")
+        self.zone = _zone(self.timezone)
+        self.units = forecast.get("hourly_units", {})
+        self.variables = tuple(name for name in hourly if name != "time")
+        self.times = _epoch_seconds(hourly["time"], self.utc_offset_seconds, self.zone)
+        self.values = np.array([hourly[name] for name in self.variables], dtype=np.float32)
+        self.expires_at = expires_at
+
+    @property
+    def nbytes(self) -> int:
+        return self.times.nbytes + self.values.nbytes
+
+    def covers(self, epoch_seconds: int) -> bool:
+        return len(self.times) > 0 and self.times[0] <= epoch_seconds <= self.times[-1]
+
+    def at(self, when) -> dict:
+        """
+        The variables at a time, interpolated between the neighbouring hours.
+        Raises ValueError if the time is outside the series.
+        """
+        moment = _local_epoch_seconds(when, self.utc_offset_seconds, self.zone)
+        if not self.covers(moment):
+            raise ValueError(f"{when} is outside the forecast range")
+        local = datetime.fromtimestamp(moment, tz=self.zone or timezone(timedelta(seconds=self.utc_offset_seconds)))
+        result = {"time": local.strftime("%Y-%m-%dT%H:%M")}
+        for name, row in zip(self.variables, self.values):
+            result[name] = round(float(np.interp(moment, self.times, row)), 1)
+        return result
+
+
+class ForecastStore:
+    """Hourly series by grid cell: TTL expiry and LRU eviction by total array size."""
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._series = OrderedDict()  # cell -> HourlySeries
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def put(self, cell: tuple, forecast: dict, ttl_seconds: float) -> HourlySeries:
+        """Store the hourly block of a forecast response for the cell."""
+        series = HourlySeries(forecast, time.monotonic() + ttl_seconds)
+        with self._lock:
+            old = self._series.pop(cell, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._series[cell] = series
+            self._bytes += series.nbytes
+            while self._bytes > self.max_bytes and len(self._series) > 1:
+                _, evicted = self._series.popitem(last=False)
+                self._bytes -= evicted.nbytes
+                self.evictions += 1
+        return series
+
+    def get(self, cell: tuple) -> HourlySeries:
+        """The fresh series of the cell, or None."""
+        with self._lock:
+            series = self._series.get(cell)
+            if series is not None and series.expires_at <= time.monotonic():
+                del self._series[cell]
+                self._bytes -= series.nbytes
+                series = None
+            if series is None:
+                self.misses += 1
+                return None
+            self._series.move_to_end(cell)
+            self.hits += 1
+            return series
+
+    def at(self, cell: tuple, when) -> dict:
+        """Interpolated variables for the cell at a time, or None if the cell has no fresh series."""
+        series = self.get(cell)
+        return series.at(when) if series is not None else None
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "cells": len(self._series),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -1,23 +1,19 @@
 import sqlite3
 import os
 
+from calendar_db import SCHEMA_VERSION, migrate
+
 db_file = "calender.db"
 
 if os.path.exists(db_file):
     os.remove(db_file)
     print(f"Deleted existing database: {db_file}")
 
-conn = sqlite3.connect('calender.db')
-
-cursor = conn.cursor()
+conn = sqlite3.connect(db_file)
 
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS calender_events (
-    name_of_event TEXT NOT NULL,
-    date TEXT NOT NULL,
-    duration_minutes INTEGER NOT NULL,
-    participants TEXT NOT NULL)
-               """)
+# Creates calender_events, event_participants and their indexes
+migrate(conn)
+print(f"Created schema version {SCHEMA_VERSION}")
 
 conn.execute("""
              INSERT INTO calender_events (name_of_event, date, duration_minutes, participants)
@@ -25,10 +21,10 @@ conn.execute("""
              """)
 
 conn.commit()
+cursor = conn.cursor()
 cursor.execute("""SELECT * FROM calender_events""")
 
 for row in cursor.fetchall():
     print(row)
 
 conn.close()
-    
\ No newline at end of file
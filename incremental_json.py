@@ -0,0 +1,85 @@
+"""
+incremental_json.py
+
+Reads a JSON object that arrives in pieces (a streamed completion) and
+hands out each top-level field as soon as its value is complete.
+
+The parser keeps a small scanner state (nesting depth, inside a string,
+escape), so every character is looked at once no matter how many chunks
+there are. When a top-level member ends (a "," or the closing "}" at depth
+one) only that member is decoded with json.loads. A string, number, list
+or nested object is never handed out half-finished.
+
+Usage:
+    parser = IncrementalObjectParser()
+    for chunk in stream:
+        new_fields = parser.feed(chunk)   # fields completed by this chunk
+    parser.fields                         # every field completed so far
+    parser.text                           # the whole text, for the final validation
+"""
+import json
+
+
+class IncrementalObjectParser:
+    """Top-level fields of a streamed JSON object, each one once its value is complete."""
+
+    def __init__(self):
+        self._chunks = []
+        self._pending = ""      # text of the current top-level member
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.fields = {}
+        self.done = False       # the closing "}" of the object was seen
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+    def feed(self, chunk: str) -> dict:
+        """Add the next piece of text; returns the fields it completed (may be empty)."""
+        if not chunk:
+            return {}
+        self._chunks.append(chunk)
+        completed = {}
+        start = 0
+        for i, char in enumerate(chunk):
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    start = i + 1
+                    self._pending = ""
+            elif char in "}]":
+                if self._depth == 1:
+                    self._close_member(self._pending + chunk[start:i], completed)
+                    self._pending = ""
+                    self.done = True
+                self._depth -= 1
+            elif char == "," and self._depth == 1:
+                self._close_member(self._pending + chunk[start:i], completed)
+                self._pending = ""
+                start = i + 1
+        if self._depth >= 1:
+            self._pending += chunk[start:]
+        return completed
+
+    def _close_member(self, member: str, completed: dict):
+        member = member.strip()
+        if not member:
+            return
+        try:
+            field = json.loads("{" + member + "}")
+        except json.JSONDecodeError:
+            # not valid on its own; the final validation of the whole text reports it
+            return
+        self.fields.update(field)
+        completed.update(field)
@@ -0,0 +1,158 @@
+"""
+kb_search.py
+
+Ranked search over the e-commerce knowledge base (kb.json).
+
+The knowledge base is read once and indexed in memory as a BM25 inverted
+index over each record's question and answer (the question counts double).
+`search_kb` returns only the top-k records, with their ids, so the tool
+result the model sees stays small no matter how many records there are.
+
+Usage:
+    kb = KnowledgeBase.from_file("kb.json")
+    kb.search("what is your return policy?", k=3)
+
+    search_kb("what is your return policy?")   # uses shared_kb()
+
+The shared knowledge base is served from the compiled file of kb_store.py.
+"""
+import heapq
+import json
+import logging
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+
+logger = logging.getLogger(__name__)
+
+KB_FILE = "kb.json"
+DEFAULT_K = 3
+MAX_K = 10
+
+# how much a term in the question counts compared to one in the answer
+QUESTION_WEIGHT = 2.0
+
+_token_pattern = re.compile(r"[a-z0-9]+")
+
+_stopwords = frozenset("""
+    a an and are as at be by can do does for from how i if in is it me my of on or
+    our so than that the this to we what when where which who why will with you your
+""".split())
+
+
+def tokenize(text: str) -> list:
+    """Lowercased word tokens without stopwords."""
+    return [token for token in _token_pattern.findall(text.lower()) if token not in _stopwords]
+
+
+class KnowledgeBase:
+    """
+    BM25 (Okapi) index over knowledge base records.
+    Records are dicts with at least "id", "question" and "answer".
+    """
+
+    def __init__(self, records: list, k1: float = 1.5, b: float = 0.75):
+        self.records = records
+        self.k1 = k1
+        self.b = b
+
+        # term -> list of (record index, weighted term frequency)
+        self._postings = defaultdict(list)
+        lengths = []
+        for index, record in enumerate(records):
+            frequencies = Counter(tokenize(record.get("answer", "")))
+            for token in tokenize(record.get("question", "")):
+                frequencies[token] += QUESTION_WEIGHT
+            for term, frequency in frequencies.items():
+                self._postings[term].append((index, frequency))
+            lengths.append(sum(frequencies.values()))
+
+        n_records = len(records)
+        average_length = (sum(lengths) / n_records) if n_records else 0.0
+        self._idf = {
+            term: math.log(1 + (n_records - len(postings) + 0.5) / (len(postings) + 0.5))
+            for term, postings in self._postings.items()
+        }
+        # the length part of the BM25 denominator only depends on the record
+        self._length_norm = [
+            k1 * (1 - b + b * length / average_length) if average_length else k1
+            for length in lengths
+        ]
+        logger.info("Indexed %d knowledge base records (%d terms)", n_records, len(self._postings))
+
+    @classmethod
+    def from_file(cls, path: str = KB_FILE) -> "KnowledgeBase":
+        with open(path, "r") as f:
+            return cls(json.load(f)["records"])
+
+    def __len__(self):
+        return len(self.records)
+
+    def search(self, question: str, k: int = DEFAULT_K) -> list:
+        """The k best matching records for the question, best first (with their "score")."""
+        scores = defaultdict(float)
+        for term in set(tokenize(question)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for index, frequency in self._postings[term]:
+                scores[index] += idf * frequency * (self.k1 + 1) / (frequency + self._length_norm[index])
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [dict(self.records[index], score=round(score, 4)) for index, score in best]
+
+
+# --------------------------------------------------------------
+# Shared index and the search_kb tool
+# --------------------------------------------------------------
+
+_shared_kb = None
+_shared_lock = threading.Lock()
+
+
+def shared_kb(path: str = None):
+    """
+    The process-wide knowledge base: a kb_store.KBStore over the compiled,
+    memory-mapped kb.kbc, reloaded in the background when kb.json changes.
+    """
+    global _shared_kb
+    with _shared_lock:
+        if _shared_kb is None:
+            from kb_store import KBStore  # kb_store builds on this module
+
+            _shared_kb = KBStore(path or KB_FILE)
+            _shared_kb.start_watching()
+        return _shared_kb
+
+
+def search_kb(question: str, k: int = DEFAULT_K) -> dict:
+    """
+    Tool function: the top-k knowledge base records for the question.
+    Same shape as kb.json, so the model reads the record ids as before.
+    """
+    k = max(1, min(int(k or DEFAULT_K), MAX_K))
+    return {"records": shared_kb().search(question, k)}
+
+
+search_kb_tool = {
+    "type": "function",
+    "function": {
+        "name": "search_kb",
+        "description": "Search the knowledge base for the records that best answer the user's question. "
+                       "Returns the best matching records with their ids, best match first.",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "question": {"type": "string"},
+                "k": {
+                    "type": "integer",
+                    "description": f"How many records to return, between 1 and {MAX_K}. Use {DEFAULT_K} if unsure.",
+                },
+            },
+            "required": ["question", "k"],
+            "additionalProperties": False,
+        },
+        "strict": True,
+    },
+}
@@ -0,0 +1,353 @@
+"""
+kb_store.py
+
+Compiled, memory-mapped knowledge base.
+
+`compile_kb` turns kb.json into a binary file (kb.kbc) that holds the records
+as compact JSON together with offset tables and the BM25 index of
+kb_search.KnowledgeBase. `CompiledKB` opens that file with mmap, so a record is
+read by id, and a question is searched, without parsing the whole knowledge
+base. The pages come from the OS page cache, so worker processes that open the
+same file share them instead of each keeping a parsed copy.
+
+`KBStore` keeps the compiled file in step with kb.json: when the source's
+mtime (or size) changes, a background thread has a new file compiled (in a
+separate process by default), moves it into place with os.replace and swaps
+the snapshot. Readers that already hold the old snapshot keep using it until
+they are done.
+
+Usage:
+    store = KBStore("kb.json")              # compiles kb.kbc if it is missing or stale
+    store.get(1)
+    store.search("what is your return policy?", k=3)
+    store.start_watching()                  # hot reload when kb.json changes
+
+    python kb_store.py kb.json              # build step, writes kb.kbc
+
+File layout (little endian):
+    header | record JSON blob | record table | id table | term table | term blob
+           | postings | length norms
+    record table  (id int64, offset uint64, length uint32) per record, in kb.json order
+    id table      (id int64, record position uint32), sorted by id
+    term table    (term offset uint64, term length uint16, idf float64,
+                   postings offset uint64, postings count uint32), sorted by term
+    postings      (record position uint32, weighted term frequency float32)
+    length norms  float64 per record, the length part of the BM25 denominator
+"""
+import concurrent.futures
+import heapq
+import json
+import logging
+import mmap
+import multiprocessing
+import os
+import struct
+import sys
+import threading
+import time
+
+from kb_search import DEFAULT_K, KB_FILE, KnowledgeBase, tokenize
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"KBC1"
+FORMAT_VERSION = 1
+
+_header = struct.Struct("<4sHxxIIdqq8Q")
+_record_entry = struct.Struct("<qQI")
+_id_entry = struct.Struct("<qI")
+_term_entry = struct.Struct("<QHdQI")
+_posting = struct.Struct("<If")
+_norm = struct.Struct("<d")
+
+
+def compiled_path(source: str) -> str:
+    """kb.json -> kb.kbc"""
+    return os.path.splitext(source)[0] + ".kbc"
+
+
+def _source_stamp(source: str) -> tuple:
+    stat = os.stat(source)
+    return stat.st_mtime_ns, stat.st_size
+
+
+# --------------------------------------------------------------
+# Build step
+# --------------------------------------------------------------
+
+def compile_kb(source: str = KB_FILE, target: str = None) -> str:
+    """
+    Compile the knowledge base JSON file into the binary format.
+    The file is written next to the target and moved into place with
+    os.replace, so readers never see a half-written file.
+    Returns the path of the compiled file.
+    """
+    target = target or compiled_path(source)
+    start = time.perf_counter()
+    mtime_ns, size = _source_stamp(source)
+    with open(source, "r") as f:
+        records = json.load(f)["records"]
+    kb = KnowledgeBase(records)
+
+    blobs = [json.dumps(record, separators=(",", ":")).encode("utf-8") for record in records]
+    terms = sorted((term.encode("utf-8"), postings) for term, postings in kb._postings.items())
+
+    sections = []
+    offset = _header.size
+
+    # record JSON blob and record table
+    record_blob_offset = offset
+    record_table = bytearray()
+    for record, blob in zip(records, blobs):
+        record_table += _record_entry.pack(int(record["id"]), offset, len(blob))
+        offset += len(blob)
+    sections.extend(blobs)
+
+    record_table_offset = offset
+    sections.append(record_table)
+    offset += len(record_table)
+
+    id_table_offset = offset
+    id_table = b"".join(_id_entry.pack(int(record["id"]), position) for position, record in
+                        sorted(enumerate(records), key=lambda item: int(item[1]["id"])))
+    sections.append(id_table)
+    offset += len(id_table)
+
+    # term table, term blob and postings
+    term_blob = bytearray()
+    postings = bytearray()
+    term_table = bytearray()
+    for term, term_postings in terms:
+        term_table += _term_entry.pack(len(term_blob), len(term), kb._idf[term.decode("utf-8")],
+                                       len(postings), len(term_postings))
+        term_blob += term
+        for position, frequency in term_postings:
+            postings += _posting.pack(position, frequency)
+
+    term_table_offset = offset
+    term_blob_offset = term_table_offset + len(term_table)
+    postings_offset = term_blob_offset + len(term_blob)
+    norms_offset = postings_offset + len(postings)
+    sections.extend([term_table, term_blob, postings,
+                     b"".join(_norm.pack(norm) for norm in kb._length_norm)])
+
+    header = _header.pack(MAGIC, FORMAT_VERSION, len(records), len(terms), kb.k1, mtime_ns, size,
+                          record_blob_offset, record_table_offset, id_table_offset,
+                          term_table_offset, term_blob_offset, postings_offset, norms_offset, 0)
+
+    temp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(header)
+        for section in sections:
+            f.write(section)
+        f.flush()
+        os.fsync(f.fileno())
+    try:
+        os.replace(temp_path, target)
+    except PermissionError:
+        # Windows will not replace a file that another reader still has mapped;
+        # use the new file under its temporary name until the next rebuild.
+        logger.warning("Could not replace %s while it is in use, using %s", target, temp_path)
+        target = temp_path
+
+    logger.info("Compiled %d knowledge base records into %s in %.2fs",
+                len(records), target, time.perf_counter() - start)
+    return target
+
+
+# --------------------------------------------------------------
+# Reader
+# --------------------------------------------------------------
+
+class CompiledKB:
+    """Read-only view of a compiled knowledge base file, through mmap."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+
+        (magic, version, self.n_records, self.n_terms, self.k1, self.source_mtime_ns,
+         self.source_size, _, self._record_table, self._id_table, self._term_table,
+         self._term_blob, self._postings, self._norms, _) = _header.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a compiled knowledge base (version {FORMAT_VERSION})")
+
+    def __len__(self):
+        return self.n_records
+
+    def is_current(self, source: str) -> bool:
+        """True if the file was compiled from the source as it is now."""
+        try:
+            return _source_stamp(source) == (self.source_mtime_ns, self.source_size)
+        except FileNotFoundError:
+            return True
+
+    def close(self):
+        self._view.release()
+        self._mmap.close()
+
+    # records
+
+    def _record_at(self, position: int) -> dict:
+        _, offset, length = _record_entry.unpack_from(self._mmap, self._record_table + position * _record_entry.size)
+        return json.loads(self._view[offset:offset + length].tobytes())
+
+    def get(self, record_id: int) -> dict:
+        """The record with this id, or None."""
+        low, high = 0, self.n_records
+        while low < high:
+            middle = (low + high) // 2
+            entry_id, position = _id_entry.unpack_from(self._mmap, self._id_table + middle * _id_entry.size)
+            if entry_id == record_id:
+                return self._record_at(position)
+            if entry_id < record_id:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def records(self):
+        """All records, in kb.json order."""
+        for position in range(self.n_records):
+            yield self._record_at(position)
+
+    # search
+
+    def _find_term(self, term: bytes) -> tuple:
+        low, high = 0, self.n_terms
+        while low < high:
+            middle = (low + high) // 2
+            term_offset, term_length, idf, postings_offset, count = _term_entry.unpack_from(
+                self._mmap, self._term_table + middle * _term_entry.size)
+            start = self._term_blob + term_offset
+            candidate = self._mmap[start:start + term_length]
+            if candidate == term:
+                return idf, postings_offset, count
+            if candidate < term:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def search(self, question: str, k: int = DEFAULT_K) -> list:
+        """Same ranking as kb_search.KnowledgeBase.search."""
+        scores = {}
+        factor = self.k1 + 1
+        for term in set(tokenize(question)):
+            found = self._find_term(term.encode("utf-8"))
+            if found is None:
+                continue
+            idf, postings_offset, count = found
+            start = self._postings + postings_offset
+            for position, frequency in _posting.iter_unpack(self._view[start:start + count * _posting.size]):
+                norm = _norm.unpack_from(self._mmap, self._norms + position * _norm.size)[0]
+                scores[position] = scores.get(position, 0.0) + idf * frequency * factor / (frequency + norm)
+
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [dict(self._record_at(position), score=round(score, 4)) for position, score in best]
+
+
+# --------------------------------------------------------------
+# Hot reload
+# --------------------------------------------------------------
+
+class KBStore:
+    """
+    The current CompiledKB snapshot of a knowledge base JSON file.
+    Rebuilds it in the background when the source changes.
+    """
+
+    def __init__(self, source: str = KB_FILE, target: str = None, poll_seconds: float = 2.0,
+                 compile_in_subprocess: bool = True):
+        self.source = source
+        self.target = target or compiled_path(source)
+        self.poll_seconds = poll_seconds
+        self.compile_in_subprocess = compile_in_subprocess
+        self.reloads = 0
+
+        self._lock = threading.Lock()
+        self._rebuilding = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        self._snapshot = self._open_or_compile()
+
+    def _open_or_compile(self) -> CompiledKB:
+        try:
+            snapshot = CompiledKB(self.target)
+            if snapshot.is_current(self.source):
+                return snapshot
+            snapshot.close()
+        except (FileNotFoundError, ValueError, struct.error) as e:
+            logger.info("Compiling %s (%s)", self.source, e)
+        return CompiledKB(compile_kb(self.source, self.target))
+
+    def snapshot(self) -> CompiledKB:
+        """
+        The current snapshot. Hold on to it for a sequence of reads that
+        must see the same version of the knowledge base.
+        """
+        with self._lock:
+            return self._snapshot
+
+    def __len__(self):
+        return len(self.snapshot())
+
+    def get(self, record_id: int) -> dict:
+        return self.snapshot().get(record_id)
+
+    def search(self, question: str, k: int = DEFAULT_K) -> list:
+        return self.snapshot().search(question, k)
+
+    def reload_if_changed(self) -> bool:
+        """Recompile and swap the snapshot if the source changed. Returns True if it did."""
+        with self._rebuilding:
+            if self.snapshot().is_current(self.source):
+                return False
+            if self.compile_in_subprocess:
+                # keep the compile off this process's GIL, so readers are not slowed down
+                context = multiprocessing.get_context("spawn")
+                with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as executor:
+                    path = executor.submit(compile_kb, self.source, self.target).result()
+            else:
+                path = compile_kb(self.source, self.target)
+            new_snapshot = CompiledKB(path)
+            with self._lock:
+                # the old snapshot is left to the garbage collector, so readers
+                # still using it are not cut off
+                self._snapshot = new_snapshot
+                self.reloads += 1
+            logger.info("Reloaded knowledge base from %s (%d records)", self.source, len(new_snapshot))
+            return True
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.reload_if_changed()
+            except (OSError, ValueError, KeyError) as e:
+                # a half-saved kb.json; try again on the next poll
+                logger.warning("Could not reload %s: %s", self.source, e)
+            except Exception:
+                # anything else (a broken compile subprocess, a pickling error)
+                # must not end the watcher either; the old snapshot keeps serving
+                logger.exception("Reloading %s failed", self.source)
+
+    def start_watching(self):
+        """Poll the source file's mtime from a daemon thread."""
+        if self._watcher is None:
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name="kb-store-watcher", daemon=True)
+            self._watcher.start()
+
+    def stop_watching(self):
+        if self._watcher is not None:
+            self._stop.set()
+            self._watcher.join()
+            self._watcher = None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    print(compile_kb(*sys.argv[1:3]))
@@ -0,0 +1,309 @@
+"""
+llm_cache.py
+
+Response cache for chat completions, shared by all agents.
+
+Byte-identical requests (retries, users pasting the same text again) are
+answered from the cache instead of the API. The key is a hash of the model,
+messages, tools, response_format, temperature and any other request
+parameter. Entries live in an in-memory LRU in front of an on-disk SQLite
+store, and expire after a TTL. If the prompt contains "Today's date is ...",
+that date is recorded with the entry and the entry expires at the end of
+that day, so date-dependent answers are not served on later days.
+
+Usage:
+    client = CachedClient(OpenAI(...))          # uses shared_cache()
+    client = CachedClient(AsyncOpenAI(...), cache=LLMCache("other.db"))
+
+The cache can be configured in config.ini:
+    [LLM_CACHE]
+    enabled = true
+    path = llm_cache.db
+    ttl_seconds = 86400
+    max_memory_entries = 1024
+    max_disk_bytes = 268435456
+"""
+import configparser
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+from llm_client import ClientWrapper, to_plain
+
+logger = logging.getLogger(__name__)
+
+_prompt_date_pattern = re.compile(r"Today's date is (\d{4}-\d{2}-\d{2})")
+
+
+def cache_key(request: dict) -> str:
+    """Stable hash of everything in the request that can change the answer."""
+    material = json.dumps(to_plain(request), sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def prompt_date(request: dict) -> str:
+    """The "Today's date is YYYY-MM-DD" value in the prompt, if there is one."""
+    for message in request.get("messages", []):
+        content = message.get("content") if isinstance(message, dict) else getattr(message, "content", None)
+        if isinstance(content, str):
+            match = _prompt_date_pattern.search(content)
+            if match:
+                return match.group(1)
+    return None
+
+
+def _end_of_day(day: str) -> float:
+    midnight = datetime.combine(date.fromisoformat(day) + timedelta(days=1), datetime.min.time())
+    return midnight.timestamp()
+
+
+class LLMCache:
+    """In-memory LRU in front of a SQLite store, with TTL and size-based eviction."""
+
+    def __init__(self, path: str = "llm_cache.db", ttl_seconds: float = 24 * 3600,
+                 max_memory_entries: int = 1024, max_disk_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> (response_json, expires_at)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                prompt_date TEXT,
+                created_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                size INTEGER NOT NULL)
+            """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)")
+        self._conn.commit()
+        self._disk_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        """Return the cached response JSON for `key`, or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                response, expires_at = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return response
+                del self._memory[key]
+
+            row = self._conn.execute(
+                "SELECT response, expires_at, size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+
+            response, expires_at, size = row
+            if expires_at <= now:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self._disk_bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._remember(key, response, expires_at)
+            self.disk_hits += 1
+            return response
+
+    def peek(self, key: str):
+        """The response JSON for `key` if the memory tier has it, or None; never reads the disk."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and entry[1] > now:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[0]
+        return None
+
+    def put(self, key: str, response: str, day: str = None):
+        """Store a response; `day` is the date the prompt was written for."""
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        if day is not None:
+            expires_at = min(expires_at, _end_of_day(day))
+        if expires_at <= now:
+            return
+        size = len(key) + len(response)
+
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, response, day, now, expires_at, now, size))
+            self._disk_bytes += size - (old[0] if old else 0)
+            self._evict_disk()
+            self._conn.commit()
+            self._remember(key, response, expires_at)
+
+    def purge_expired(self) -> int:
+        """Drop every expired entry; returns how many were removed."""
+        now = time.time()
+        with self._lock:
+            for key in [key for key, (_, expires_at) in self._memory.items() if expires_at <= now]:
+                del self._memory[key]
+            removed, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache WHERE expires_at <= ?",
+                (now,)).fetchone()
+            self._conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+            self._conn.commit()
+            self._disk_bytes -= size
+            self.expirations += removed
+            return removed
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+            self._disk_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "expirations": self.expirations,
+                "evictions": self.evictions,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk_bytes,
+            }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _remember(self, key: str, response: str, expires_at: float):
+        self._memory[key] = (response, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self):
+        # Expired entries go first, then the least recently used ones.
+        if self._disk_bytes <= self.max_disk_bytes:
+            return
+        for key, size in self._conn.execute(
+                "SELECT key, size FROM llm_cache ORDER BY expires_at <= ? DESC, last_access ASC",
+                (time.time(),)).fetchall():
+            if self._disk_bytes <= self.max_disk_bytes:
+                break
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            self._disk_bytes -= size
+            self.evictions += 1
+
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def shared_cache(config_file: str = "config.ini"):
+    """
+    The process-wide cache used by all agents, created on first use from the
+    optional [LLM_CACHE] section of config.ini. Returns None if disabled.
+    """
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            config = configparser.ConfigParser()
+            config.read(config_file)
+            if not config.getboolean("LLM_CACHE", "enabled", fallback=True):
+                return None
+            _shared_cache = LLMCache(
+                path=config.get("LLM_CACHE", "path", fallback="llm_cache.db"),
+                ttl_seconds=config.getfloat("LLM_CACHE", "ttl_seconds", fallback=24 * 3600),
+                max_memory_entries=config.getint("LLM_CACHE", "max_memory_entries", fallback=1024),
+                max_disk_bytes=config.getint("LLM_CACHE", "max_disk_bytes", fallback=256 * 1024 * 1024),
+            )
+        return _shared_cache
+
+
+class CachedClient(ClientWrapper):
+    """
+    Wraps an OpenAI or AsyncOpenAI client so that chat completions go
+    through an LLMCache. Streaming requests are never cached. With an
+    async client, memory hits are answered on the event loop and the
+    SQLite tier (lookups, stores and evictions) runs in a worker thread.
+    """
+
+    def __init__(self, client, cache: LLMCache = None):
+        super().__init__(client)
+        self.cache = cache if cache is not None else shared_cache()
+
+    def _key(self, request: dict) -> str:
+        """The cache key of the request, or None if it is not cached."""
+        if self.cache is None or request.get("stream"):
+            return None
+        return cache_key(request)
+
+    def _lookup(self, key: str, memory_only: bool = False):
+        if key is None:
+            return None
+        cached = self.cache.peek(key) if memory_only else self.cache.get(key)
+        if cached is None:
+            return None
+        logger.debug("LLM cache hit %s", key[:12])
+        # openai is only imported once a completion is handled (see llm_client.get_client)
+        from openai.types.chat import ChatCompletion
+        return ChatCompletion.model_validate_json(cached)
+
+    def _store(self, key: str, request: dict, response):
+        from openai.types.chat import ChatCompletion
+        if key is not None and isinstance(response, ChatCompletion) and response.choices:
+            self.cache.put(key, response.model_dump_json(), day=prompt_date(request))
+        return response
+
+    def _create(self, **request):
+        key = self._key(request)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        return self._store(key, request, self.wrapped_client.chat.completions.create(**request))
+
+    async def _create_async(self, **request):
+        import asyncio  # only async callers need it, and they have it imported already
+        key = self._key(request)
+        cached = self._lookup(key, memory_only=True)
+        if cached is None and key is not None:
+            # sqlite3 blocks, so the disk tier is read off the event loop
+            cached = await asyncio.to_thread(self._lookup, key)
+        if cached is not None:
+            return cached
+        response = await self.wrapped_client.chat.completions.create(**request)
+        if key is None:
+            return response
+        # the write and any eviction it triggers as well
+        return await asyncio.to_thread(self._store, key, request, response)
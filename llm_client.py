@@ -0,0 +1,224 @@
+"""
+llm_client.py
+
+Helpers shared by all agents for working with the OpenAI client.
+
+ClientWrapper is the base for layers that sit in front of a client
+(e.g. the response cache in llm_cache.py). A wrapper looks like the client
+it wraps: `wrapper.chat.completions.create(...)` goes through the layer,
+every other attribute is forwarded to the wrapped client. Wrappers can be
+stacked, and work the same way around `OpenAI` and `AsyncOpenAI`.
+
+get_client() / get_async_client() return the process-wide clients of the
+agents (an OpenAI client behind the metrics layer of llm_metrics.py and
+the response cache). In record mode the traffic recorder of
+traffic_replay.py sits right on the OpenAI client, below the cache; in
+replay mode the traffic log takes the place of the OpenAI client. They
+are created on first use, so importing an agent neither reads config.ini
+nor imports openai, which alone takes most of a second. The connections of
+an AsyncOpenAI client belong to the event loop that opened them, so every
+event loop gets its own async client (over the same cache and metrics).
+
+run_async() runs a coroutine for sync code on one long-lived event loop in
+a daemon thread, so the async client and its connections are reused from
+one call to the next instead of dying with an `asyncio.run` loop.
+
+The API key and endpoint come from config.ini, or from the LLM_API_KEY and
+LLM_BASE_URL environment variables, which take precedence:
+    [API_KEYS]
+    openai_key = sk-...
+
+    [LLM]
+    base_url = https://api.deepseek.com
+
+Usage:
+    client = get_client()
+    result = run_async(some_coroutine())    # from sync code
+    set_client(FakeClient())    # e.g. in benchmarks, before the agents run
+"""
+import configparser
+import inspect
+import os
+import sys
+import threading
+import weakref
+from types import SimpleNamespace
+
+DEFAULT_BASE_URL = "https://api.deepseek.com"
+
+
+def is_async_client(client) -> bool:
+    """True if `client.chat.completions.create` has to be awaited."""
+    flag = getattr(client, "is_async", None)
+    if isinstance(flag, bool):
+        return flag
+    create = inspect.unwrap(client.chat.completions.create)
+    return inspect.iscoroutinefunction(create)
+
+
+def to_plain(value):
+    """Turn pydantic objects (e.g. assistant messages echoed back) into plain data."""
+    if hasattr(value, "model_dump"):
+        return value.model_dump(exclude_none=True)
+    if isinstance(value, dict):
+        return {key: to_plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_plain(item) for item in value]
+    return value
+
+
+class ClientWrapper:
+    """
+    Base class for a layer in front of an OpenAI client.
+    Subclasses override `_create` and `_create_async`.
+    """
+
+    def __init__(self, client):
+        self.wrapped_client = client
+        self.is_async = is_async_client(client)
+        create = self._create_async if self.is_async else self._create
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+    def __getattr__(self, name):
+        return getattr(self.wrapped_client, name)
+
+    def _create(self, **request):
+        return self.wrapped_client.chat.completions.create(**request)
+
+    async def _create_async(self, **request):
+        return await self.wrapped_client.chat.completions.create(**request)
+
+
+# --------------------------------------------------------------
+# Shared clients
+# --------------------------------------------------------------
+
+_shared_clients = {}
+_shared_lock = threading.Lock()
+
+
+def client_settings(config_file: str = "config.ini") -> dict:
+    """The api_key and base_url for the OpenAI client, from the environment or config.ini."""
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    api_key = os.environ.get("LLM_API_KEY") or config.get("API_KEYS", "openai_key")
+    base_url = os.environ.get("LLM_BASE_URL") or config.get("LLM", "base_url", fallback=DEFAULT_BASE_URL)
+    return {"api_key": api_key, "base_url": base_url}
+
+
+def _new_client(kind: str, config_file: str):
+    # imported here: openai is the slowest import of the project
+    from openai import AsyncOpenAI, OpenAI
+    from llm_cache import CachedClient
+    from llm_metrics import MetricsClient, configure_metrics, metrics_enabled
+    from traffic_replay import RecordingClient, ReplayClient, shared_traffic_log, traffic_mode
+
+    mode = traffic_mode(config_file)
+    if mode == "replay":
+        # Recorded traffic answers instead of the API (see traffic_replay.py)
+        client = ReplayClient(shared_traffic_log(config_file), is_async=kind == "async")
+    else:
+        client_class = AsyncOpenAI if kind == "async" else OpenAI
+        client = client_class(**client_settings(config_file))
+        if mode == "record":
+            # only the calls that reach the API are logged, not cache hits
+            client = RecordingClient(client, shared_traffic_log(config_file))
+    if metrics_enabled(config_file):
+        # Calls that reach the API are recorded per stage (see llm_metrics.py)
+        client = MetricsClient(client)
+        configure_metrics(config_file)
+    # Responses are served from the shared cache for repeated requests
+    return CachedClient(client)
+
+
+def _shared_client(kind: str, config_file: str):
+    with _shared_lock:
+        if kind not in _shared_clients:
+            _shared_clients[kind] = _new_client(kind, config_file)
+        return _shared_clients[kind]
+
+
+def _running_loop():
+    # no event loop can be running before asyncio is imported
+    asyncio = sys.modules.get("asyncio")
+    if asyncio is None:
+        return None
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+# event loop -> its async client; a client goes away with its loop
+_loop_clients = weakref.WeakKeyDictionary()
+
+
+def get_client(config_file: str = "config.ini"):
+    """The process-wide sync client, created on first use."""
+    return _shared_client("sync", config_file)
+
+
+def get_async_client(config_file: str = "config.ini"):
+    """
+    The async client of the running event loop, created on first use. A
+    client given to set_client is returned on every loop.
+    """
+    loop = _running_loop()
+    with _shared_lock:
+        if "async" in _shared_clients or loop is None:
+            client = _shared_clients.get("async")
+        else:
+            client = _loop_clients.get(loop)
+        if client is not None:
+            return client
+    if loop is None:
+        return _shared_client("async", config_file)
+    client = _new_client("async", config_file)
+    with _shared_lock:
+        return _loop_clients.setdefault(loop, client)
+
+
+def set_client(client=None, async_client=None):
+    """Replace the shared clients (e.g. with a fake one); None leaves that client as it is."""
+    with _shared_lock:
+        if client is not None:
+            _shared_clients["sync"] = client
+        if async_client is not None:
+            _shared_clients["async"] = async_client
+
+
+# --------------------------------------------------------------
+# Background event loop
+# --------------------------------------------------------------
+
+_background_loop = None
+
+
+def _get_background_loop():
+    global _background_loop
+    with _shared_lock:
+        if _background_loop is None:
+            import asyncio
+
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="llm-event-loop", daemon=True).start()
+            _background_loop = loop
+        return _background_loop
+
+
+def run_async(coro):
+    """
+    Run a coroutine on the background event loop and wait for its result.
+    The coroutine sees the caller's context variables (stage, trace span);
+    if the caller is interrupted, the coroutine is cancelled. Must not be
+    called from the background loop itself.
+    """
+    import asyncio
+
+    # scheduled from this thread, so the task starts in a copy of its context
+    future = asyncio.run_coroutine_threadsafe(coro, _get_background_loop())
+    try:
+        return future.result()
+    except BaseException:
+        future.cancel()
+        raise
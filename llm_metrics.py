@@ -0,0 +1,460 @@
+"""
+llm_metrics.py
+
+Token, latency, cost and error metrics for every chat completion and tool
+call of the agents, per stage and per model.
+
+A stage is the step of an agent a call belongs to, e.g.
+"adjustment.calendar_request" or "confirmation.event_details". It is set
+with `stage(...)`, as a context manager or as a decorator (sync and async
+functions), and kept in a contextvar, so it follows the call into asyncio
+tasks and the ToolExecutor's threads. Calls made outside any stage are
+recorded under "other". Each stage is also a tracing span (see tracing.py).
+
+MetricsClient is a ClientWrapper (see llm_client.py) that times each
+completion and records response.usage: prompt, completion and cached
+prompt tokens, and the cost if the model has a price in config.ini.
+Streams are recorded when they end. A call cancelled before it finished
+(asyncio cancellation, KeyboardInterrupt) is counted as cancelled, not as
+an error. Each completion is also an
+"llm.completion" tracing span. The shared clients put it between the
+response cache and the API, so cache hits are not counted as API calls.
+
+The numbers can be read in-process with `llm_metrics.snapshot()`, or in
+the Prometheus text format: `prometheus_text()`, written to a file, or
+served on http://host:port/metrics.
+
+Usage:
+    @stage("confirmation.event_details")
+    def extract_event_details(...): ...
+
+    with stage("meeting.parse_meeting"):
+        client.chat.completions.create(...)
+
+    llm_metrics.snapshot()["completions"]["meeting.parse_meeting"]["deepseek-chat"]["prompt_tokens"]
+
+Configured in config.ini (all optional):
+    [LLM_METRICS]
+    enabled = true
+    file = llm_metrics.prom        ; rewritten every file_interval seconds
+    file_interval = 15
+    port = 9464                    ; serves /metrics, 0 = off
+    host = 127.0.0.1               ; 0.0.0.0 to let other hosts scrape it
+
+    [LLM_PRICES]
+    ; USD per million tokens: prompt, completion, cached prompt
+    deepseek-chat = 0.28 0.42 0.028
+"""
+import atexit
+import configparser
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from llm_client import ClientWrapper
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STAGE = "other"
+
+# upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_current_stage = contextvars.ContextVar("llm_stage", default=DEFAULT_STAGE)
+
+
+def current_stage() -> str:
+    return _current_stage.get()
+
+
+class stage:
+    """Sets the stage of the calls made inside it; a context manager and a decorator."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._tokens = []
+
+    def __enter__(self):
+        stage_span = span(self.name).__enter__()
+        self._tokens.append((_current_stage.set(self.name), stage_span))
+        return self
+
+    def __exit__(self, *exc):
+        token, stage_span = self._tokens.pop()
+        _current_stage.reset(token)
+        stage_span.__exit__(*exc)
+        return False
+
+    def __call__(self, function):
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                with stage(self.name):
+                    return await function(*args, **kwargs)
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                with stage(self.name):
+                    return function(*args, **kwargs)
+        return wrapper
+
+
+# --------------------------------------------------------------
+# Registry
+# --------------------------------------------------------------
+
+class _Histogram:
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def cumulative(self) -> list:
+        """(upper bound, observations <= bound) per bucket, ending with +Inf."""
+        total, out = 0, []
+        for bound, count in zip(list(self.buckets) + [float("inf")], self.counts):
+            total += count
+            out.append((bound, total))
+        return out
+
+    def snapshot(self) -> dict:
+        return {"count": self.count, "sum": round(self.sum, 6),
+                "mean": round(self.sum / self.count, 6) if self.count else None,
+                "buckets": {_le(bound): count for bound, count in self.cumulative()}}
+
+
+def _le(bound: float) -> str:
+    return "+Inf" if bound == float("inf") else repr(bound)
+
+
+def _new_completion_series() -> dict:
+    return {"requests": 0, "errors": 0, "cancelled": 0, "prompt_tokens": 0, "completion_tokens": 0,
+            "cached_tokens": 0, "cost_usd": 0.0, "latency": _Histogram()}
+
+
+def _new_tool_series() -> dict:
+    return {"calls": 0, "errors": 0, "timeouts": 0, "latency": _Histogram()}
+
+
+def _usage_tokens(usage) -> tuple:
+    """(prompt, completion, cached prompt) tokens of a response.usage, OpenAI or DeepSeek style."""
+    if usage is None:
+        return 0, 0, 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", None) if details is not None else None
+    if cached is None:
+        cached = getattr(usage, "prompt_cache_hit_tokens", None)  # DeepSeek
+    return usage.prompt_tokens or 0, usage.completion_tokens or 0, cached or 0
+
+
+class LLMMetrics:
+    """Completion and tool call metrics by (stage, model) and (stage, tool)."""
+
+    def __init__(self, prices: dict = None):
+        """prices: model -> (prompt, completion, cached prompt) USD per million tokens."""
+        self.prices = dict(prices or {})
+        self._lock = threading.Lock()
+        self._completions = {}
+        self._tools = {}
+
+    def observe_completion(self, stage_name: str, model: str, seconds: float, usage=None, outcome: str = "ok"):
+        """outcome: "ok", "error" or "cancelled"."""
+        prompt, completion, cached = _usage_tokens(usage)
+        with self._lock:
+            series = self._completions.setdefault((stage_name, model), _new_completion_series())
+            series["requests"] += 1
+            series["errors"] += outcome == "error"
+            series["cancelled"] += outcome == "cancelled"
+            series["prompt_tokens"] += prompt
+            series["completion_tokens"] += completion
+            series["cached_tokens"] += cached
+            series["latency"].observe(seconds)
+            if model in self.prices:
+                prompt_price, completion_price, cached_price = self.prices[model]
+                series["cost_usd"] += ((prompt - cached) * prompt_price + cached * cached_price
+                                       + completion * completion_price) / 1e6
+
+    def observe_tool(self, stage_name: str, tool: str, seconds: float, outcome: str = "ok"):
+        """outcome: "ok", "error" or "timeout"."""
+        with self._lock:
+            series = self._tools.setdefault((stage_name, tool), _new_tool_series())
+            series["calls"] += 1
+            series["errors"] += outcome == "error"
+            series["timeouts"] += outcome == "timeout"
+            series["latency"].observe(seconds)
+
+    def snapshot(self) -> dict:
+        """
+        Plain data copy: {"completions": {stage: {model: {...}}},
+        "tools": {stage: {tool: {...}}}}, latency as count/sum/mean/buckets.
+        """
+        with self._lock:
+            out = {"completions": {}, "tools": {}}
+            for kind, table in (("completions", self._completions), ("tools", self._tools)):
+                for (stage_name, key), series in table.items():
+                    values = {name: value for name, value in series.items() if name != "latency"}
+                    if "cost_usd" in values:
+                        values["cost_usd"] = round(values["cost_usd"], 6)
+                    values["latency"] = series["latency"].snapshot()
+                    out[kind].setdefault(stage_name, {})[key] = values
+            return out
+
+    def reset(self):
+        with self._lock:
+            self._completions.clear()
+            self._tools.clear()
+
+    # Prometheus
+
+    def prometheus_text(self) -> str:
+        """All series in the Prometheus text exposition format."""
+        lines = []
+
+        def family(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples)
+
+        def counter(table, name, field, label, help_text):
+            family(name, "counter", help_text,
+                   [f"{name}{_labels(stage=s, **{label: k})} {_number(series[field])}"
+                    for (s, k), series in table.items()])
+
+        def histogram(table, name, label, help_text):
+            samples = []
+            for (s, k), series in table.items():
+                latency = series["latency"]
+                for bound, count in latency.cumulative():
+                    samples.append(f"{name}_bucket{_labels(stage=s, **{label: k}, le=_le(bound))} {count}")
+                samples.append(f"{name}_sum{_labels(stage=s, **{label: k})} {_number(latency.sum)}")
+                samples.append(f"{name}_count{_labels(stage=s, **{label: k})} {latency.count}")
+            family(name, "histogram", help_text, samples)
+
+        with self._lock:
+            completions, tools = self._completions, self._tools
+            counter(completions, "llm_requests_total", "requests", "model", "Chat completions made.")
+            counter(completions, "llm_errors_total", "errors", "model", "Chat completions that raised.")
+            counter(completions, "llm_cancelled_total", "cancelled", "model",
+                    "Chat completions cancelled before they finished.")
+            counter(completions, "llm_prompt_tokens_total", "prompt_tokens", "model", "Prompt tokens billed.")
+            counter(completions, "llm_completion_tokens_total", "completion_tokens", "model",
+                    "Completion tokens billed.")
+            counter(completions, "llm_cached_tokens_total", "cached_tokens", "model",
+                    "Prompt tokens served from the provider's prompt cache.")
+            counter(completions, "llm_cost_usd_total", "cost_usd", "model",
+                    "Cost of the completions, for models with a price in [LLM_PRICES].")
+            histogram(completions, "llm_request_duration_seconds", "model", "Chat completion latency.")
+            counter(tools, "tool_calls_total", "calls", "tool", "Tool calls run.")
+            counter(tools, "tool_errors_total", "errors", "tool", "Tool calls that raised.")
+            counter(tools, "tool_timeouts_total", "timeouts", "tool", "Tool calls that timed out.")
+            histogram(tools, "tool_call_duration_seconds", "tool", "Tool call latency.")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str):
+        """Write prometheus_text() to a file (replaced atomically, e.g. for node_exporter's textfile collector)."""
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text())
+        os.replace(temporary, path)
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """
+        Serve prometheus_text() on http://host:port/metrics from a daemon thread.
+        Only local by default; pass host="0.0.0.0" to expose it. Returns the server.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=server.serve_forever, name="llm-metrics", daemon=True).start()
+        logger.info("Serving LLM metrics on http://%s:%s/metrics", host, server.server_port)
+        return server
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+llm_metrics = LLMMetrics()
+
+
+# --------------------------------------------------------------
+# Client wrapper
+# --------------------------------------------------------------
+
+class MetricsClient(ClientWrapper):
+    """Records every chat completion in an LLMMetrics (llm_metrics by default) under the current stage."""
+
+    def __init__(self, client, metrics: LLMMetrics = None):
+        super().__init__(client)
+        self.metrics = metrics if metrics is not None else llm_metrics
+
+    def _observe(self, request: dict, start: float, call_span, usage=None, outcome: str = "ok"):
+        self.metrics.observe_completion(current_stage(), request.get("model", "unknown"),
+                                        time.perf_counter() - start, usage, outcome)
+        prompt, completion, cached = _usage_tokens(usage)
+        call_span.set(prompt_tokens=prompt, completion_tokens=completion, cached_tokens=cached)
+        if outcome != "ok":
+            call_span.set(outcome=outcome)
+        call_span.finish()
+
+    def _start(self, request: dict) -> tuple:
+        return time.perf_counter(), span("llm.completion", model=request.get("model")).start()
+
+    def _failed(self, request: dict, start: float, call_span, error: BaseException):
+        # CancelledError and KeyboardInterrupt are not Exceptions: the call
+        # was cancelled, it did not fail
+        if isinstance(error, Exception):
+            self._observe(request, start, call_span.set(error=repr(error)), outcome="error")
+        else:
+            self._observe(request, start, call_span, outcome="cancelled")
+
+    def _create(self, **request):
+        start, call_span = self._start(request)
+        try:
+            response = self.wrapped_client.chat.completions.create(**request)
+        except BaseException as e:
+            self._failed(request, start, call_span, e)
+            raise
+        if request.get("stream"):
+            return self._stream(response, request, start, call_span, current_stage())
+        self._observe(request, start, call_span, getattr(response, "usage", None))
+        return response
+
+    async def _create_async(self, **request):
+        start, call_span = self._start(request)
+        try:
+            response = await self.wrapped_client.chat.completions.create(**request)
+        except BaseException as e:
+            self._failed(request, start, call_span, e)
+            raise
+        if request.get("stream"):
+            return self._stream_async(response, request, start, call_span, current_stage())
+        self._observe(request, start, call_span, getattr(response, "usage", None))
+        return response
+
+    # a stream is recorded when it ends, under the stage it was started in;
+    # usage is only sent with stream_options={"include_usage": True}
+
+    def _stream(self, stream, request, start, call_span, stage_name):
+        usage, outcome = None, "ok"
+        try:
+            for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                yield chunk
+        except GeneratorExit:
+            raise  # the caller stopped reading
+        except BaseException as e:
+            outcome = "error" if isinstance(e, Exception) else "cancelled"
+            raise
+        finally:
+            token = _current_stage.set(stage_name)
+            self._observe(request, start, call_span, usage, outcome)
+            _current_stage.reset(token)
+
+    async def _stream_async(self, stream, request, start, call_span, stage_name):
+        usage, outcome = None, "ok"
+        try:
+            async for chunk in stream:
+                usage = getattr(chunk, "usage", None) or usage
+                yield chunk
+        except GeneratorExit:
+            raise  # the caller stopped reading
+        except BaseException as e:
+            outcome = "error" if isinstance(e, Exception) else "cancelled"
+            raise
+        finally:
+            token = _current_stage.set(stage_name)
+            self._observe(request, start, call_span, usage, outcome)
+            _current_stage.reset(token)
+
+
+# --------------------------------------------------------------
+# Configuration
+# --------------------------------------------------------------
+
+_exporters = {}
+_exporters_lock = threading.Lock()
+
+
+def metrics_enabled(config_file: str = "config.ini") -> bool:
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    return config.getboolean("LLM_METRICS", "enabled", fallback=True)
+
+
+def configure_metrics(config_file: str = "config.ini") -> LLMMetrics:
+    """
+    Load [LLM_PRICES] into llm_metrics and start the exporters of the
+    [LLM_METRICS] section (once per process). Returns llm_metrics.
+    """
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    if config.has_section("LLM_PRICES"):
+        for model, prices in config.items("LLM_PRICES"):
+            llm_metrics.prices[model] = tuple(float(price) for price in prices.split())
+
+    with _exporters_lock:
+        port = config.getint("LLM_METRICS", "port", fallback=0)
+        if port and "port" not in _exporters:
+            _exporters["port"] = llm_metrics.serve(
+                port, config.get("LLM_METRICS", "host", fallback="127.0.0.1"))
+
+        path = config.get("LLM_METRICS", "file", fallback="")
+        if path and "file" not in _exporters:
+            interval = config.getfloat("LLM_METRICS", "file_interval", fallback=15.0)
+            _exporters["file"] = _start_file_writer(path, interval)
+    return llm_metrics
+
+
+def _start_file_writer(path: str, interval: float) -> threading.Event:
+    stopped = threading.Event()
+
+    def write():
+        while not stopped.wait(interval):
+            try:
+                llm_metrics.write_prometheus(path)
+            except OSError as e:
+                logger.warning("Cannot write LLM metrics to %s: %s", path, e)
+
+    threading.Thread(target=write, name="llm-metrics-file", daemon=True).start()
+    # and once more on exit, so short runs leave a file too
+    atexit.register(llm_metrics.write_prometheus, path)
+    return stopped
@@ -0,0 +1,73 @@
+"""
+meeting_worker.py
+
+Background parsing for the Streamlit app (app.py).
+
+A MeetingWorker runs parse_meeting_stream on a small thread pool, so a
+Streamlit rerun never waits for the model. Each request gets a MeetingJob
+that the worker fills in as the stream arrives: `fields` holds the fields
+completed so far, then `meeting` (the validated CalendarMeeting) or
+`error` is set and `done` becomes True. The app polls the job from a
+fragment and renders whatever is there.
+
+Usage:
+    worker = MeetingWorker(client)
+    job = worker.submit("Lunch with Nora on Friday at noon")
+    job.snapshot()    # (fields, meeting, error, done)
+"""
+import concurrent.futures
+import logging
+import threading
+
+from calender_meeting_ai_agent import parse_meeting_stream
+
+logger = logging.getLogger(__name__)
+
+
+class MeetingJob:
+    """The state of one background parse, safe to read from the script thread."""
+
+    def __init__(self, user_input: str):
+        self.user_input = user_input
+        self._lock = threading.Lock()
+        self.fields = {}
+        self.meeting = None
+        self.error = None
+        self.done = False
+
+    def _update(self, fields: dict = None, meeting=None, error: str = None, done: bool = False):
+        with self._lock:
+            if fields is not None:
+                self.fields = fields
+            self.meeting = meeting if meeting is not None else self.meeting
+            self.error = error if error is not None else self.error
+            self.done = done or self.done
+
+    def snapshot(self) -> tuple:
+        with self._lock:
+            return dict(self.fields), self.meeting, self.error, self.done
+
+
+class MeetingWorker:
+    """Runs parse_meeting_stream for the app on a thread pool."""
+
+    def __init__(self, client, max_workers: int = 4):
+        self.client = client
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers, thread_name_prefix="meeting-parse")
+
+    def _run(self, job: MeetingJob):
+        try:
+            for fields, meeting in parse_meeting_stream(self.client, job.user_input):
+                job._update(fields=fields, meeting=meeting)
+            job._update(done=True)
+        except Exception as e:
+            logger.warning("Parsing the meeting failed: %s", e)
+            job._update(error=str(e), done=True)
+
+    def submit(self, user_input: str) -> MeetingJob:
+        job = MeetingJob(user_input)
+        self._pool.submit(self._run, job)
+        return job
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
@@ -0,0 +1,134 @@
+"""
+prompt_compiler.py
+
+Compiles the agents' system prompts once, at import time.
+
+Each prompt is split into a static prefix (instructions and the rendered
+schema block) and a volatile suffix (today's date, current database rows,
+...). The static prefix is rendered once and always sent first, the
+volatile suffix last, so consecutive requests share the longest possible
+prefix and the provider's prompt-prefix (context) caching can hit.
+
+Usage:
+    EXTRACTION_PROMPT = compile_prompt(
+        "event_extraction",
+        "Analyze if the text describes a calendar event.",
+        data_structure=EventExtractionModel,
+        volatile=DATE_CONTEXT)
+
+    messages = [
+        {"role": "system", "content": EXTRACTION_PROMPT.render(today=today())},
+        {"role": "user", "content": user_input},
+    ]
+
+prefix_report() lists the stable-prefix length of every compiled prompt.
+"""
+import json
+import math
+import textwrap
+from datetime import datetime
+
+data_model_descriptions = """
+Always return a JSON object using the following format:
+Below is the schema describing the fields.
+
+Schema:
+{schema_here}
+
+### INSTRUCTIONS
+- Use the `name` field as the key in the JSON output.
+- Generate a value according to its `description` and `data_type`.
+- Only include the keys (do not include `description`, `data_type`, or `required` in the output).
+- If `required` is false, return a null value for that key.
+- Your entire response must be a single valid JSON object, with no additional text, explanation, or Markdown formatting.
+
+### OUTPUT FORMAT (example)
+{{
+  "field1": <value>,
+  "field2": <value>,
+  ...
+}}
+
+"""
+
+# Volatile suffix used by every prompt that needs the current date
+DATE_CONTEXT = "Today's date is {today}."
+
+# All compiled prompts by name, for prefix_report()
+compiled_prompts = {}
+
+
+def today() -> str:
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+def schema_block(data_structure) -> str:
+    """The `data_model_descriptions` block for one of the data models."""
+    return data_model_descriptions.format(schema_here=json.dumps(data_structure, indent=2))
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count, about four characters per token."""
+    return math.ceil(len(text) / 4)
+
+
+class CompiledPrompt:
+    """A system prompt whose static prefix has been rendered once."""
+
+    def __init__(self, name: str, instructions: str, data_structure=None,
+                 appendix: str = None, volatile: str = ""):
+        self.name = name
+        self.instructions = textwrap.dedent(instructions).strip()
+        self.data_structure = data_structure
+        self.appendix = textwrap.dedent(appendix).strip() if appendix else None
+        self.volatile = textwrap.dedent(volatile).strip()
+        self.static = self._render_static(data_structure)
+
+    def _render_static(self, data_structure) -> str:
+        parts = [self.instructions]
+        if data_structure is not None:
+            parts.append(schema_block(data_structure).strip())
+        if self.appendix:
+            parts.append(self.appendix)
+        return "\n\n".join(parts) + "\n\n"
+
+    def render(self, data_structure=None, **volatile_values) -> str:
+        """
+        Full system prompt: the static prefix followed by the volatile suffix.
+        Passing a different `data_structure` than the compiled one renders
+        the schema block on the fly.
+        """
+        static = self.static
+        if data_structure is not None and data_structure is not self.data_structure:
+            static = self._render_static(data_structure)
+        return static + self.volatile.format(**volatile_values)
+
+    @property
+    def stable_prefix_chars(self) -> int:
+        return len(self.static)
+
+
+def compile_prompt(name: str, instructions: str, data_structure=None,
+                   appendix: str = None, volatile: str = "") -> CompiledPrompt:
+    """
+    Compile a system prompt and register it under `name`.
+    `appendix` is further static text placed after the schema block,
+    `volatile` a format template rendered per call and placed last.
+    """
+    prompt = CompiledPrompt(name, instructions, data_structure, appendix, volatile)
+    compiled_prompts[name] = prompt
+    return prompt
+
+
+def prefix_report() -> list:
+    """Stable-prefix length of every compiled prompt, largest first."""
+    report = [
+        {
+            "prompt": name,
+            "stable_prefix_chars": prompt.stable_prefix_chars,
+            "stable_prefix_tokens": estimate_tokens(prompt.static),
+            "has_volatile_suffix": bool(prompt.volatile),
+        }
+        for name, prompt in compiled_prompts.items()
+    ]
+    return sorted(report, key=lambda row: row["stable_prefix_chars"], reverse=True)
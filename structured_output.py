@@ -0,0 +1,325 @@
+"""
+structured_output.py
+
+Structured (JSON) model answers, shared by all agents.
+
+- Pydantic output models are validated with a TypeAdapter that is built
+  once per model and cached. The raw response text goes straight to
+  validate_json, without a json.loads / model(**data) detour.
+- The "answer in JSON with these fields" instruction is rendered once per
+  model and added to a copy of the messages. The caller's messages are
+  never changed, so a reused list does not collect the instruction again.
+- A response that does not validate is first repaired locally: code
+  fences and text around the object are stripped, trailing commas and
+  Python literals (True/None) are fixed, and values are coerced to the
+  field types ("0.9" or "90%" for a float such as confidence_score, "yes"
+  for a boolean, "a, b" for a list of strings). Only if that fails is the
+  model asked again (get_structured_response, agent_loop.run_agent).
+- The dict-based data models of the calendar agents get the same repair
+  and coercion through load_json.
+- pydantic is imported on the first validation, not with this module, so
+  agents that only use load_json never import it.
+
+How often answers validate directly, are repaired, or need a retry is
+counted per output model in `structured_metrics`.
+
+Usage:
+    weather = parse_structured(response_text, WeatherResponse)
+    result = load_json(response_text, EventExtractionModel)   # dict
+    weather, response = get_structured_response(client, messages, "deepseek-chat", tools, WeatherResponse)
+    structured_metrics.stats()
+"""
+import json
+import logging
+import re
+import threading
+import typing
+from collections import Counter
+from functools import lru_cache
+
+from tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# extra model calls get_structured_response makes for an answer that cannot be repaired
+DEFAULT_MAX_RETRIES = 1
+
+
+class StructuredOutputError(ValueError):
+    """A response that did not validate, even after local repair."""
+
+    def __init__(self, message: str, content: str = None):
+        super().__init__(message)
+        self.content = content
+
+
+# --------------------------------------------------------------
+# Metrics
+# --------------------------------------------------------------
+
+class StructuredOutputMetrics:
+    """Outcome counts per output model."""
+
+    OUTCOMES = ("valid", "repaired", "invalid", "retries", "retry_valid")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, name: str, outcome: str):
+        with self._lock:
+            self._counts.setdefault(name, Counter())[outcome] += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {}
+            for name, counts in self._counts.items():
+                needed_repair = counts["repaired"] + counts["invalid"]
+                stats[name] = {
+                    **{outcome: counts[outcome] for outcome in self.OUTCOMES},
+                    "repair_success_rate": round(counts["repaired"] / needed_repair, 4) if needed_repair else None,
+                    "retry_success_rate": (round(counts["retry_valid"] / counts["retries"], 4)
+                                           if counts["retries"] else None),
+                }
+            return stats
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+
+
+structured_metrics = StructuredOutputMetrics()
+
+
+# --------------------------------------------------------------
+# Local repair
+# --------------------------------------------------------------
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.S)
+_CLOSING = re.compile(r"\s*[}\]]")
+_WORD = re.compile(r"[^\W\d]\w*")
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+
+def repair_json(text: str) -> str:
+    """
+    The likely JSON inside a model response: without code fences or text
+    around the object, trailing commas or Python literals.
+    """
+    text = (text or "").strip()
+    fenced = _FENCE.search(text)
+    if fenced:
+        text = fenced.group(1).strip()
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        text = text[start:end + 1]
+
+    out, i, in_string = [], 0, False
+    while i < len(text):
+        char = text[i]
+        if in_string:
+            out.append(char)
+            if char == "\\" and i + 1 < len(text):
+                out.append(text[i + 1])
+                i += 1
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+            out.append(char)
+        elif char == ",":
+            if not _CLOSING.match(text, i + 1):
+                out.append(char)
+        elif char.isalpha():
+            word = _WORD.match(text, i).group(0)
+            out.append(_PYTHON_LITERALS.get(word, word))
+            i += len(word)
+            continue
+        else:
+            out.append(char)
+        i += 1
+    return "".join(out)
+
+
+def coerce_value(value, data_type: str):
+    """A value converted to a data_type of the data models, or unchanged if it does not convert."""
+    try:
+        if data_type == "float" and isinstance(value, str):
+            value = value.strip()
+            return float(value[:-1]) / 100 if value.endswith("%") else float(value)
+        if data_type == "int" and isinstance(value, (str, float)) and not isinstance(value, bool):
+            number = float(value)
+            return int(number) if number.is_integer() else value
+        if data_type == "boolean" and isinstance(value, str):
+            return {"true": True, "yes": True, "1": True, "false": False, "no": False, "0": False}.get(
+                value.strip().lower(), value)
+        if data_type == "string" and isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+        if data_type == "list[str]" and isinstance(value, str):
+            return [item.strip() for item in value.split(",") if item.strip()]
+    except ValueError:
+        pass
+    return value
+
+
+def coerce_fields(data, field_types: dict):
+    """Coerce the fields of a parsed object in place; field_types maps name -> data_type."""
+    if isinstance(data, dict):
+        for name, data_type in field_types.items():
+            if data.get(name) is not None:
+                data[name] = coerce_value(data[name], data_type)
+    return data
+
+
+_ANNOTATION_TYPES = {float: "float", int: "int", bool: "boolean", str: "string"}
+
+
+def _data_type(annotation):
+    if typing.get_origin(annotation) is list and typing.get_args(annotation) == (str,):
+        return "list[str]"
+    return _ANNOTATION_TYPES.get(annotation)
+
+
+# --------------------------------------------------------------
+# Cached per output model
+# --------------------------------------------------------------
+
+@lru_cache(maxsize=None)
+def type_adapter(output_type):
+    """The pydantic TypeAdapter of an output model, built once."""
+    from pydantic import TypeAdapter
+    return TypeAdapter(output_type)
+
+
+@lru_cache(maxsize=None)
+def _field_types(output_type) -> dict:
+    fields = getattr(output_type, "model_fields", {})
+    return {name: data_type for name, field in fields.items()
+            if (data_type := _data_type(field.annotation)) is not None}
+
+
+@lru_cache(maxsize=None)
+def response_instruction(output_type) -> str:
+    """The JSON instruction for an output model, rendered once."""
+    field_descriptions = {name: field.description for name, field in output_type.model_fields.items()}
+    return ("Ensure your final response is in valid JSON format with these exact fields:\n"
+            f"{field_descriptions}")
+
+
+def with_response_fields(messages: list, output_type) -> list:
+    """
+    A copy of the messages whose system prompt asks for JSON with the
+    fields of the output model. The caller's messages are not changed.
+    """
+    instruction = response_instruction(output_type)
+    copied = list(messages)
+    for i, message in enumerate(copied):
+        if isinstance(message, dict) and message.get("role") == "system":
+            copied[i] = {**message, "content": f"{message['content']}\n\n{instruction}"}
+            return copied
+    return [{"role": "system", "content": instruction}] + copied
+
+
+# --------------------------------------------------------------
+# Parsing
+# --------------------------------------------------------------
+
+@traced("json.parse_structured")
+def parse_structured(content, output_type):
+    """
+    Validate a response (str or bytes) against a pydantic output model.
+    Tries the raw text first, then a local repair.
+    Raises StructuredOutputError if neither validates.
+    """
+    from pydantic import ValidationError
+
+    name = getattr(output_type, "__name__", str(output_type))
+    adapter = type_adapter(output_type)
+    try:
+        value = adapter.validate_json(content or b"")
+        structured_metrics.record(name, "valid")
+        return value
+    except ValidationError as first_error:
+        error = first_error
+
+    text = content.decode() if isinstance(content, bytes) else (content or "")
+    try:
+        data = coerce_fields(json.loads(repair_json(text)), _field_types(output_type))
+        value = adapter.validate_python(data)
+        structured_metrics.record(name, "repaired")
+        logger.info("Repaired a %s response locally", name)
+        return value
+    except (json.JSONDecodeError, ValidationError) as e:
+        error = e
+    structured_metrics.record(name, "invalid")
+    raise StructuredOutputError(f"Failed to parse response as {name}: {error}", text)
+
+
+@traced("json.load_json")
+def load_json(content, data_structure: list = None, name: str = "json") -> dict:
+    """
+    json.loads for the dict-based data models: repairs the text if it is not
+    valid JSON and coerces the fields to their data_type. `name` is the key
+    of the outcome in structured_metrics.
+    Raises StructuredOutputError if the text cannot be repaired, or there
+    is none (a response without content).
+    """
+    if content is None:
+        structured_metrics.record(name, "invalid")
+        raise StructuredOutputError("Failed to parse response: the response has no content", content)
+    try:
+        data = json.loads(content)
+        outcome = "valid"
+    except json.JSONDecodeError:
+        text = content.decode() if isinstance(content, bytes) else content
+        try:
+            data = json.loads(repair_json(text))
+            outcome = "repaired"
+        except json.JSONDecodeError as e:
+            structured_metrics.record(name, "invalid")
+            raise StructuredOutputError(f"Failed to parse response: {e}", content)
+
+    if data_structure and isinstance(data, dict):
+        coerced = coerce_fields(dict(data), {field["name"]: field["data_type"] for field in data_structure})
+        if coerced != data:
+            outcome = "repaired"
+        data = coerced
+    structured_metrics.record(name, outcome)
+    return data
+
+
+def retry_message(error: Exception) -> dict:
+    """The user message that asks the model to answer again after an invalid response."""
+    return {"role": "user", "content": "Your last response was not valid JSON for the requested fields "
+                                       f"({str(error)[:300]}). Reply again with only the JSON object."}
+
+
+def get_structured_response(client_object, messages, model, tools, object_structure,
+                            max_retries: int = DEFAULT_MAX_RETRIES, **kwargs):
+    """
+    Ask for a structured response (for models such as deepseek-chat that do
+    not support the parse method) and validate it against object_structure.
+    A response that cannot be repaired locally is sent back with the
+    validation error, at most max_retries times.
+    Returns (validated object or None, the last completion).
+    """
+    name = object_structure.__name__
+    messages = with_response_fields(messages, object_structure)
+    request = {"model": model, "response_format": {"type": "json_object"}, **kwargs}
+    if tools:
+        request["tools"] = tools
+
+    for attempt in range(max_retries + 1):
+        if attempt:
+            structured_metrics.record(name, "retries")
+        response = client_object.chat.completions.create(messages=messages, **request)
+        content = response.choices[0].message.content
+        try:
+            value = parse_structured(content, object_structure)
+            if attempt:
+                structured_metrics.record(name, "retry_valid")
+            return value, response
+        except StructuredOutputError as e:
+            logger.warning("%s (attempt %s of %s)", e, attempt + 1, max_retries + 1)
+            messages = messages + [{"role": "assistant", "content": content or ""}, retry_message(e)]
+    return None, response
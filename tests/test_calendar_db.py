@@ -0,0 +1,53 @@
+"""Typed writes of calendar_db.py on a copy of calender.db."""
+import os
+import shutil
+
+import pytest
+
+import calendar_db
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "calender.db")
+    repo_root = os.path.dirname(os.path.abspath(calendar_db.__file__))
+    shutil.copy(os.path.join(repo_root, "calender.db"), path)
+    yield path
+    calendar_db.get_pool(path).close()
+
+
+@pytest.mark.parametrize("date, stored, start_ts", [
+    ("20250902T1400", "2025-09-02T14:00:00", 1756821600),
+    ("2025-W36-2", "2025-09-02T00:00:00", 1756771200),
+    ("2025-09-02 14:00", "2025-09-02T14:00:00", 1756821600),
+    ("2025-09-02T14:00:00+02:00", "2025-09-02T14:00:00+02:00", 1756814400),
+])
+def test_insert_event_normalizes_date(db_path, date, stored, start_ts):
+    event_id = calendar_db.insert_event({"name_of_event": "Review", "date": date, "duration": 30,
+                                         "participants": ["Alice"]}, db_path)
+    rows = calendar_db.fetch_all("SELECT date, start_ts, end_ts FROM calender_events WHERE id = ?",
+                                 (event_id,), db_path)
+    assert [tuple(row) for row in rows] == [(stored, start_ts, start_ts + 1800)]
+
+
+def test_insert_event_rejects_invalid_date(db_path):
+    with pytest.raises(ValueError):
+        calendar_db.insert_event({"name_of_event": "Review", "date": "next Tuesday", "duration": 30}, db_path)
+
+
+def test_find_candidate_events(db_path, monkeypatch):
+    monkeypatch.setattr(calendar_db, "MAX_RANKED_MATCHES", 2)
+    for day, name in enumerate(("Budget review", "Budget planning", "Budget sync"), start=1):
+        calendar_db.insert_event({"name_of_event": name, "date": f"2030-01-0{day}T10:00",
+                                  "duration": 30, "participants": ["Zoe"]}, db_path)
+
+    def names(rows):
+        return {row[1] for row in rows}
+
+    # a window with no more than MAX_RANKED_MATCHES events is ranked whole
+    rows = calendar_db.find_candidate_events("budget review", window=("2030-01-01", "2030-01-03"), path=db_path)
+    assert rows[0][1] == "Budget review" and names(rows) == {"Budget review", "Budget planning"}
+    assert calendar_db.find_candidate_events("budget review", window=("2031-01-01", "2032-01-01"),
+                                             path=db_path) == []
+    # otherwise only the most recently added matches are ranked
+    assert names(calendar_db.find_candidate_events("budget zoe", path=db_path)) == {"Budget planning", "Budget sync"}
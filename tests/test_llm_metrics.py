@@ -0,0 +1,41 @@
+"""Recording of chat completions by MetricsClient."""
+import asyncio
+
+import pytest
+
+pytest.importorskip("openai")
+
+import calender_meeting_ai_agent as meeting_agent
+from benchmarks.fake_llm import AsyncFakeClient, FakeClient, LatencyModel
+from llm_metrics import LLMMetrics, MetricsClient, stage
+
+REQUEST = {"model": "deepseek-chat", "messages": [{"role": "user", "content": "Hello"}]}
+
+
+def test_cancelled_completion_is_recorded():
+    metrics = LLMMetrics()
+    client = MetricsClient(AsyncFakeClient(LatencyModel(base_s=5.0, jitter=0.0)), metrics)
+
+    async def cancel_one():
+        task = asyncio.create_task(client.chat.completions.create(**REQUEST))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    with stage("test.cancel"):
+        asyncio.run(cancel_one())
+    series = metrics.snapshot()["completions"]["test.cancel"]["deepseek-chat"]
+    assert (series["requests"], series["errors"], series["cancelled"]) == (1, 0, 1)
+    assert "llm_cancelled_total" in metrics.prometheus_text()
+
+
+def test_meeting_stream_usage_is_recorded():
+    metrics = LLMMetrics()
+    latency = LatencyModel(base_s=0.0, per_prompt_token_s=0.0, per_completion_token_s=0.0, jitter=0.0)
+    client = MetricsClient(FakeClient(latency), metrics)
+    list(meeting_agent.parse_meeting_stream(
+        client, "Let's schedule a 1h team meeting next Tuesday at 2pm with Said and Arthur."))
+    series = metrics.snapshot()["completions"]["meeting.parse_meeting"]["deepseek-chat"]
+    assert series["requests"] == 1
+    assert series["prompt_tokens"] > 0 and series["completion_tokens"] > 0
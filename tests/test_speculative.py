@@ -0,0 +1,67 @@
+"""
+Speculative routing over real HTTP: the async client keeps its connections
+between requests, so they must all run on the same event loop.
+"""
+import asyncio
+import logging
+import os
+import shutil
+
+import pytest
+
+openai = pytest.importorskip("openai")
+
+import calendar_adjustment_aiagent as adjustment_agent
+import calendar_db
+import llm_client
+from benchmarks.fake_llm import FakeClient, LatencyModel
+from benchmarks.mock_llm_server import MockLLMServer
+
+REQUESTS = [
+    "Let's schedule a team lunch next Tuesday at 2pm with Nada and Sana",
+    "Let's schedule a 1h review next Friday at 10am with Said and Arthur",
+]
+NO_LATENCY = LatencyModel(base_s=0.0, per_prompt_token_s=0.0, per_completion_token_s=0.0, jitter=0.0)
+
+
+@pytest.fixture
+def calendar(tmp_path, monkeypatch):
+    monkeypatch.setattr(calendar_db, "DB_FILE", str(tmp_path / "calender.db"))
+    repo_root = os.path.dirname(os.path.abspath(calendar_db.__file__))
+    shutil.copy(os.path.join(repo_root, "calender.db"), calendar_db.DB_FILE)
+    yield
+    calendar_db.get_pool().close()
+
+
+@pytest.fixture
+def clients(monkeypatch):
+    # fresh shared clients, restored after the test
+    monkeypatch.setattr(llm_client, "_shared_clients", {})
+    monkeypatch.setattr(llm_client, "_loop_clients", llm_client.weakref.WeakKeyDictionary())
+    logging.disable(logging.WARNING)
+    yield
+    logging.disable(logging.NOTSET)
+
+
+def test_two_speculative_requests_in_a_row(calendar, clients):
+    with MockLLMServer(NO_LATENCY) as server:
+        async_client = openai.AsyncOpenAI(base_url=server.url, api_key="mock", max_retries=0,
+                                          http_client=openai.DefaultAsyncHttpxClient(trust_env=False))
+        llm_client.set_client(FakeClient(NO_LATENCY), async_client)
+        for request in REQUESTS:
+            adjustment_agent.process_calendar_request(request, speculative=True)
+        metrics = list(adjustment_agent.speculation_metrics)[-len(REQUESTS):]
+        assert [m["chosen_branch"] for m in metrics] == ["create", "create"]
+        assert [m["failed_branches"] for m in metrics] == [[], []]
+        assert server.errors == {}
+
+
+def test_async_client_per_event_loop(clients, monkeypatch):
+    monkeypatch.setenv("LLM_API_KEY", "mock")
+
+    async def current_client():
+        return llm_client.get_async_client()
+
+    first, again = asyncio.run(current_client()), asyncio.run(current_client())
+    assert first is not again
+    assert llm_client.run_async(current_client()) is llm_client.run_async(current_client())
@@ -0,0 +1,27 @@
+"""Local repair of model responses in structured_output.py."""
+import pytest
+
+from structured_output import StructuredOutputError, load_json, repair_json
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('{"ok": True, "value": None,}', '{"ok": true, "value": null}'),
+    ('```json\n{"a": [1, 2,]}\n```', '{"a": [1, 2]}'),
+    ('{"name": Müller}', '{"name": Müller}'),
+    ('{"a": é}', '{"a": é}'),
+    ('{"a": Noneé}', '{"a": Noneé}'),
+])
+def test_repair_json(text, expected):
+    assert repair_json(text) == expected
+
+
+@pytest.mark.parametrize("content", ['{"name": Müller}', '{"a": é}', None])
+def test_load_json_rejects_unrepairable(content):
+    with pytest.raises(StructuredOutputError):
+        load_json(content)
+
+
+def test_load_json_repairs_and_coerces():
+    data = load_json('Sure: {"confidence_score": "0.9", "done": True,}',
+                     [{"name": "confidence_score", "data_type": "float"}])
+    assert data == {"confidence_score": 0.9, "done": True}
@@ -0,0 +1,61 @@
+"""Concurrent tool calls of tool_executor.py."""
+import json
+import threading
+import time
+
+from tool_executor import ToolExecutor
+
+
+def _call(call_id: str, name: str, **arguments) -> dict:
+    return {"id": call_id, "type": "function", "function": {"name": name, "arguments": json.dumps(arguments)}}
+
+
+def _results(messages: list) -> dict:
+    return {message["tool_call_id"]: json.loads(message["content"]) for message in messages}
+
+
+def test_batch_with_wrong_number_of_results():
+    executor = ToolExecutor({"echo": lambda value: value},
+                            batchers={"echo": lambda calls: [call["value"] for call in calls][:1]})
+    results = _results(executor.run([_call("a", "echo", value=1), _call("b", "echo", value=2)]))
+    assert set(results) == {"a", "b"}
+    assert all("returned 1 results for 2 calls" in result["error"] for result in results.values())
+    assert executor.stats()["failed"] == 1
+
+
+def test_batch_results_in_call_order():
+    executor = ToolExecutor({"echo": lambda value: value},
+                            batchers={"echo": lambda calls: [call["value"] * 10 for call in calls]})
+    results = _results(executor.run([_call("a", "echo", value=1), _call("b", "echo", value=2)]))
+    assert results == {"a": 10, "b": 20}
+
+
+def test_pool_replaced_while_other_threads_submit():
+    # hung calls make run() replace the pool while other threads are submitting to it
+    executor = ToolExecutor({"slow": lambda: time.sleep(0.05)}, default_timeout=0.01,
+                            max_workers=2, max_hung_workers=1000)
+    errors = []
+
+    def turns():
+        try:
+            for _ in range(50):
+                executor.run([_call(call_id, "slow") for call_id in "abcd"])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=turns) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    executor.shutdown()
+    assert errors == []
+    assert executor.stats()["replaced_pools"] > 0
+
+
+def test_timeout_from_function():
+    executor = ToolExecutor({"slow": lambda: time.sleep(0.2)}, timeouts={"slow": lambda: 0.05})
+    assert executor.timeout_for("slow") == 0.05
+    results = _results(executor.run([_call("a", "slow")]))
+    assert "timed out after 0.05s" in results["a"]["error"]
+    executor.shutdown()
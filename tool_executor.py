@@ -0,0 +1,311 @@
+"""
+tool_executor.py
+
+Runs the tool calls of one model turn concurrently, shared by the agents.
+
+The calls of a turn run in parallel on a thread pool (run), or as asyncio
+tasks for async tool functions with sync ones moved to threads (run_async),
+so a turn costs the slowest tool instead of the sum of all of them. Every
+call has a timeout (per tool name, or the default). A call that times out,
+raises or names an unknown tool gets an {"error": ...} result instead of
+failing the turn. Results come back as tool messages in the order of the
+tool calls.
+
+A call that was still waiting for a free worker when its timeout passed is
+dropped and reported as a queue timeout. A call that started and timed out
+cannot be stopped and keeps its worker until it returns. When half the
+workers of the pool are held by such calls, run() moves to a fresh pool
+and the old one lets its threads exit as their calls return. At most
+max_hung_workers threads are left behind that way; past that, calls wait
+in the queue of the current pool.
+
+Several calls to the same tool in one turn can be merged into one call of
+a batch function (for example all get_weather calls into one batched fetch).
+
+respond() appends the assistant message once, followed by one tool message
+per call, which is what the API expects.
+
+Every call (or merged batch) is recorded in llm_metrics under the current
+stage, with its latency and whether it failed or timed out, and runs in a
+"tool.<name>" tracing span.
+
+Usage:
+    executor = ToolExecutor({"get_weather": get_weather}, timeouts={"get_weather": 15})
+    executor.respond(messages, completion.choices[0].message)
+"""
+import concurrent.futures
+import contextvars
+import json
+import logging
+import threading
+import time
+
+from llm_metrics import current_stage, llm_metrics
+from tracing import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 30.0
+
+
+class QueueTimeout(TimeoutError):
+    """A call that never started because every worker was busy until its timeout."""
+
+
+def _call_field(tool_call, *path):
+    value = tool_call
+    for name in path:
+        value = value[name] if isinstance(value, dict) else getattr(value, name)
+    return value
+
+
+def _in_span(name: str, call):
+    with span(name):
+        return call()
+
+
+class ToolExecutor:
+    """Concurrent tool calls with per-tool timeouts and results in tool call order."""
+
+    def __init__(self, functions: dict, timeouts: dict = None, default_timeout: float = DEFAULT_TIMEOUT,
+                 batchers: dict = None, max_workers: int = 8, max_hung_workers: int = None):
+        """
+        functions: tool name -> function called with the call's arguments.
+        timeouts: tool name -> seconds, or a function returning them (called
+            when the tool runs); other tools get default_timeout.
+        batchers: tool name -> function taking a list of argument dicts and
+            returning one result per dict, used when a turn calls that tool
+            more than once.
+        max_hung_workers: threads still running timed out calls that run()
+            may leave behind when it replaces the pool (max_workers by default).
+        """
+        self.functions = functions
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self.batchers = batchers or {}
+        self.max_workers = max_workers
+        self.max_hung_workers = max_workers if max_hung_workers is None else max_hung_workers
+
+        self._pool = None
+        self._pool_hung = 0  # workers of the current pool held by timed out calls
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.timed_out = 0
+        self.queue_timeouts = 0
+        self.failed = 0
+        self.hung = 0  # workers of any pool held by timed out calls
+        self.replaced_pools = 0
+
+    def _submit(self, fn, *args) -> tuple:
+        """Submit to the current pool; returns (pool, future)."""
+        # under the lock, so _hang cannot shut the pool down before the submit
+        with self._lock:
+            if self._pool is None:
+                self._pool = concurrent.futures.ThreadPoolExecutor(self.max_workers,
+                                                                   thread_name_prefix="tool-call")
+            return self._pool, self._pool.submit(fn, *args)
+
+    def timeout_for(self, name: str) -> float:
+        timeout = self.timeouts.get(name, self.default_timeout)
+        return timeout() if callable(timeout) else timeout
+
+    def _hang(self, pool, future):
+        """Count the worker of a timed out call as hung until the call returns."""
+        with self._lock:
+            self.hung += 1
+            if pool is self._pool:
+                self._pool_hung += 1
+                if self._pool_hung * 2 >= self.max_workers and self.hung <= self.max_hung_workers:
+                    logger.warning("%d of %d tool workers are hung, starting a new pool",
+                                   self._pool_hung, self.max_workers)
+                    pool.shutdown(wait=False)
+                    self._pool, self._pool_hung = None, 0
+                    self.replaced_pools += 1
+        future.add_done_callback(lambda _: self._unhang(pool))
+
+    def _unhang(self, pool):
+        with self._lock:
+            self.hung -= 1
+            if pool is self._pool:
+                self._pool_hung -= 1
+
+    # planning
+
+    def _plan(self, tool_calls) -> list:
+        """
+        Group the calls into jobs: (name, function, args, ids, batched).
+        A job answers one call, or all calls of a batched tool.
+        """
+        jobs, parsed, errors = [], [], {}
+        for tool_call in tool_calls:
+            call_id = _call_field(tool_call, "id")
+            name = _call_field(tool_call, "function", "name")
+            try:
+                args = json.loads(_call_field(tool_call, "function", "arguments") or "{}")
+            except json.JSONDecodeError as e:
+                errors[call_id] = {"error": f"invalid arguments for {name}: {e}"}
+                continue
+            if name not in self.functions:
+                errors[call_id] = {"error": f"unknown tool {name}"}
+                continue
+            parsed.append((call_id, name, args))
+
+        batched_names = {name for _, name, _ in parsed if name in self.batchers}
+        for name in batched_names:
+            calls = [(call_id, args) for call_id, call_name, args in parsed if call_name == name]
+            if len(calls) > 1:
+                jobs.append((name, self.batchers[name], [args for _, args in calls],
+                             [call_id for call_id, _ in calls], True))
+        batched_ids = {call_id for job in jobs for call_id in job[3]}
+        for call_id, name, args in parsed:
+            if call_id not in batched_ids:
+                jobs.append((name, self.functions[name], args, [call_id], False))
+        return jobs, errors
+
+    def _record(self, name: str, ids: list, outcome, results: dict, seconds: float):
+        """Spread a job's result (or exception) over its call ids."""
+        status = "ok"
+        if isinstance(outcome, QueueTimeout):
+            status = "timeout"
+            with self._lock:
+                self.queue_timeouts += 1
+            logger.warning("Tool %s did not start within %ss, all workers were busy", name, self.timeout_for(name))
+            outcome = {"error": f"{name} queue timeout: no free worker within {self.timeout_for(name)}s"}
+        elif isinstance(outcome, (TimeoutError, concurrent.futures.TimeoutError)):
+            status = "timeout"
+            with self._lock:
+                self.timed_out += 1
+            logger.warning("Tool %s timed out after %ss", name, self.timeout_for(name))
+            outcome = {"error": f"{name} timed out after {self.timeout_for(name)}s"}
+        elif isinstance(outcome, Exception):
+            status = "error"
+            with self._lock:
+                self.failed += 1
+            logger.warning("Tool %s failed: %s", name, outcome)
+            outcome = {"error": f"{name} failed: {outcome}"}
+        elif len(ids) > 1 and (not isinstance(outcome, (list, tuple)) or len(outcome) != len(ids)):
+            # a batch must return one result per call, in call order
+            status = "error"
+            with self._lock:
+                self.failed += 1
+            count = len(outcome) if isinstance(outcome, (list, tuple)) else type(outcome).__name__
+            logger.warning("Batch %s returned %s results for %d calls", name, count, len(ids))
+            outcome = {"error": f"{name} failed: the batch returned {count} results for {len(ids)} calls"}
+        llm_metrics.observe_tool(current_stage(), name, seconds, status)
+        if status == "ok" and len(ids) > 1:
+            for call_id, result in zip(ids, outcome):
+                results[call_id] = result
+            return
+        for call_id in ids:
+            results[call_id] = outcome
+
+    @staticmethod
+    def _messages(tool_calls, results: dict) -> list:
+        return [
+            {
+                "role": "tool",
+                "content": json.dumps(results[_call_field(tool_call, "id")], default=str),
+                "tool_call_id": _call_field(tool_call, "id"),  # Critical: Match the original call
+            }
+            for tool_call in tool_calls
+        ]
+
+    # running
+
+    def run(self, tool_calls) -> list:
+        """Run the calls on the thread pool; returns their tool messages in call order."""
+        tool_calls = list(tool_calls or [])
+        jobs, results = self._plan(tool_calls)
+        with self._lock:
+            self.calls += len(tool_calls)
+
+        start = time.monotonic()
+        pools, futures, finished = [], [], {}
+        for i, (name, function, args, ids, batched) in enumerate(jobs):
+            # each call runs in a copy of the caller's context (request ids, tracing spans)
+            context = contextvars.copy_context()
+            call = (lambda f=function, a=args: f(a)) if batched else (lambda f=function, a=args: f(**a))
+            pool, future = self._submit(context.run, _in_span, f"tool.{name}", call)
+            pools.append(pool)
+            futures.append(future)
+            futures[-1].add_done_callback(lambda _, i=i: finished.setdefault(i, time.monotonic()))
+
+        for i, ((name, _, _, ids, _), pool, future) in enumerate(zip(jobs, pools, futures)):
+            remaining = max(0.0, start + self.timeout_for(name) - time.monotonic())
+            try:
+                outcome = future.result(timeout=remaining)
+            except concurrent.futures.TimeoutError as e:
+                if future.cancel():  # still queued: it never runs
+                    outcome = QueueTimeout(f"{name} never started")
+                else:
+                    # a timed out call keeps its worker thread until it returns
+                    outcome = e
+                    self._hang(pool, future)
+            except Exception as e:
+                outcome = e
+            self._record(name, ids, outcome, results, finished.get(i, time.monotonic()) - start)
+        return self._messages(tool_calls, results)
+
+    async def run_async(self, tool_calls) -> list:
+        """Run the calls as asyncio tasks (sync tools in threads); returns tool messages in call order."""
+        # imported here so that importing the agents does not pay for asyncio
+        import asyncio
+        import inspect
+
+        tool_calls = list(tool_calls or [])
+        jobs, results = self._plan(tool_calls)
+        with self._lock:
+            self.calls += len(tool_calls)
+
+        durations = {}
+
+        async def _run(i, name, function, args, batched):
+            started = time.monotonic()
+            try:
+                with span(f"tool.{name}"):
+                    return await _call(name, function, args, batched)
+            finally:
+                durations[i] = time.monotonic() - started
+
+        async def _call(name, function, args, batched):
+            if inspect.iscoroutinefunction(function):
+                call = function(args) if batched else function(**args)
+            else:
+                call = asyncio.to_thread(function, args) if batched else asyncio.to_thread(function, **args)
+            try:
+                return await asyncio.wait_for(call, self.timeout_for(name))
+            except asyncio.TimeoutError as e:
+                # not the builtin TimeoutError before Python 3.11
+                raise TimeoutError(f"{name} timed out") from e
+
+        outcomes = await asyncio.gather(
+            *(_run(i, name, function, args, batched) for i, (name, function, args, _, batched) in enumerate(jobs)),
+            return_exceptions=True)
+        for i, ((name, _, _, ids, _), outcome) in enumerate(zip(jobs, outcomes)):
+            self._record(name, ids, outcome, results, durations.get(i, 0.0))
+        return self._messages(tool_calls, results)
+
+    def respond(self, messages: list, assistant_message) -> list:
+        """
+        Append the assistant message once, run its tool calls and append one
+        tool message per call. Returns `messages`.
+        """
+        messages.append(assistant_message)
+        messages.extend(self.run(_call_field(assistant_message, "tool_calls")))
+        return messages
+
+    async def respond_async(self, messages: list, assistant_message) -> list:
+        messages.append(assistant_message)
+        messages.extend(await self.run_async(_call_field(assistant_message, "tool_calls")))
+        return messages
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"calls": self.calls, "timed_out": self.timed_out, "queue_timeouts": self.queue_timeouts,
+                    "failed": self.failed, "hung_workers": self.hung, "replaced_pools": self.replaced_pools}
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
@@ -0,0 +1,306 @@
+"""
+tracing.py
+
+Span-based tracing for the agents, to see where the time of one slow
+request went: routing, extraction, the model calls, tool calls, the
+SQLite work or the JSON parsing.
+
+Work is timed with `span(...)` (a context manager) or `@traced(...)` (a
+decorator for sync and async functions). A span opened outside any other
+span starts a request and gets a new request id; everything timed inside
+it becomes its child and shares the id. The current span lives in a
+contextvar, so the tree and the request id follow the work into asyncio
+tasks and the ToolExecutor's threads. The llm_metrics stages are spans too, as are the
+model calls of MetricsClient and every tool call.
+
+Tracing is off by default. Then span() returns a shared no-op object and
+@traced calls the function straight away, so the instrumented code pays a
+flag check and nothing else.
+
+Finished spans are kept in memory (the newest max_spans) and can be
+exported as Chrome trace-event JSON, which chrome://tracing or
+https://ui.perfetto.dev show as a flame chart, one lane per thread (or
+asyncio task).
+
+Usage:
+    tracer.enable()
+    with span("adjustment.process_calendar_request") as request:
+        process_calendar_request(text)
+    tracer.export_chrome("trace.json", request_id=request.request_id)
+
+    @traced("sqlite.insert_event")
+    def insert_event(...): ...
+
+Configured in config.ini (all optional):
+    [TRACING]
+    enabled = false
+    max_spans = 100000
+    file = trace.json        ; all kept spans are written there on exit
+"""
+import atexit
+import configparser
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_SPANS = 100_000
+
+_current_span = contextvars.ContextVar("trace_span", default=None)
+_span_ids = itertools.count(1)
+
+
+def current_span():
+    """The innermost open span, or None."""
+    return _current_span.get()
+
+
+def new_request_id() -> str:
+    return os.urandom(8).hex()
+
+
+def current_request_id():
+    """The id of the request being traced, or None."""
+    active = _current_span.get()
+    return active.request_id if active is not None else None
+
+
+_thread_lane = threading.local()
+
+
+def _lane() -> tuple:
+    """
+    The trace lane of the caller, (tid, name): its asyncio task if one is
+    running, else its thread. Task and thread ids are reused, so the name
+    is kept with each span rather than in a table by id.
+    """
+    asyncio = sys.modules.get("asyncio")
+    if asyncio is not None:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass  # no event loop running in this thread
+        else:
+            task = asyncio.current_task()
+            if task is not None:
+                return id(task), f"task {task.get_name()}"
+    lane = getattr(_thread_lane, "lane", None)
+    if lane is None:
+        lane = _thread_lane.lane = (threading.get_ident(), threading.current_thread().name)
+    return lane
+
+
+class Span:
+    """A timed unit of work; use it as a context manager, or start() and finish() it by hand."""
+
+    __slots__ = ("name", "attributes", "request_id", "span_id", "parent_id",
+                 "start_ns", "end_ns", "tid", "lane", "_token")
+
+    def __init__(self, name: str, attributes: dict = None, request_id: str = None):
+        self.name = name
+        self.attributes = attributes  # None until there are some
+        self.request_id = request_id
+        self.span_id = None
+        self.parent_id = None
+        self.start_ns = None
+        self.end_ns = None
+        self.tid = None
+        self.lane = None  # the name of the task or thread it ran in
+        self._token = None
+
+    def start(self):
+        parent = _current_span.get()
+        if parent is not None:
+            self.parent_id = parent.span_id
+            self.request_id = self.request_id or parent.request_id
+        self.request_id = self.request_id or new_request_id()
+        self.span_id = next(_span_ids)
+        self.tid, self.lane = _lane()
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def finish(self):
+        self.end_ns = time.perf_counter_ns()
+        tracer._finished(self)
+
+    def set(self, **attributes):
+        """Add attributes (shown as args in the trace)."""
+        if self.attributes is None:
+            self.attributes = {}
+        self.attributes.update(attributes)
+        return self
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6 if self.end_ns is not None else None
+
+    def __enter__(self):
+        self.start()
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        _current_span.reset(self._token)
+        if exc_type is not None:
+            self.set(error=f"{exc_type.__name__}: {exc}")
+        self.finish()
+        return False
+
+    def __repr__(self):
+        return f"Span({self.name!r}, request_id={self.request_id!r}, duration_ms={self.duration_ms})"
+
+
+class _NoopSpan:
+    """What span() returns while tracing is off."""
+
+    request_id = None
+    span_id = None
+    duration_ms = None
+
+    def start(self):
+        return self
+
+    def finish(self):
+        pass
+
+    def set(self, **attributes):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer:
+    """Keeps the newest finished spans and exports them."""
+
+    def __init__(self, max_spans: int = DEFAULT_MAX_SPANS, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._spans = deque(maxlen=max_spans)
+        self._origin_ns = time.perf_counter_ns()
+
+    def enable(self, max_spans: int = None):
+        with self._lock:
+            if max_spans is not None and max_spans != self._spans.maxlen:
+                self._spans = deque(self._spans, maxlen=max_spans)
+            self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+    def _finished(self, finished: Span):
+        with self._lock:
+            self._spans.append(finished)
+
+    def spans(self, request_id: str = None) -> list:
+        """The kept spans (of one request), in the order they finished."""
+        with self._lock:
+            return [s for s in self._spans if request_id is None or s.request_id == request_id]
+
+    def requests(self) -> dict:
+        """request id -> duration in ms of its root span, slowest first."""
+        roots = {s.request_id: s.duration_ms for s in self.spans() if s.parent_id is None}
+        return dict(sorted(roots.items(), key=lambda item: item[1], reverse=True))
+
+    def chrome_trace(self, request_id: str = None) -> dict:
+        """The spans as Chrome trace-event JSON ("X" complete events, timestamps in microseconds)."""
+        pid = os.getpid()
+        events, lanes = [], {}
+        for s in self.spans(request_id):
+            lanes.setdefault(s.tid, s.lane)
+            events.append({
+                "name": s.name,
+                "cat": s.name.split(".")[0],
+                "ph": "X",
+                "ts": (s.start_ns - self._origin_ns) / 1000,
+                "dur": (s.end_ns - s.start_ns) / 1000,
+                "pid": pid,
+                "tid": s.tid,
+                "args": {"request_id": s.request_id, "span_id": s.span_id, "parent_id": s.parent_id,
+                         **{key: _jsonable(value) for key, value in (s.attributes or {}).items()}},
+            })
+        events.sort(key=lambda event: event["ts"])
+        names = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": lane}}
+                 for tid, lane in sorted(lanes.items())]
+        return {"traceEvents": names + events, "displayTimeUnit": "ms"}
+
+    def export_chrome(self, path: str, request_id: str = None):
+        """Write chrome_trace() to a file for chrome://tracing or Perfetto."""
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(request_id), f)
+
+
+def _jsonable(value):
+    return value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+
+
+tracer = Tracer()
+
+
+# --------------------------------------------------------------
+# API
+# --------------------------------------------------------------
+
+def span(name: str, request_id: str = None, **attributes):
+    """
+    A child span of the current one, to use with `with`. Outside any span it
+    starts a new request, with a new id or the given one. A no-op while
+    tracing is off.
+    """
+    if not tracer.enabled:
+        return NOOP_SPAN
+    return Span(name, attributes or None, request_id)
+
+
+def traced(name: str = None):
+    """Decorator: run each call of the function in a span (named after the function by default)."""
+    def decorator(function):
+        span_name = name or function.__qualname__
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def wrapper(*args, **kwargs):
+                if not tracer.enabled:
+                    return await function(*args, **kwargs)
+                with Span(span_name):
+                    return await function(*args, **kwargs)
+        else:
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                if not tracer.enabled:
+                    return function(*args, **kwargs)
+                with Span(span_name):
+                    return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def configure_tracing(config_file: str = "config.ini") -> Tracer:
+    """Enable the tracer from the optional [TRACING] section of config.ini. Returns the tracer."""
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    if config.getboolean("TRACING", "enabled", fallback=False):
+        tracer.enable(config.getint("TRACING", "max_spans", fallback=DEFAULT_MAX_SPANS))
+        path = config.get("TRACING", "file", fallback="")
+        if path:
+            atexit.register(tracer.export_chrome, path)
+            logger.info("Tracing enabled, writing %s on exit", path)
+    return tracer
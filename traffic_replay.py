@@ -0,0 +1,478 @@
+"""
+traffic_replay.py
+
+Record the traffic of the agents with the model API and the weather API,
+and replay it later without them, to rerun real traffic deterministically.
+
+In record mode every `chat.completions.create` call of the shared clients
+(streams chunk by chunk) and every HTTP exchange of the weather client is
+appended to a traffic log with its timing. In replay mode the log answers
+them instead: each request gets the next recorded response for the same
+request, either after the recorded time (timing = original) or straight
+away (timing = fast). So a run replayed fast takes as long as our own code,
+and the difference to the same run replayed with the original timings is
+the time spent waiting for upstream.
+
+The log is JSON Lines, one compact record per exchange, only ever appended
+to; with a .gz file name it is gzip-compressed. Records look like
+    {"kind": "llm", "key": ..., "at": ..., "seconds": 0.81, "request": {...}, "response": {...}}
+    {"kind": "llm", ..., "chunks": [[0.42, {...}], [0.43, {...}], ...]}     (a stream)
+    {"kind": "http", "key": "GET https://...", ..., "response": {"status": 200, "headers": {...}, "body": "..."}}
+    {..., "error": {"type": "ReadTimeout", "module": "requests.exceptions", "message": ..., "status": null}}
+Requests are matched on a hash of the request (like llm_cache.py's key),
+with the "Today's date is ..." of the prompts left out, so traffic recorded
+on another day still matches. Identical requests get the recorded responses
+in order, the last one again once they run out. A request that was never
+recorded raises ReplayMissError (or goes to the fallback client). A
+recorded HTTP failure is raised again as the same requests exception (a
+ReadTimeout stays a ReadTimeout); a recorded model API failure is raised
+as RecordedError, with the original type and status.
+
+The recorder sits right on the API client, below the response cache and
+the metrics layer (see llm_client.py), so the log holds only the calls
+that reached the API; cache hits are not recorded, and their recorded
+time is not counted as upstream time. In replay mode the log takes the
+place of the API client under the same cache, so replay with the cache
+configured as it was when recording.
+
+Usage:
+    client = RecordingClient(OpenAI(...), TrafficLog("traffic.jsonl.gz"))
+    client = ReplayClient(TrafficLog("traffic.jsonl.gz", timing="fast"))
+    configure_session(requests.Session(), mode="replay", log=log)
+
+    python traffic_replay.py traffic.jsonl.gz      ; what a log holds
+
+Configured in config.ini (all optional):
+    [TRAFFIC]
+    mode = off                  ; off, record or replay
+    file = traffic.jsonl.gz
+    timing = original           ; replay with the recorded timings, or fast
+"""
+import configparser
+import gzip
+import hashlib
+import json
+import logging
+import re
+import sys
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+
+from llm_client import ClientWrapper, to_plain
+
+logger = logging.getLogger(__name__)
+
+MODES = ("off", "record", "replay")
+TIMINGS = ("original", "fast")
+
+_prompt_date_pattern = re.compile(r"Today's date is \d{4}-\d{2}-\d{2}")
+
+
+class ReplayMissError(LookupError):
+    """The request is not in the traffic log."""
+
+
+class RecordedError(RuntimeError):
+    """A replayed call that failed when it was recorded."""
+
+    def __init__(self, error: dict):
+        super().__init__(f"{error.get('type')}: {error.get('message')}")
+        self.type = error.get("type")
+        self.status_code = error.get("status")
+
+
+def request_key(request: dict) -> str:
+    """Hash of the request, without the date of the prompts."""
+    material = json.dumps(to_plain(request), sort_keys=True, default=str, separators=(",", ":"))
+    material = _prompt_date_pattern.sub("Today's date is <date>", material)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _error(e: Exception) -> dict:
+    return {"type": type(e).__name__, "module": type(e).__module__, "message": str(e),
+            "status": getattr(e, "status_code", None)}
+
+
+# --------------------------------------------------------------
+# The log
+# --------------------------------------------------------------
+
+class TrafficLog:
+    """Append-only JSON Lines file of recorded exchanges, and the index to replay them."""
+
+    def __init__(self, path: str, timing: str = "original"):
+        if timing not in TIMINGS:
+            raise ValueError(f"timing must be one of {TIMINGS}, not {timing!r}")
+        self.path = path
+        self.timing = timing
+        self._lock = threading.Lock()
+        self._file = None
+        self._index = None  # (kind, key) -> deque of records, loaded on the first lookup
+        self._last = {}     # (kind, key) -> the last record handed out
+        self.recorded = 0
+        self.replayed = 0
+        self.repeated = 0
+        self.misses = 0
+
+    def _open(self, mode: str):
+        if self.path.endswith(".gz"):
+            return gzip.open(self.path, mode + "t", encoding="utf-8")
+        return open(self.path, mode, encoding="utf-8")
+
+    def append(self, record: dict):
+        line = json.dumps(record, separators=(",", ":"), default=str)
+        with self._lock:
+            if self._file is None:
+                self._file = self._open("a")
+            self._file.write(line + "\n")
+            # every record reaches the file, so a crash loses at most the one being written
+            self._file.flush()
+            self.recorded += 1
+
+    def records(self):
+        """The records of the file, oldest first."""
+        try:
+            with self._open("r") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        except FileNotFoundError:
+            return
+        except (EOFError, json.JSONDecodeError):
+            # the last record of a run that did not finish writing it
+            logger.warning("Traffic log %s ends with an incomplete record", self.path)
+
+    def next_record(self, kind: str, key: str):
+        """The next recorded exchange for the request, or None."""
+        with self._lock:
+            if self._index is None:
+                self._index = {}
+                for record in self.records():
+                    self._index.setdefault((record["kind"], record["key"]), deque()).append(record)
+            queue = self._index.get((kind, key))
+            if queue:
+                self._last[kind, key] = queue.popleft()
+                self.replayed += 1
+                return self._last[kind, key]
+            if (kind, key) in self._last:
+                self.repeated += 1
+                return self._last[kind, key]
+            self.misses += 1
+            return None
+
+    def rewind(self):
+        """Replay from the start of the log again."""
+        with self._lock:
+            self._index = None
+            self._last = {}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"recorded": self.recorded, "replayed": self.replayed,
+                    "repeated": self.repeated, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# --------------------------------------------------------------
+# Chat completions
+# --------------------------------------------------------------
+
+class RecordingClient(ClientWrapper):
+    """Appends every chat completion made through it to a TrafficLog."""
+
+    def __init__(self, client, log: TrafficLog):
+        super().__init__(client)
+        self.log = log
+
+    def _record(self, request: dict, at: float, start: float, response=None, error=None, chunks=None):
+        record = {"kind": "llm", "key": request_key(request), "at": at,
+                  "seconds": round(time.perf_counter() - start, 6), "request": to_plain(request)}
+        if chunks is not None:
+            record["chunks"] = chunks
+        elif error is None:
+            record["response"] = response.model_dump(exclude_none=True)
+        if error is not None:
+            record["error"] = _error(error)
+        self.log.append(record)
+
+    def _create(self, **request):
+        at, start = time.time(), time.perf_counter()
+        try:
+            response = self.wrapped_client.chat.completions.create(**request)
+        except Exception as e:
+            self._record(request, at, start, error=e)
+            raise
+        if request.get("stream"):
+            return self._stream(response, request, at, start)
+        self._record(request, at, start, response)
+        return response
+
+    async def _create_async(self, **request):
+        at, start = time.time(), time.perf_counter()
+        try:
+            response = await self.wrapped_client.chat.completions.create(**request)
+        except Exception as e:
+            self._record(request, at, start, error=e)
+            raise
+        if request.get("stream"):
+            return self._stream_async(response, request, at, start)
+        self._record(request, at, start, response)
+        return response
+
+    # a stream is recorded when it ends, each chunk with its time since the request
+
+    def _stream(self, stream, request, at, start):
+        chunks, error = [], None
+        try:
+            for chunk in stream:
+                chunks.append([round(time.perf_counter() - start, 6), chunk.model_dump(exclude_none=True)])
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._record(request, at, start, error=error, chunks=chunks)
+
+    async def _stream_async(self, stream, request, at, start):
+        chunks, error = [], None
+        try:
+            async for chunk in stream:
+                chunks.append([round(time.perf_counter() - start, 6), chunk.model_dump(exclude_none=True)])
+                yield chunk
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self._record(request, at, start, error=error, chunks=chunks)
+
+
+class ReplayClient:
+    """
+    Drop-in replacement for `OpenAI` (or `AsyncOpenAI` with is_async=True)
+    that answers from a TrafficLog. Misses go to `fallback` if there is one.
+    """
+
+    def __init__(self, log: TrafficLog, is_async: bool = False, fallback=None):
+        self.log = log
+        self.is_async = is_async
+        self.fallback = fallback
+        create = self._create_async if is_async else self._create
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+    def _lookup(self, request: dict) -> dict:
+        record = self.log.next_record("llm", request_key(request))
+        if record is None and self.fallback is None:
+            raise ReplayMissError(f"No recorded completion for this request "
+                                  f"(model {request.get('model')}, {len(request.get('messages', []))} messages)")
+        return record
+
+    def _delay(self, seconds: float) -> float:
+        return seconds if self.log.timing == "original" else 0.0
+
+    def _create(self, **request):
+        record = self._lookup(request)
+        if record is None:
+            return self.fallback.chat.completions.create(**request)
+        if "chunks" in record:
+            return self._stream(record)
+        time.sleep(self._delay(record["seconds"]))
+        return _response(record)
+
+    async def _create_async(self, **request):
+        import asyncio  # only async callers need it, and they have it imported already
+        record = self._lookup(request)
+        if record is None:
+            return await self.fallback.chat.completions.create(**request)
+        if "chunks" in record:
+            return self._stream_async(record)
+        await asyncio.sleep(self._delay(record["seconds"]))
+        return _response(record)
+
+    def _stream(self, record: dict):
+        from openai.types.chat import ChatCompletionChunk
+        elapsed = 0.0
+        for offset, chunk in record["chunks"]:
+            time.sleep(self._delay(offset - elapsed))
+            elapsed = offset
+            yield ChatCompletionChunk.model_validate(chunk)
+        if "error" in record:
+            raise RecordedError(record["error"])
+
+    async def _stream_async(self, record: dict):
+        import asyncio
+        from openai.types.chat import ChatCompletionChunk
+        elapsed = 0.0
+        for offset, chunk in record["chunks"]:
+            await asyncio.sleep(self._delay(offset - elapsed))
+            elapsed = offset
+            yield ChatCompletionChunk.model_validate(chunk)
+        if "error" in record:
+            raise RecordedError(record["error"])
+
+
+def _response(record: dict):
+    if "error" in record:
+        raise RecordedError(record["error"])
+    # openai is only imported once a completion is handled (see llm_client.get_client)
+    from openai.types.chat import ChatCompletion
+    return ChatCompletion.model_validate(record["response"])
+
+
+# --------------------------------------------------------------
+# HTTP (requests sessions, e.g. the weather client's)
+# --------------------------------------------------------------
+
+def _http_key(request) -> str:
+    return f"{request.method} {request.url}"
+
+
+def _http_error(error: dict, request):
+    """The recorded failure of an HTTP exchange, as the requests exception it was."""
+    from requests import exceptions
+    # only looked up in requests.exceptions: the log names the class, it does not import it
+    error_class = getattr(exceptions, error.get("type") or "", None)
+    if not (isinstance(error_class, type) and issubclass(error_class, exceptions.RequestException)):
+        error_class = exceptions.ConnectionError
+    return error_class(error.get("message"), request=request)
+
+
+def _adapter_classes():
+    # requests is only imported by the sessions that get instrumented
+    from requests.adapters import BaseAdapter
+
+    class RecordingAdapter(BaseAdapter):
+        """Sends through the session's adapter (retries and pooling included) and records the exchange."""
+
+        def __init__(self, adapter, log: TrafficLog):
+            super().__init__()
+            self.adapter = adapter
+            self.log = log
+
+        def send(self, request, **kwargs):
+            at, start = time.time(), time.perf_counter()
+            record = {"kind": "http", "key": _http_key(request), "at": at,
+                      "request": {"method": request.method, "url": request.url}}
+            try:
+                response = self.adapter.send(request, **kwargs)
+            except Exception as e:
+                self.log.append({**record, "seconds": round(time.perf_counter() - start, 6), "error": _error(e)})
+                raise
+            self.log.append({**record, "seconds": round(time.perf_counter() - start, 6), "response": {
+                "status": response.status_code,
+                "headers": {"Content-Type": response.headers.get("Content-Type", "")},
+                "body": response.text}})
+            return response
+
+        def close(self):
+            self.adapter.close()
+
+    class ReplayAdapter(BaseAdapter):
+        """Answers from a TrafficLog; unknown requests fail like an unreachable host."""
+
+        def __init__(self, log: TrafficLog):
+            super().__init__()
+            self.log = log
+
+        def send(self, request, **kwargs):
+            from requests import ConnectionError, Response
+            from requests.structures import CaseInsensitiveDict
+
+            record = self.log.next_record("http", _http_key(request))
+            if record is None:
+                raise ConnectionError(f"No recorded response for {_http_key(request)}", request=request)
+            if self.log.timing == "original":
+                time.sleep(record["seconds"])
+            if "error" in record:
+                raise _http_error(record["error"], request)
+            response = Response()
+            response.status_code = record["response"]["status"]
+            response.headers = CaseInsensitiveDict(record["response"]["headers"])
+            response._content = record["response"]["body"].encode("utf-8")
+            response.encoding = "utf-8"
+            response.url = request.url
+            response.request = request
+            return response
+
+        def close(self):
+            pass
+
+    return RecordingAdapter, ReplayAdapter
+
+
+def configure_session(session, config_file: str = "config.ini", mode: str = None, log: TrafficLog = None):
+    """
+    Record or replay the HTTP traffic of a requests session, as set in
+    [TRAFFIC] (or by `mode` and `log`). Returns the session.
+    """
+    mode = mode or traffic_mode(config_file)
+    if mode == "off":
+        return session
+    log = log or shared_traffic_log(config_file)
+    RecordingAdapter, ReplayAdapter = _adapter_classes()
+    for prefix in ("http://", "https://"):
+        adapter = session.get_adapter(prefix)
+        session.mount(prefix, RecordingAdapter(adapter, log) if mode == "record" else ReplayAdapter(log))
+    return session
+
+
+# --------------------------------------------------------------
+# Configuration
+# --------------------------------------------------------------
+
+_shared_log = None
+_shared_lock = threading.Lock()
+
+
+def traffic_mode(config_file: str = "config.ini") -> str:
+    config = configparser.ConfigParser()
+    config.read(config_file)
+    mode = config.get("TRAFFIC", "mode", fallback="off").strip().lower()
+    if mode not in MODES:
+        logger.warning("Unknown [TRAFFIC] mode %r, traffic is not recorded", mode)
+        return "off"
+    return mode
+
+
+def shared_traffic_log(config_file: str = "config.ini") -> TrafficLog:
+    """The process-wide TrafficLog of the [TRAFFIC] section."""
+    global _shared_log
+    with _shared_lock:
+        if _shared_log is None:
+            config = configparser.ConfigParser()
+            config.read(config_file)
+            _shared_log = TrafficLog(config.get("TRAFFIC", "file", fallback="traffic.jsonl.gz"),
+                                     config.get("TRAFFIC", "timing", fallback="original"))
+            logger.info("Traffic %s: %s", traffic_mode(config_file), _shared_log.path)
+        return _shared_log
+
+
+def summary(log: TrafficLog) -> dict:
+    """Exchanges, failures and recorded seconds per kind (and model) in a log."""
+    totals = {}
+    for record in log.records():
+        name = record["kind"]
+        if name == "llm":
+            name += f" {record['request'].get('model')}" + (" stream" if "chunks" in record else "")
+        total = totals.setdefault(name, {"exchanges": 0, "errors": 0, "seconds": 0.0})
+        total["exchanges"] += 1
+        total["errors"] += "error" in record
+        total["seconds"] = round(total["seconds"] + record["seconds"], 3)
+    return totals
+
+
+def main():
+    """python traffic_replay.py [traffic log]"""
+    path = sys.argv[1] if len(sys.argv) > 1 else shared_traffic_log().path
+    for name, total in summary(TrafficLog(path)).items():
+        print(f"{name}: {total}")
+
+
+if __name__ == "__main__":
+    main()
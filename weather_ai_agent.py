@@ -4,94 +4,91 @@ weather_ai_agent.py
 This script demonstrates my understanding of building an AI agent that can use 
 tools to answer user queries, specifically for fetching weather information.
 
-I had to create a dedicated function to get a structured response 
-using the DeepSeek API, which does not support the parse method.
+The DeepSeek API does not support the parse method, so the structured
+response goes through structured_output.py (JSON mode, local repair and a
+cached validator), via the agent loop.
 """
 
 
-import configparser
-from openai import OpenAI
-import json
-import requests
-from pydantic import BaseModel, Field
+import sys
+from llm_client import get_client
+from llm_metrics import stage
+from prompt_compiler import DATE_CONTEXT, compile_prompt, today
+from tool_executor import ToolExecutor
+from agent_loop import round_trip_metrics, run_agent
 
-config = configparser.ConfigParser()
-config.read("config.ini")
-deep_seek_api_key = config.get("API_KEYS", "openai_key")
 
-client = OpenAI(api_key=deep_seek_api_key, base_url="https://api.deepseek.com")
+def __getattr__(name):
+    # `client` is the shared client, created on first use (see llm_client.get_client);
+    # the pydantic model too, as pydantic alone takes most of a cold start
+    if name == "client":
+        return get_client()
+    if name == "WeatherResponse":
+        return _response_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 # --------------------------------------------------------------
 # Define the the classes and functions we need to use
 # --------------------------------------------------------------
 
-def get_structured_response(client_object, messages, model, tools, object_structure) -> BaseModel:
-    """Generates a structured response from the AI model.
-       This primarily for deep-seek-chat model, which does not
-       support the parse method.
-    Args:
-        client_object: The OpenAI client object.
-        messages: List of messages to send to the model.
-        model: The model to use for generating the response.
-        tools: List of tools available for the model to use.
-        object_structure: Pydantic model defining the structure of the expected response."""
-
-    field_descriptions = {
-    name: field.description
-    for name, field in object_structure.model_fields.items()
-    }
-
-    for item in messages:
-        try:
-            if item["role"] == "system":
-                original_content = item["content"]
-                item["content"] = f"""The following is your system prompt:
-                                {original_content}
-        
-                                Ensure your response is in valid JSON format with these exact fields:
-                                {field_descriptions}"""
-                break
-        except TypeError:
-            continue
-
-    response = client_object.chat.completions.create(
-            model=model,  
-            messages=messages,
-            response_format={"type": "json_object"},
-            tools=tools, 
-            temperature = 1.0  
-        )
-    
-    try:
-        # print(response.model_dump())
-        json_str = response.choices[0].message.content
-        data = json.loads(json_str)
-
-        structured_response = object_structure(**data)
+def _weather_client():
+    # imported on first use: requests and numpy make up most of its import time
+    from weather_client import shared_weather_client
+    return shared_weather_client()
 
-        return structured_response
-    except (KeyError, json.JSONDecodeError) as e:
-        raise ValueError(f"Failed to parse response: {e}")
-    
 
 def get_weather(latitude, longitude):
-    """This is a publically available API that returns the weather for a given location."""
-    response = requests.get(
-        f"https://api.open-meteo.com/v1/forecast?latitude={latitude}&longitude={longitude}&current=temperature_2m,wind_speed_10m&hourly=temperature_2m,relative_humidity_2m,wind_speed_10m"
-    )
-    data = response.json()
-    return data["current"]
+    """This is a publically available API that returns the weather for a given location.
+    Goes through the shared pooled and cached client (see weather_client.py)."""
+    return _weather_client().current(latitude, longitude)
 
-class WeatherResponse(BaseModel):
-    temperature: float = Field(description="<float> - Current temperature in Celsius")
-    response: str = Field(description="<string> A natural language response to the user's question.")
 
-def call_function(name, args):
-    if name == "get_weather":
-        return get_weather(**args)
+def get_weather_at(latitude, longitude, time):
+    """The forecast at a later local time, interpolated from the hourly series
+    of the last forecast for that location (no new request while it is fresh)."""
+    try:
+        return _weather_client().weather_at(latitude, longitude, time)
+    except ValueError as e:
+        return {"error": str(e)}
+
+
+def get_weather_many(locations):
+    """The current weather of several locations from one batched request.
+    `locations` is a list of {"latitude": ..., "longitude": ...}."""
+    currents = _weather_client().current_many(
+        [(location["latitude"], location["longitude"]) for location in locations])
+    return [
+        {"latitude": location["latitude"], "longitude": location["longitude"], **current}
+        for location, current in zip(locations, currents)
+    ]
+
+def _response_model():
+    from WeatherResponse import WeatherResponse
+    return WeatherResponse
+
+def _get_weather_batch(calls):
+    """All get_weather calls of one model turn, as one batched fetch."""
+    return _weather_client().current_many([(args["latitude"], args["longitude"]) for args in calls])
+
+
+def _tool_timeout():
+    # as long as one upstream request of the client can take with its
+    # timeouts and retries (a turn's locations fit in one request), so a
+    # tool call is not reported as timed out while its fetch still runs
+    from weather_client import MAX_BATCH
+    return _weather_client().fetch_seconds(MAX_BATCH) + 1
+
+
+# The tool calls of a turn run concurrently (see tool_executor.py); several
+# get_weather calls in the same turn are merged into one batched fetch.
+tool_executor = ToolExecutor(
+    {"get_weather": get_weather, "get_weather_at": get_weather_at, "get_weather_many": get_weather_many},
+    timeouts={"get_weather": _tool_timeout, "get_weather_at": _tool_timeout, "get_weather_many": _tool_timeout},
+    batchers={"get_weather": _get_weather_batch},
+)
     
 # --------------------------------------------------------------
-# Step 1: Call model with get_weather tool defined
+# Step 1: Define the tools and the prompt
 # --------------------------------------------------------------
 
 tools = [
@@ -111,68 +108,114 @@ tools = [
             },
             "strict": True
         }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_weather_at",
+            "description": "Get the forecast (temperature, humidity, wind) of a location at a later time, "
+                           "up to 7 days ahead",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "latitude": {"type": "number",},
+                    "longitude": {"type": "number",},
+                    "time": {
+                        "type": "string",
+                        "description": "Local time at the location, as YYYY-MM-DDTHH:MM",
+                    }
+                },
+                "required": ["latitude", "longitude", "time"],
+                "additionalProperties": False
+            },
+            "strict": True
+        }
+    },
+    {
+        "type": "function",
+        "function": {
+            "name": "get_weather_many",
+            "description": "Get the current weather of several locations at once",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "locations": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "properties": {
+                                "latitude": {"type": "number",},
+                                "longitude": {"type": "number",}
+                            },
+                            "required": ["latitude", "longitude"],
+                            "additionalProperties": False
+                        }
+                    }
+                },
+                "required": ["locations"],
+                "additionalProperties": False
+            },
+            "strict": True
+        }
     }
 ]
 
-system_prompt = """You are a helpful weather assistant. make sure to consider the following
+SYSTEM_PROMPT = compile_prompt("weather.system", """You are a helpful weather assistant. make sure to consider the following
 - Get the latitude and longitude of the user's desired location from the internet. do not expect the user to provide latitude and longitude.
 - If the user provides a location, use that location to get the latitude and longitude.
 - use the get_weather tool to provide the current weather. 
+- use the get_weather_many tool when the user asks about several locations, with all of them in one call.
+- use the get_weather_at tool for a later time (e.g. "at 6pm", "tonight" is 21:00, "tomorrow morning" is 09:00).
 - DO NOT reply back to user asking for more information.
-- if the location provided is a large area, use the center of the area."""
+- if the location provided is a large area, use the center of the area.""", volatile=DATE_CONTEXT)
 
-messages = [
-    {"role": "system", "content": system_prompt},
-    {"role": "user", "content": "What is the weather in Berlin today?"}]
-
-completion = client.chat.completions.create(
-    model="deepseek-chat",
-    messages=messages,
-    tools=tools,  # Automatically choose the best tool
-    temperature=0.7
-)
 
 # --------------------------------------------------------------
-# Step 2: Check if model decides to call function(s)
+# Step 2: Run the agent loop
 # --------------------------------------------------------------
 
-print(completion.model_dump())
-# We check whether the model has decided to use the get_weather function 
-# and which parameters it has provided. 
-#
-# NB the AI agent does NOT call the function directly, we have to do that
-# ourselves in the next step.
+@stage("weather")
+def ask_weather(question: str):
+    """
+    Answer a weather question. Returns the agent_loop.AgentResult, whose
+    output is a WeatherResponse (or None if the answer did not validate).
+
+    The loop (see agent_loop.py) calls the model with the tools; whenever the
+    model asks for get_weather the tool executor runs the calls and their
+    results go back to the model. It stops as soon as the model answers with
+    the WeatherResponse JSON, so the answer comes in the round after the last
+    tool call instead of a separate structured-response call.
+
+    NB the AI agent does NOT call the function directly, the loop does that.
+    """
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT.render(today=today())},
+        {"role": "user", "content": question}]
+
+    return run_agent(
+        get_client(),
+        messages,
+        tools=tools,
+        executor=tool_executor,
+        response_model=_response_model(),
+        max_steps=4,
+        name="weather",
+        temperature=0.7
+    )
 
-# --------------------------------------------------------------
-# Step 3: Execute get_weather function
-# --------------------------------------------------------------
-    
-for tool_call in completion.choices[0].message.tool_calls:
-    name = tool_call.function.name
-    args = json.loads(tool_call.function.arguments)
-    messages.append(completion.choices[0].message) 
-
-    result = call_function(name, args) # This is where the function is called
-    messages.append({
-        "role": "tool",
-        "content": json.dumps(result),
-        "tool_call_id": tool_call.id  # Critical: Match the original call
-    }) # We append the result of get_weather to the messages list to reask the model again
 
 # --------------------------------------------------------------
-# Step 4: Supply result and call model again
+# Step 3: Check model response
 # --------------------------------------------------------------
 
-final_completion = get_structured_response(
-    client_object=client,
-    messages=messages,
-    model="deepseek-chat",
-    tools=tools,
-    object_structure=WeatherResponse
-) # Reminder: This returns a WeatherResponse object
+def main():
+    """python weather_ai_agent.py ["question"]"""
+    result = ask_weather(" ".join(sys.argv[1:]) or "What is the weather in Berlin today?")
+    print(result)
+    if result.output is not None:
+        print(result.output.model_dump())  # Reminder: output is a WeatherResponse object
+    print(round_trip_metrics.stats())
 
-# --------------------------------------------------------------
-# Step 5: Check model response
-# --------------------------------------------------------------
 
-print(final_completion.model_dump())   
+if __name__ == "__main__":
+    main()
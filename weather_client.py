@@ -0,0 +1,294 @@
+"""
+weather_client.py
+
+Shared HTTP client for the Open-Meteo forecast API, used by get_weather.
+
+- One keep-alive requests.Session with a sized connection pool, so queries
+  reuse TCP/TLS connections instead of handshaking every time.
+- Connect and read timeouts on every request, so a hung upstream cannot
+  block a worker forever, and a couple of retries on connection errors and
+  502/503/504 (not on read timeouts).
+- A TTL cache keyed on the location rounded to a grid (0.1 degrees by
+  default, about 11 km), so nearby and repeated queries share one forecast.
+  The request is made for the centre of the grid cell, so every location in
+  a cell gets the same data.
+- Single-flight: concurrent misses for the same cell wait for the one
+  upstream fetch that is already running instead of starting their own.
+  They wait no longer than that fetch can take with its timeouts and
+  retries (fetch_seconds), and if the fetch is interrupted they get an
+  error instead of hanging.
+- forecast_many / current_many fetch the missing cells of several locations
+  in one request, using Open-Meteo's comma-separated coordinate lists.
+- The hourly arrays of each response go to a forecast_store.ForecastStore,
+  so weather_at() answers later-time questions by interpolating them
+  instead of fetching again. The cache keeps the rest of the response.
+- In [TRAFFIC] record mode the forecast requests go to the traffic log,
+  in replay mode they are answered from it (see traffic_replay.py).
+
+The client can be configured in config.ini:
+    [WEATHER]
+    base_url = https://api.open-meteo.com/v1/forecast
+    grid_degrees = 0.1
+    ttl_seconds = 600
+    connect_timeout = 3.05
+    read_timeout = 10
+    max_store_bytes = 33554432
+"""
+import configparser
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from forecast_store import ForecastStore
+from traffic_replay import configure_session
+
+logger = logging.getLogger(__name__)
+
+OPEN_METEO_URL = "https://api.open-meteo.com/v1/forecast"
+
+FORECAST_PARAMS = {
+    "current": "temperature_2m,wind_speed_10m",
+    "hourly": "temperature_2m,relative_humidity_2m,wind_speed_10m",
+    # times in the location's own timezone, so "6pm" means 6pm there
+    "timezone": "auto",
+}
+
+# locations per upstream request in forecast_many
+MAX_BATCH = 100
+
+
+class WeatherClient:
+    """Pooled, cached and coalesced client for the forecast endpoint."""
+
+    def __init__(self, base_url: str = OPEN_METEO_URL, grid_degrees: float = 0.1,
+                 ttl_seconds: float = 600, connect_timeout: float = 3.05, read_timeout: float = 10,
+                 pool_size: int = 16, max_cache_entries: int = 10_000, retries: int = 2,
+                 max_store_bytes: int = 32 * 1024 * 1024):
+        self.base_url = base_url
+        self.grid_degrees = grid_degrees
+        self.ttl_seconds = ttl_seconds
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.max_cache_entries = max_cache_entries
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=pool_size, pool_maxsize=pool_size,
+            # read timeouts are not retried: a hung upstream fails after one read_timeout
+            max_retries=Retry(total=retries, read=False, backoff_factor=0.2,
+                              status_forcelist=(502, 503, 504), allowed_methods=("GET",)))
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self.store = ForecastStore(max_store_bytes)
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()  # cell -> (forecast without the hourly arrays, expires_at)
+        self._inflight = {}          # cell -> (Future of the running fetch, its deadline)
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self.errors = 0
+
+    def cell(self, latitude: float, longitude: float) -> tuple:
+        """The grid cell centre of a location, rounded so it can be used as a key."""
+        if not self.grid_degrees:
+            return round(latitude, 4), round(longitude, 4)
+        step = self.grid_degrees
+        return round(round(latitude / step) * step, 4), round(round(longitude / step) * step, 4)
+
+    def fetch_seconds(self, n_cells: int) -> float:
+        """
+        The longest a fetch of n_cells can take: every attempt of every
+        batch running into both timeouts, plus the retry backoff.
+        """
+        batches = -(-n_cells // MAX_BATCH)
+        per_request = (self.retries + 1) * sum(self.timeout) + sum(0.2 * 2 ** i for i in range(self.retries))
+        return batches * per_request
+
+    def _fetch(self, cells: list) -> list:
+        """One upstream request per MAX_BATCH cells; Open-Meteo takes comma-separated coordinates."""
+        forecasts = []
+        for i in range(0, len(cells), MAX_BATCH):
+            batch = cells[i:i + MAX_BATCH]
+            with self._lock:
+                self.upstream_calls += 1
+            response = self.session.get(
+                self.base_url,
+                params={
+                    "latitude": ",".join(str(latitude) for latitude, _ in batch),
+                    "longitude": ",".join(str(longitude) for _, longitude in batch),
+                    **FORECAST_PARAMS,
+                },
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            data = response.json()
+            # a list for several locations, a single object for one
+            forecasts.extend(data if isinstance(data, list) else [data])
+        if len(forecasts) != len(cells):
+            raise ValueError(f"expected {len(cells)} forecasts, got {len(forecasts)}")
+        return forecasts
+
+    def forecast_many(self, locations) -> list:
+        """
+        Forecasts for several (latitude, longitude) locations, in order, without
+        the hourly arrays (those are in self.store, see hourly()). Cached cells
+        are served locally, cells already being fetched are waited for, and all
+        the other cells are fetched together in one upstream request.
+        """
+        cells = [self.cell(latitude, longitude) for latitude, longitude in locations]
+        results = {}
+        waiting = {}  # cell -> (Future of another caller's fetch, its deadline)
+        leading = {}  # cell -> Future of our fetch
+        with self._lock:
+            now = time.monotonic()
+            for cell in dict.fromkeys(cells):
+                entry = self._cache.get(cell)
+                if entry is not None and entry[1] > now:
+                    self._cache.move_to_end(cell)
+                    self.hits += 1
+                    results[cell] = entry[0]
+                    continue
+                self.misses += 1
+                inflight = self._inflight.get(cell)
+                if inflight is None:
+                    leading[cell] = Future()
+                else:
+                    self.coalesced += 1
+                    waiting[cell] = inflight
+            deadline = now + self.fetch_seconds(len(leading))
+            for cell, future in leading.items():
+                self._inflight[cell] = (future, deadline)
+
+        if leading:
+            # whatever happens to our fetch, even KeyboardInterrupt or a
+            # cancelled worker, the cells are released and their waiters woken
+            try:
+                fetched = {}
+                for cell, forecast in zip(leading, self._fetch(list(leading))):
+                    self.store.put(cell, forecast, self.ttl_seconds)
+                    fetched[cell] = {key: value for key, value in forecast.items()
+                                     if key not in ("hourly", "hourly_units")}
+            except BaseException as e:
+                with self._lock:
+                    self.errors += 1
+                    for cell in leading:
+                        del self._inflight[cell]
+                error = e if isinstance(e, Exception) else requests.ConnectionError(
+                    f"the fetch for these cells was interrupted ({type(e).__name__})")
+                for future in leading.values():
+                    future.set_exception(error)
+                raise
+
+            with self._lock:
+                expires_at = time.monotonic() + self.ttl_seconds
+                for cell, forecast in fetched.items():
+                    self._cache[cell] = (forecast, expires_at)
+                    self._cache.move_to_end(cell)
+                    del self._inflight[cell]
+                while len(self._cache) > self.max_cache_entries:
+                    self._cache.popitem(last=False)
+            for cell, future in leading.items():
+                future.set_result(fetched[cell])
+            results.update(fetched)
+
+        # the other callers' fetches are bounded by the request timeouts;
+        # a waiter gives up at the deadline of the fetch it is waiting for
+        for cell, (future, deadline) in waiting.items():
+            try:
+                results[cell] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                raise requests.Timeout(f"gave up waiting for another caller's fetch of {cell}") from None
+        return [results[cell] for cell in cells]
+
+    def forecast(self, latitude: float, longitude: float) -> dict:
+        """
+        The forecast response for the grid cell of the location, without the
+        hourly arrays (those are in self.store, see hourly()).
+        """
+        return self.forecast_many([(latitude, longitude)])[0]
+
+    def current(self, latitude: float, longitude: float) -> dict:
+        """The "current" block of the forecast, what get_weather returns to the model."""
+        return copy.deepcopy(self.forecast(latitude, longitude)["current"])
+
+    def current_many(self, locations) -> list:
+        """The "current" blocks for several (latitude, longitude) locations, from one batched fetch."""
+        return [copy.deepcopy(forecast["current"]) for forecast in self.forecast_many(locations)]
+
+    def hourly(self, latitude: float, longitude: float):
+        """The forecast_store.HourlySeries of the location's grid cell, fetched if not stored."""
+        cell = self.cell(latitude, longitude)
+        series = self.store.get(cell)
+        if series is None:
+            # the series expired or was evicted; the cached rest of the response goes with it
+            with self._lock:
+                self._cache.pop(cell, None)
+            self.forecast(latitude, longitude)
+            series = self.store.get(cell)
+            if series is None:
+                raise LookupError(f"forecast store is too small to keep the series of {cell}")
+        return series
+
+    def weather_at(self, latitude: float, longitude: float, when) -> dict:
+        """
+        Temperature, humidity and wind at a local time at the location
+        ("YYYY-MM-DDTHH:MM"), interpolated from the hourly series.
+        Raises ValueError if the time is outside the forecast range.
+        """
+        return self.hourly(latitude, longitude).at(when)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+        self.store.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "upstream_calls": self.upstream_calls,
+                "errors": self.errors,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "cached_cells": len(self._cache),
+                "store": self.store.stats(),
+            }
+
+    def close(self):
+        self.session.close()
+
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+def shared_weather_client(config_file: str = "config.ini") -> WeatherClient:
+    """The process-wide client, configured from the optional [WEATHER] section of config.ini."""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            config = configparser.ConfigParser()
+            config.read(config_file)
+            _shared_client = WeatherClient(
+                base_url=config.get("WEATHER", "base_url", fallback=OPEN_METEO_URL),
+                grid_degrees=config.getfloat("WEATHER", "grid_degrees", fallback=0.1),
+                ttl_seconds=config.getfloat("WEATHER", "ttl_seconds", fallback=600),
+                connect_timeout=config.getfloat("WEATHER", "connect_timeout", fallback=3.05),
+                read_timeout=config.getfloat("WEATHER", "read_timeout", fallback=10),
+                max_store_bytes=config.getint("WEATHER", "max_store_bytes", fallback=32 * 1024 * 1024),
+            )
+            # records or replays the forecast requests in [TRAFFIC] record/replay mode
+            configure_session(_shared_client.session, config_file)
+        return _shared_client